@@ -0,0 +1,150 @@
+"""
+账户台账
+
+由用户数据流的 ORDER_TRADE_UPDATE 和 ACCOUNT_UPDATE 事件维护内存中的订单、持仓、
+已实现盈亏、手续费和钱包余额，成交时直接使用事件中的字段，不再逐笔调用REST查询订单和成交。
+启动时通过一次REST请求同步钱包余额，之后完全由推送更新。
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 订单结束状态，结束后从未完成订单中移除
+FINAL_STATUSES = ("FILLED", "CANCELED", "EXPIRED", "REJECTED", "EXPIRED_IN_MATCH")
+
+
+class AccountLedger:
+    """
+    :param balance: 初始钱包余额，收到余额推送或同步余额前使用
+    :param asset: 保证金资产
+    """
+
+    def __init__(self, balance=0.0, asset="USDT"):
+        self.asset = asset
+        self.wallet_balance = float(balance)
+        self.cross_wallet_balance = float(balance)
+        self.orders = {}  # 未完成的订单 orderId -> 订单
+        self.positions = {}  # (symbol, positionSide) -> 持仓
+        self.realized_pnl = {}  # symbol -> 累计已实现盈亏
+        self.commission = {}  # symbol -> 累计手续费
+        self.fills = 0  # 累计成交笔数
+        self.updated = 0  # 最近一次事件时间（毫秒）
+
+        # 成交回调函数 fn(fill)
+        self.fill_callback = None
+        self._lock = threading.Lock()
+
+    def set_balance(self, balances):
+        """
+        使用REST余额接口的结果同步钱包余额
+        :param balances: [{"asset": "USDT", "balance": "...", "crossWalletBalance": "..."}, ...]
+        """
+        for item in balances:
+            if item.get("asset") == self.asset:
+                with self._lock:
+                    self.wallet_balance = float(item["balance"])
+                    self.cross_wallet_balance = float(item.get("crossWalletBalance", item["balance"]))
+                logger.info(f"钱包余额: {self.wallet_balance} {self.asset}")
+                return
+
+    def on_order_update(self, msg):
+        """ORDER_TRADE_UPDATE 推送"""
+        o = msg["o"]
+        order_id = o["i"]
+        with self._lock:
+            self.updated = msg.get("E", self.updated)
+            order = self.orders.get(order_id)
+            if order is None:
+                order = {
+                    "symbol": o["s"],
+                    "orderId": order_id,
+                    "clientOrderId": o.get("c"),
+                    "side": o["S"],
+                    "positionSide": o.get("ps", "BOTH"),
+                    "type": o.get("ot", o["o"]),
+                    "price": o.get("p", "0"),
+                    "stopPrice": o.get("sp", "0"),
+                    "closePosition": o.get("cp", False),
+                    "reduceOnly": o.get("R", False),
+                    "realizedPnl": 0.0,
+                    "commission": 0.0,
+                }
+            order.update({
+                "status": o["X"],
+                "origQty": o["q"],
+                "executedQty": o["z"],
+                "avgPrice": o["ap"],
+                "updateTime": o.get("T", msg.get("E")),
+            })
+
+            fill = None
+            if o["x"] == "TRADE":
+                pnl = float(o.get("rp", 0))
+                fee = float(o.get("n", 0)) if o.get("N", self.asset) == self.asset else 0.0
+                symbol = o["s"]
+                order["realizedPnl"] += pnl
+                order["commission"] += fee
+                self.realized_pnl[symbol] = self.realized_pnl.get(symbol, 0.0) + pnl
+                self.commission[symbol] = self.commission.get(symbol, 0.0) + fee
+                self.fills += 1
+                fill = dict(order, lastFilledPrice=o["L"], lastFilledQty=o["l"])
+
+            if o["X"] in FINAL_STATUSES:
+                self.orders.pop(order_id, None)
+            else:
+                self.orders[order_id] = order
+
+        if fill is not None:
+            logger.info(
+                f"订单 {order_id} 成交 [{fill['symbol']}] {fill['side']} {fill['positionSide']} "
+                f"{fill['lastFilledQty']}@{fill['lastFilledPrice']}, 盈亏: {fill['realizedPnl']}, 手续费: {fill['commission']}"
+            )
+            if self.fill_callback:
+                try:
+                    self.fill_callback(fill)
+                except Exception as e:
+                    logger.error(f"执行成交回调函数时出错: {str(e)}", exc_info=e)
+
+    def on_account_update(self, msg):
+        """ACCOUNT_UPDATE 推送，更新钱包余额和持仓"""
+        a = msg["a"]
+        with self._lock:
+            self.updated = msg.get("E", self.updated)
+            for item in a.get("B", []):
+                if item["a"] == self.asset:
+                    self.wallet_balance = float(item["wb"])
+                    self.cross_wallet_balance = float(item.get("cw", item["wb"]))
+            for item in a.get("P", []):
+                key = (item["s"], item.get("ps", "BOTH"))
+                amount = float(item["pa"])
+                if amount:
+                    self.positions[key] = {
+                        "amount": amount,
+                        "entry_price": float(item["ep"]),
+                        "unrealized_pnl": float(item.get("up", 0)),
+                    }
+                else:
+                    self.positions.pop(key, None)
+
+    def position(self, symbol, position_side):
+        """持仓数量（空仓为负数），无持仓时返回0"""
+        position = self.positions.get((symbol, position_side))
+        return position["amount"] if position else 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "asset": self.asset,
+                "wallet_balance": self.wallet_balance,
+                "cross_wallet_balance": self.cross_wallet_balance,
+                "realized_pnl": dict(self.realized_pnl),
+                "commission": dict(self.commission),
+                "fills": self.fills,
+                "positions": [
+                    {"symbol": symbol, "position_side": position_side, **position}
+                    for (symbol, position_side), position in self.positions.items()
+                ],
+                "open_orders": [dict(order) for order in self.orders.values()],
+                "updated": self.updated,
+            }
@@ -0,0 +1,220 @@
+"""
+异步日志
+
+所有日志记录先放入内存队列，由一个后台线程批量写出，
+文件写入和日志轮转不再发生在websocket线程和下单线程中。
+
+队列有界，队列满时按 overflow 策略处理：
+- drop_new: 丢弃新记录（默认）
+- drop_oldest: 丢弃队列中最早的记录
+- block: 等待队列有空位，最多等待 block_timeout 秒，超时后丢弃新记录
+
+溢出策略只用于高频的普通日志。交易记录（lossless_loggers，默认 trades）和 ERROR 及以上级别的记录不丢弃：
+队列满时在调用线程中同步写出，drop_oldest 挤出的此类记录同样同步写出。
+"""
+import atexit
+import logging
+import queue
+import threading
+
+OVERFLOW_POLICIES = ("drop_new", "drop_oldest", "block")
+
+
+class AsyncLogWriter:
+    """
+    后台日志写出线程
+    :param queue_size: 队列长度
+    :param batch_size: 每批最多写出的记录数
+    :param overflow: 队列满时的处理策略
+    :param block_timeout: block 策略下的最长等待秒数
+    """
+
+    def __init__(self, queue_size=10000, batch_size=256, overflow="drop_new", block_timeout=1.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"无效的日志队列溢出策略: {overflow}")
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+
+        self.enqueued = 0  # 入队的记录数
+        self.written = 0  # 已写出的记录数
+        self.dropped = 0  # 队列已满丢弃的记录数
+        self.sync_writes = 0  # 队列已满时同步写出的不可丢弃记录数
+        self.failed = 0  # 写出失败的记录数
+        self.batches = 0  # 写出的批次数
+        self.max_pending = 0  # 队列最大积压
+
+        self._thread = threading.Thread(target=self._run, name="async-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, handlers, record, lossless=False):
+        """
+        把记录放入队列，由后台线程交给handlers写出
+        :param lossless: 不可丢弃的记录，队列满时在调用线程中同步写出
+        """
+        item = (handlers, record, lossless)
+        try:
+            if self.overflow == "block":
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            if lossless or self.overflow != "drop_oldest":
+                self._overflow(item)
+                return
+            # 丢弃最早的记录，为新记录腾出位置
+            try:
+                oldest = self._queue.get_nowait()
+                self._queue.task_done()
+                if oldest is not None:
+                    self._overflow(oldest)
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._overflow(item)
+                return
+
+        self.enqueued += 1
+        pending = self._queue.qsize()
+        if pending > self.max_pending:
+            self.max_pending = pending
+
+    def _overflow(self, item):
+        """处理无法入队的记录：不可丢弃的同步写出，其余丢弃"""
+        handlers, record, lossless = item
+        if lossless:
+            self.sync_writes += 1
+            self._handle(handlers, record)
+        else:
+            self.dropped += 1
+
+    def _handle(self, handlers, record):
+        for handler in handlers:
+            if record.levelno < handler.level:
+                continue
+            try:
+                handler.handle(record)
+            except Exception:
+                self.failed += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # 一次取出队列中已有的记录，批量写出
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                break
+
+    def _write(self, batch):
+        stop = False
+        for item in batch:
+            if item is None:
+                stop = True
+                continue
+            handlers, record, _ = item
+            self._handle(handlers, record)
+            self.written += 1
+        self.batches += 1
+        return stop
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sync_writes": self.sync_writes,
+            "failed": self.failed,
+            "batches": self.batches,
+            "max_pending": self.max_pending,
+            "overflow": self.overflow,
+        }
+
+    def stop(self):
+        """写出队列中剩余的记录后停止"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join()
+
+
+class AsyncHandler(logging.Handler):
+    """
+    替换 logger 原有的handlers，记录经队列交给原handlers写出
+    :param lossless: 该 logger 的记录不可丢弃，否则只有 ERROR 及以上级别的记录不可丢弃
+    """
+
+    def __init__(self, writer, handlers, lossless=False):
+        super().__init__()
+        self.writer = writer
+        self.handlers = handlers
+        self.lossless = lossless
+
+    def prepare(self, record):
+        """
+        在调用线程中完成消息格式化，记录入队后不再引用调用方的参数
+        与 logging.handlers.QueueHandler.prepare 类似，但保留原handlers的格式
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            lossless = self.lossless or record.levelno >= logging.ERROR
+            self.writer.submit(self.handlers, self.prepare(record), lossless)
+        except Exception:
+            self.handleError(record)
+
+
+_writer = None
+
+
+def install(queue_size=10000, batch_size=256, overflow="drop_new", block_timeout=1.0, lossless_loggers=("trades",)):
+    """
+    把已配置的所有 logger 的handlers替换为异步handler，共用一个后台写出线程
+    在 logging.config.dictConfig 之后调用
+    :param lossless_loggers: 记录不可丢弃的 logger 名称，如交易记录
+    :return: AsyncLogWriter
+    """
+    global _writer
+    if _writer is not None:
+        return _writer
+
+    writer = AsyncLogWriter(queue_size, batch_size, overflow, block_timeout)
+    loggers = [logging.getLogger()]
+    loggers += [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+    for logger in loggers:
+        if not logger.handlers:
+            continue
+        handlers = list(logger.handlers)
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(AsyncHandler(writer, handlers, lossless=logger.name in lossless_loggers))
+
+    atexit.register(writer.stop)
+    _writer = writer
+    return writer
+
+
+def stats():
+    """异步日志的队列统计，未启用时返回None"""
+    return _writer.stats() if _writer is not None else None
@@ -0,0 +1,345 @@
+"""
+回测引擎：用历史K线回放 create_strategy 创建的策略
+
+开平仓规则与 main.py 中的 quick_order / strategy_callback 保持一致：
+- 无持仓且未被禁用时，按信号K线收盘价市价开仓，数量 = 初始资金 * 杠杆 * 仓位百分比 / 价格
+- 开仓后挂 stop_profit / stop_loss 百分比的止盈止损单
+- 持仓超过 max_hold_time 秒后市价平仓
+- 连续亏损达到 consecutive_losses 笔后禁用 disable_time 秒
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import time
+
+import numpy as np
+
+from config.config_manager import app_config
+from kline_store import bar_to_kline, get_store
+from strategy import create_strategy
+
+logger = logging.getLogger(__name__)
+
+# K线列，与币安REST klines接口及历史数据文件的前7列一致
+KLINE_COLUMNS = ("open_time", "open", "high", "low", "close", "volume", "close_time")
+
+# 回测用到的 [trading] 配置项及其类型
+TRADING_PARAMS = {
+    "leverage": int,
+    "position_percent": float,
+    "initial_balance": float,
+    "stop_profit": float,
+    "stop_loss": float,
+    "max_hold_time": int,
+    "consecutive_losses": int,
+    "disable_time": int,
+}
+
+# 默认taker手续费率
+DEFAULT_FEE_RATE = 0.0005
+
+
+def load_trading_params(overrides=None):
+    """
+    读取 [trading] 配置作为回测参数
+    :param overrides: 覆盖的参数，如 {"leverage": 10, "stop_loss": 1.5}
+    """
+    params = {name: cast(app_config["trading"][name]) for name, cast in TRADING_PARAMS.items()}
+    params["fee_rate"] = DEFAULT_FEE_RATE
+    if overrides:
+        params.update(overrides)
+    return params
+
+
+def load_klines_csv(paths):
+    """
+    读取币安历史K线CSV文件（data.binance.vision 格式），多个文件按时间拼接并去重
+    :param paths: 文件路径或路径列表，支持通配符，如 data/LAYERUSDT-1m-2025-*.csv
+    :return: {列名: numpy数组}
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    files = sorted(f for pattern in paths for f in glob.glob(pattern))
+    if not files:
+        raise FileNotFoundError(f"未找到K线文件: {paths}")
+
+    chunks = []
+    for file in files:
+        with open(file, "r") as f:
+            first_line = f.readline()
+        # 新版本的历史数据文件带表头
+        skiprows = 0 if first_line[:1].isdigit() else 1
+        data = np.loadtxt(file, delimiter=",", usecols=range(len(KLINE_COLUMNS)), skiprows=skiprows, ndmin=2)
+        chunks.append(data)
+
+    data = np.concatenate(chunks)
+    _, unique_index = np.unique(data[:, 0], return_index=True)
+    data = data[unique_index]
+
+    klines = {}
+    for i, name in enumerate(KLINE_COLUMNS):
+        if name in ("open_time", "close_time"):
+            klines[name] = data[:, i].astype(np.int64)
+        else:
+            klines[name] = np.ascontiguousarray(data[:, i])
+    return klines
+
+
+def load_klines_store(symbol, interval=None, start_time=None, end_time=None):
+    """
+    从本地K线存储读取历史数据，返回的数组直接映射存储文件
+    :param start_time: 起始开盘时间（毫秒）
+    :param end_time: 结束开盘时间（毫秒）
+    """
+    klines = get_store(symbol, interval).read(start_time, end_time)
+    if len(klines["close"]) == 0:
+        raise ValueError(f"本地没有 {symbol} 的K线数据")
+    return klines
+
+
+def load_klines(args):
+    """根据命令行参数加载K线：--klines 读取CSV文件，--symbol 读取本地存储"""
+    if args.klines:
+        return load_klines_csv(args.klines)
+    return load_klines_store(args.symbol, args.interval)
+
+
+def add_klines_arguments(parser):
+    """添加K线数据来源的命令行参数"""
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--klines", nargs="+", help="K线CSV文件，支持通配符")
+    source.add_argument("--symbol", help="从本地K线存储读取的交易对")
+    parser.add_argument("--interval", help="本地K线存储的周期，默认为 [websocket] kline_interval")
+
+
+def strategy_signals(strategy, klines, vectorized=True):
+    """
+    计算策略在整段历史上的信号
+    :param vectorized: 策略支持时使用NumPy批量计算，否则逐条回放K线
+    :return: 信号数组（1买入，-1卖出，0无信号）
+    """
+    close = klines["close"]
+    event_time = klines["close_time"]
+
+    if vectorized:
+        signals = strategy.batch_signals(close, event_time)
+        if signals is not None:
+            return signals
+
+    signals = np.zeros(len(close), dtype=np.int8)
+    for i in range(len(close)):
+        kline_data = bar_to_kline(klines, i)
+        signal = strategy.analyze(kline_data)
+        if signal == "BUY":
+            signals[i] = 1
+        elif signal == "SELL":
+            signals[i] = -1
+    return signals
+
+
+def simulate(klines, signals, params):
+    """
+    按实盘规则模拟开平仓
+    :param klines: K线数据
+    :param signals: 信号数组
+    :param params: 交易参数，见 load_trading_params
+    :return: BacktestResult
+    """
+    open_time = klines["open_time"]
+    open_price = klines["open"]
+    high = klines["high"]
+    low = klines["low"]
+    close = klines["close"]
+    close_time = klines["close_time"]
+    n = len(close)
+
+    margin = params["initial_balance"] * params["position_percent"] / 100
+    max_hold_ms = params["max_hold_time"] * 1000
+    fee_rate = params["fee_rate"]
+
+    trades = []
+    consecutive_losses = 0
+    disabled_until = None
+    next_free = 0  # 第一根可以开仓的K线
+
+    for i in np.flatnonzero(signals).tolist():
+        if i < next_free:
+            continue
+        if disabled_until is not None and close_time[i] < disabled_until:
+            continue
+
+        direction = int(signals[i])
+        entry_price = float(close[i])
+        quantity = round(margin * params["leverage"] / entry_price, 3)
+        if quantity <= 0:
+            continue
+
+        if direction > 0:
+            stop_profit_price = entry_price * (1 + params["stop_profit"] / 100)
+            stop_loss_price = entry_price * (1 - params["stop_loss"] / 100)
+        else:
+            stop_profit_price = entry_price * (1 - params["stop_profit"] / 100)
+            stop_loss_price = entry_price * (1 + params["stop_loss"] / 100)
+
+        # 持仓期间的K线为 i+1 .. end-1，第end根K线开盘时触发最长持仓平仓
+        end = int(np.searchsorted(open_time, close_time[i] + max_hold_ms, side="left"))
+        window_high = high[i + 1:end]
+        window_low = low[i + 1:end]
+        if direction > 0:
+            stop_loss_hit = window_low <= stop_loss_price
+            stop_profit_hit = window_high >= stop_profit_price
+        else:
+            stop_loss_hit = window_high >= stop_loss_price
+            stop_profit_hit = window_low <= stop_profit_price
+        hit = stop_loss_hit | stop_profit_hit
+
+        if hit.any():
+            k = int(np.argmax(hit))
+            j = i + 1 + k
+            bar_open = float(open_price[j])
+            # 同一根K线内止盈止损都触发时保守地按止损处理；跳空时按开盘价成交
+            if stop_loss_hit[k]:
+                reason = "stop_loss"
+                exit_price = min(stop_loss_price, bar_open) if direction > 0 else max(stop_loss_price, bar_open)
+            else:
+                reason = "stop_profit"
+                exit_price = max(stop_profit_price, bar_open) if direction > 0 else min(stop_profit_price, bar_open)
+            exit_time = int(close_time[j])
+            next_free = j + 1
+        elif end < n:
+            j = end
+            reason = "max_hold_time"
+            exit_price = float(open_price[j])
+            exit_time = int(open_time[j])
+            next_free = j
+        else:
+            # 数据结束时仍有持仓，按最后收盘价平仓
+            j = n - 1
+            reason = "end_of_data"
+            exit_price = float(close[j])
+            exit_time = int(close_time[j])
+            next_free = n
+
+        pnl = direction * (exit_price - entry_price) * quantity
+        fee = (entry_price + exit_price) * quantity * fee_rate
+        net_pnl = pnl - fee
+
+        # 连续亏损风控，与 OrderManager.check_consecutive_losses 一致
+        if net_pnl < 0:
+            consecutive_losses += 1
+        else:
+            consecutive_losses = 0
+        if consecutive_losses >= params["consecutive_losses"]:
+            disabled_until = exit_time + params["disable_time"] * 1000
+
+        trades.append({
+            "side": "BUY" if direction > 0 else "SELL",
+            "entry_time": int(close_time[i]),
+            "entry_price": entry_price,
+            "exit_time": exit_time,
+            "exit_price": exit_price,
+            "quantity": quantity,
+            "pnl": net_pnl,
+            "fee": fee,
+            "reason": reason,
+        })
+
+    return BacktestResult(trades, params["initial_balance"])
+
+
+def run_backtest(strategy_name, klines, overrides=None, vectorized=True, strategy_params=None):
+    """
+    回测一个策略
+    :param strategy_name: create_strategy 支持的策略名称
+    :param klines: K线数据，见 load_klines
+    :param overrides: 覆盖的交易参数
+    :param vectorized: 策略支持时使用批量计算
+    :param strategy_params: 策略参数，如 {"short_period": 5, "long_period": 20}
+    """
+    params = load_trading_params(overrides)
+    strategy = create_strategy(strategy_name, **(strategy_params or {}))
+    signals = strategy_signals(strategy, klines, vectorized)
+    return simulate(klines, signals, params)
+
+
+class BacktestResult:
+    """回测结果：交易列表、资金曲线和统计指标"""
+
+    def __init__(self, trades, initial_balance):
+        self.trades = trades
+        self.initial_balance = initial_balance
+        pnl = np.array([t["pnl"] for t in trades], dtype=np.float64)
+        self.equity = initial_balance + np.concatenate(([0.0], np.cumsum(pnl)))
+
+    @property
+    def max_drawdown(self):
+        """最大回撤（金额）"""
+        peak = np.maximum.accumulate(self.equity)
+        return float((peak - self.equity).max())
+
+    @property
+    def max_drawdown_percent(self):
+        """最大回撤（相对于历史最高资金的百分比）"""
+        peak = np.maximum.accumulate(self.equity)
+        return float(((peak - self.equity) / peak).max() * 100)
+
+    def summary(self):
+        pnl = np.array([t["pnl"] for t in self.trades], dtype=np.float64)
+        wins = pnl[pnl > 0]
+        losses = pnl[pnl < 0]
+        total_pnl = float(pnl.sum())
+        return {
+            "trades": len(self.trades),
+            "total_pnl": total_pnl,
+            "return_percent": total_pnl / self.initial_balance * 100,
+            "win_rate": float(len(wins) / len(pnl) * 100) if len(pnl) else 0.0,
+            "profit_factor": float(wins.sum() / -losses.sum()) if len(losses) else None,
+            "total_fee": float(sum(t["fee"] for t in self.trades)),
+            "max_drawdown": self.max_drawdown,
+            "max_drawdown_percent": self.max_drawdown_percent,
+            "final_balance": float(self.equity[-1]),
+        }
+
+    def save_trades(self, path):
+        """保存交易列表到CSV文件"""
+        fields = ["side", "entry_time", "entry_price", "exit_time", "exit_price", "quantity", "pnl", "fee", "reason"]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.trades)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略回测")
+    parser.add_argument("--strategy", required=True, help="策略名称: simple/ma/rsi/combined")
+    add_klines_arguments(parser)
+    parser.add_argument("--set", nargs="*", default=[], metavar="KEY=VALUE", help="覆盖 [trading] 配置，如 stop_loss=1.5")
+    parser.add_argument("--no-vectorized", action="store_true", help="强制逐条回放K线")
+    parser.add_argument("--trades-out", help="交易列表输出文件")
+    args = parser.parse_args()
+
+    overrides = {}
+    for item in args.set:
+        key, value = item.split("=", 1)
+        overrides[key] = TRADING_PARAMS.get(key, float)(value)
+
+    started = time.perf_counter()
+    klines = load_klines(args)
+    loaded = time.perf_counter()
+    result = run_backtest(args.strategy, klines, overrides, vectorized=not args.no_vectorized)
+    finished = time.perf_counter()
+
+    summary = result.summary()
+    summary["bars"] = len(klines["close"])
+    summary["load_seconds"] = round(loaded - started, 3)
+    summary["backtest_seconds"] = round(finished - loaded, 3)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.trades_out:
+        result.save_trades(args.trades_out)
+
+
+if __name__ == "__main__":
+    main()
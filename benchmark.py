@@ -0,0 +1,382 @@
+"""
+行情到下单的端到端延迟基准测试
+
+不连接交易所：REST请求经进程内的假传输层交给模拟交易所撮合，websocket消息由模拟行情生成后
+直接注入 BinanceClient._handle_message。每个策略分别测量各阶段的延迟分位数（毫秒）：
+
+- decode: 消息解码、分发和K线入库，直到K线回调被调用
+- analyze: strategy.analyze，K线推送与实盘一样经 SymbolTrader.on_kline 按策略的评估模式调用，
+  收盘模式只在K线收盘时有样本
+- sizing: 开仓开始到发出市价单（取价、计算数量）
+- market_order: 市价单请求
+- bracket_order: 止盈止损批量单请求
+- record: 本次开仓的交易记录写入
+- tick_to_order: 收到K线消息到发出市价单
+- tick_to_ack: 收到K线消息到止盈止损单确认
+
+结果以JSON输出，可以与之前保存的结果比较，超过容忍度时以非零状态退出：
+
+    uv run benchmark.py --out bench.json
+    uv run benchmark.py --baseline bench.json --tolerance 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+
+from metrics import LatencyStats
+from strategy import STRATEGY_NAMES
+
+STAGES = ("decode", "analyze", "sizing", "market_order", "bracket_order", "record", "tick_to_order", "tick_to_ack")
+
+
+class SimulatorAdapter(BaseAdapter):
+    """requests 传输层，把请求直接交给模拟交易所处理，不经过网络"""
+
+    def __init__(self, simulator):
+        super().__init__()
+        self.simulator = simulator
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        params = dict(parse_qsl(url.query))
+        if request.body:
+            body = request.body.decode() if isinstance(request.body, bytes) else request.body
+            params.update(parse_qsl(body))
+        status, body = self.simulator.handle_request(request.method, url.path, params)
+
+        response = Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeWebsocketClient:
+    """替代 UMFuturesWebsocketClient，只记录订阅，消息由基准测试直接注入"""
+
+    def __init__(self):
+        self.streams = set()
+
+    def subscribe(self, stream, id=None):
+        self.streams.update([stream] if isinstance(stream, str) else stream)
+
+    def unsubscribe(self, stream, id=None):
+        self.streams.difference_update([stream] if isinstance(stream, str) else stream)
+
+    def user_data(self, listen_key, id=None, action=None, **kwargs):
+        self.subscribe(listen_key)
+
+    def list_subscribe(self, id=None):
+        return {"result": sorted(self.streams)}
+
+    def ping(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def is_alive(self):
+        return True
+
+
+def create_client(simulator):
+    """创建使用假传输层的 BinanceClient"""
+    from binance_client import BinanceClient
+
+    class BenchmarkClient(BinanceClient):
+
+        def _init_rest_client(self):
+            super()._init_rest_client()
+            adapter = SimulatorAdapter(simulator)
+            self.client.session.mount("https://", adapter)
+            self.client.session.mount("http://", adapter)
+
+        def _create_wsclient(self):
+            return FakeWebsocketClient()
+
+    client = BenchmarkClient()
+    client.refresh_exchange_info()
+    return client
+
+
+class PipelineProbe:
+    """
+    包装客户端和交易记录的方法，记录一次开仓中各阶段的时间点
+    只有 measuring 为True时记录，平仓等准备工作不计入
+    """
+
+    def __init__(self, client, order_manager, stats):
+        self.stats = stats
+        self.measuring = False
+        self.frame_started = 0.0
+        self.open_started = 0.0
+        self.record_seconds = 0.0
+
+        market_order = client.market_order
+        bracket_order = client.bracket_order
+        record_trade = order_manager.record_trade
+
+        def timed_market_order(*args, **kwargs):
+            started = time.perf_counter()
+            if self.measuring:
+                self.stats["sizing"].record(started - self.open_started)
+                self.stats["tick_to_order"].record(started - self.frame_started)
+            result = market_order(*args, **kwargs)
+            if self.measuring:
+                self.stats["market_order"].record(time.perf_counter() - started)
+            return result
+
+        def timed_bracket_order(*args, **kwargs):
+            started = time.perf_counter()
+            result = bracket_order(*args, **kwargs)
+            if self.measuring:
+                finished = time.perf_counter()
+                self.stats["bracket_order"].record(finished - started)
+                self.stats["tick_to_ack"].record(finished - self.frame_started)
+            return result
+
+        def timed_record_trade(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return record_trade(*args, **kwargs)
+            finally:
+                self.record_seconds += time.perf_counter() - started
+
+        client.market_order = timed_market_order
+        client.bracket_order = timed_bracket_order
+        order_manager.record_trade = timed_record_trade
+
+
+def run_strategy(strategy_name, client, engine, feed, frames, args):
+    """
+    对一个策略注入行情并测量各阶段延迟
+    :param feed: 模拟交易所的行情，所有策略依次使用同一个行情，K线时间连续
+    :param frames: feed 推送的 (事件类型, 消息) 列表
+    """
+    symbol = client.symbol
+    trader = engine.trader(symbol)
+    trader.set_strategy(strategy_name)
+
+    stats = {stage: LatencyStats(window=args.frames) for stage in STAGES}
+    probe = PipelineProbe(client, trader.order_manager, stats)
+    counters = {"frames": 0, "signals": 0, "orders": 0}
+
+    analyze = trader.strategy.analyze
+
+    def timed_analyze(kline_data):
+        started = time.perf_counter()
+        try:
+            return analyze(kline_data)
+        finally:
+            stats["analyze"].record(time.perf_counter() - started)
+
+    # 预热后再计时，只记录 SymbolTrader._evaluate 中的调用
+    trader.strategy.analyze = timed_analyze
+
+    # 实盘中信号交给下单执行器，这里记下信号，在同一线程中开仓以便测量
+    signals = []
+    trader.on_signal = signals.append
+
+    def on_kline(msg):
+        stats["decode"].record(time.perf_counter() - probe.frame_started)
+
+        # 与分片线程一样经过K线聚合和评估模式处理
+        signals.clear()
+        trader.on_kline(msg)
+
+        if signals:
+            signal = signals[-1]
+            counters["signals"] += 1
+        elif counters["frames"] % args.order_every == 0:
+            # 策略信号稀少，按固定间隔补充开仓，保证下单路径有足够的样本
+            signal = "BUY"
+        else:
+            return
+
+        probe.measuring = True
+        probe.record_seconds = 0.0
+        probe.open_started = time.perf_counter()
+        trader.open_position("LONG" if signal == "BUY" else "SHORT")
+        probe.measuring = False
+        stats["record"].record(probe.record_seconds)
+        counters["orders"] += 1
+
+        # 平仓后进入下一轮，不计入统计
+        trader.close_position()
+
+    client.register_kline_callback(on_kline)
+
+    # 盘口和标记价格消息同样注入，只测量K线消息的处理路径
+    interval = 1 / args.rate if args.rate else 0
+    next_at = time.perf_counter()
+    while counters["frames"] < args.frames:
+        frames.clear()
+        feed.step()
+        for event, frame in frames:
+            if event == "kline":
+                counters["frames"] += 1
+                probe.frame_started = time.perf_counter()
+            client._handle_message(None, frame)
+
+        if interval:
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    return {
+        **counters,
+        "stages": {stage: stats[stage].percentiles() for stage in STAGES},
+    }
+
+
+def client_interval():
+    from config.config_manager import app_config
+    return app_config.get("websocket", "kline_interval", fallback="1m")
+
+
+def compare(results, baseline, tolerances, min_delta_ms):
+    """
+    与基准结果比较，分位数超过 基准 * (1 + 容忍度) 且差值超过 min_delta_ms 时视为退化
+    :param tolerances: {分位数: 容忍度}，如 {"p50": 0.25, "p99": 1.0}
+    :return: 退化项列表
+    """
+    regressions = []
+    for strategy_name, result in results.items():
+        base = baseline.get("results", {}).get(strategy_name)
+        if not base:
+            continue
+        for stage, current in result["stages"].items():
+            previous = base["stages"].get(stage, {})
+            for point, tolerance in tolerances.items():
+                if point not in current or point not in previous:
+                    continue
+                limit = previous[point] * (1 + tolerance)
+                if current[point] > limit and current[point] - previous[point] > min_delta_ms:
+                    regressions.append({
+                        "strategy": strategy_name,
+                        "stage": stage,
+                        "point": point,
+                        "baseline_ms": previous[point],
+                        "current_ms": current[point],
+                    })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行情到下单的端到端延迟基准测试")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGY_NAMES), help="测试的策略")
+    parser.add_argument("--frames", type=int, default=2000, help="每个策略注入的K线消息数")
+    parser.add_argument("--rate", type=float, default=0, help="每秒注入的tick数，0 表示不限速")
+    parser.add_argument("--order-every", type=int, default=50, help="没有策略信号时每隔多少条K线消息开仓一次")
+    parser.add_argument("--ticks-per-bar", type=int, default=4)
+    parser.add_argument("--start-price", type=float, default=1.0)
+    parser.add_argument("--volatility", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", type=int, default=200, help="模拟交易所预先生成的已收盘K线数，用于策略预热")
+    parser.add_argument("--out", help="结果输出文件，默认输出到标准输出")
+    parser.add_argument("--baseline", help="用于比较的基准结果文件")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的p50增幅")
+    parser.add_argument("--tail-tolerance", type=float, default=1.0, help="允许的p99增幅，尾部延迟受调度影响较大")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="小于该差值（毫秒）的变化不视为退化")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="[%(asctime)s: %(levelname)s/%(name)s] %(message)s")
+
+    # 交易日志、K线存储和交易规则缓存写到临时目录，不影响正式数据
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    from config.config_manager import app_config, config_snapshot
+    app_config.set("storage", "trade_journal", os.path.join(workdir, "trades.db"))
+    app_config.set("storage", "kline_dir", os.path.join(workdir, "klines"))
+    app_config.set("storage", "exchange_info_cache", os.path.join(workdir, "exchange_info.json"))
+    app_config.set("proxies", "enabled", "false")
+    os.environ.setdefault("BINANCE_API_KEY", "benchmark")
+    os.environ.setdefault("BINANCE_SECRET_KEY", "benchmark")
+
+    from exchange_simulator import DEFAULT_FILTERS, ExchangeSimulator, dumps, synthetic_ticks
+    from executor import OrderExecutor
+    from trading_engine import TradingEngine
+    import binance_client  # noqa: F401  切换工作目录前导入
+
+    # 在临时目录中运行，启动时的 trades.csv 导入等相对路径操作不会碰到正式数据；
+    # 命令行给出的结果文件路径按原工作目录解析
+    out = os.path.abspath(args.out) if args.out else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(workdir)
+
+    symbol = config_snapshot().trading.symbol
+    simulator = ExchangeSimulator(
+        {symbol: DEFAULT_FILTERS},
+        {symbol: synthetic_ticks(args.start_price, args.volatility, args.seed)},
+        interval=client_interval(),
+        ticks_per_bar=args.ticks_per_bar,
+        tick_seconds=0,
+    )
+    # 历史K线供启动时的下载和策略预热使用，之后的行情由基准测试逐帧注入
+    simulator.feed.seed_history(args.history)
+    frames = []
+    simulator.feed.broadcast = lambda stream, event: frames.append((event["e"], dumps(event)))
+    client = create_client(simulator)
+    engine = TradingEngine(client, OrderExecutor(workers=1), shards=1)
+    engine.set_symbols([symbol])
+
+    results = {}
+    for strategy_name in args.strategies:
+        # 每个策略使用新的客户端方法包装，互不影响
+        for name in ("market_order", "bracket_order"):
+            client.__dict__.pop(name, None)
+        engine.trader(symbol).order_manager.__dict__.pop("record_trade", None)
+        results[strategy_name] = run_strategy(strategy_name, client, engine, simulator.feed, frames, args)
+
+    report = {
+        "python": platform.python_version(),
+        "frames": args.frames,
+        "rate": args.rate,
+        "order_every": args.order_every,
+        "seed": args.seed,
+        "results": results,
+    }
+
+    regressions = []
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare(
+                results, json.load(f), {"p50": args.tolerance, "p99": args.tail_tolerance}, args.min_delta_ms
+            )
+        report["regressions"] = regressions
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if regressions:
+        for item in regressions:
+            print(
+                f"性能退化: {item['strategy']} {item['stage']} {item['point']} "
+                f"{item['baseline_ms']}ms -> {item['current_ms']}ms",
+                file=sys.stderr,
+            )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
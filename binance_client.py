@@ -2,13 +2,22 @@ import os
 import logging
 import time
 import threading
-import json
 from decimal import Decimal, getcontext
 
+import numpy as np
 from binance.um_futures import UMFutures
 from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
 
-from config.config_manager import app_config
+from account_ledger import AccountLedger
+from config.config_manager import app_config, config_snapshot, subscribe_config, trading_symbols
+from exchange_info import ExchangeInfoCache
+from kline_store import get_store, interval_ms, rows_to_columns
+from paper_trading import PaperExchange
+from price_service import PriceService
+from reconnect import ReconnectSupervisor
+from rest_session import PooledSession
+from scheduler import get_scheduler
+from ws_decode import DecodeError, SampledLogger, event_type, loads
 
 logger = logging.getLogger(__name__)
 msg_logger = logging.getLogger("ws-msg")
@@ -19,94 +28,200 @@ class BinanceClient:
 
     def __init__(self):
 
-        # 重连计数器
-        self.MAX_RECONNECT_ATTEMPTS = 3
-        self.RECONNECT_DELAY = 5
-        self.reconnect_count = 0
+        # 断线重连在独立线程中按指数退避重试，恢复后补齐断线期间的K线
+        self.reconnector = ReconnectSupervisor(
+            self._reconnect,
+            on_reconnected=self._backfill_klines,
+            base_delay=app_config.getfloat("websocket", "reconnect_base_delay", fallback=1),
+            max_delay=app_config.getfloat("websocket", "reconnect_max_delay", fallback=60),
+        )
+        # 每个交易对最近一根已收盘K线的开盘时间，重连后从这里开始补齐
+        self.last_closed_kline = {}
+        # 重连后补齐K线期间收到的实时K线，补齐完成后按顺序处理，为None时不缓存
+        self._backfill_buffer = None
+        self._backfill_lock = threading.Lock()
 
         # 订单listen_key
         self.listen_key = None
         self.listen_key_expiry_time = 0
 
-        # ticker数据
-        self.current_price_map = {}
+        # 盘口/标记价格/最新成交价缓存，推送价格都过期时才通过REST获取
+        self.prices = PriceService(
+            max_age=app_config.getfloat("websocket", "price_max_age", fallback=5),
+            rest_fallback=lambda symbol: self.client.ticker_price(symbol=symbol)["price"],
+        )
 
         # K线回调函数
         self.kline_callback = None
 
-        self.api_key = os.environ["BINANCE_API_KEY"]
-        self.secret_key = os.environ["BINANCE_SECRET_KEY"]
-        self.symbol = app_config["trading"]["symbol"]
-        self.leverage = app_config.getint("trading", "leverage")
+        # 订单、持仓、盈亏和钱包余额台账，由用户数据流推送更新
+        self.ledger = AccountLedger(config_snapshot().trading.initial_balance)
+
+        # 按事件类型分发的消息处理函数
+        self.event_handlers = {
+            "kline": self._handle_kline_message,
+            "bookTicker": self.prices.on_book_ticker,
+            "markPriceUpdate": self.prices.on_mark_price,
+            "ORDER_TRADE_UPDATE": self.ledger.on_order_update,
+            "ACCOUNT_UPDATE": self.ledger.on_account_update,
+        }
+        # K线消息日志按采样率记录
+        self.kline_msg_logger = SampledLogger(
+            msg_logger, app_config.getfloat("websocket", "msg_log_sample_rate", fallback=1.0)
+        )
+
+        # 已订阅的行情流（K线、盘口、标记价格）
+        self.market_streams = set()
+
+        # 模拟盘：行情使用实盘推送，下单在进程内撮合，不需要API密钥
+        self.paper = app_config.getboolean("paper", "enabled", fallback=False)
+        self.api_key = os.environ.get("BINANCE_API_KEY", "") if self.paper else os.environ["BINANCE_API_KEY"]
+        self.secret_key = os.environ.get("BINANCE_SECRET_KEY", "") if self.paper else os.environ["BINANCE_SECRET_KEY"]
+        self.symbol = config_snapshot().trading.symbol  # 主交易对
+        self.symbols = trading_symbols()
+        self.leverage = config_snapshot().trading.leverage
 
         self._init_rest_client()
-        self._init_wsclient()
 
-        # 启动ping定时器
-        self.ping_thread = threading.Thread(target=self._send_ping_periodically)
-        self.ping_thread.daemon = True
-        self.ping_thread.start()
+        # 交易规则缓存
+        self.exchange_info = ExchangeInfoCache(
+            app_config.get("storage", "exchange_info_cache", fallback="data/exchange_info.json"),
+            self.client.exchange_info,
+            ttl=app_config.getint("rest", "exchange_info_ttl", fallback=3600),
+        )
+        self.symbol_info = self.exchange_info.symbols
+
+        # 下单、查单和设置倍率使用的客户端，模拟盘时替换为进程内撮合
+        if self.paper:
+            self.trade_client = PaperExchange(
+                self.symbol_info,
+                balance=config_snapshot().trading.initial_balance,
+                fee_rate=app_config.getfloat("paper", "fee_rate", fallback=0.0004),
+                slippage=app_config.getfloat("paper", "slippage", fallback=0.0),
+            )
+            self.trade_client.listeners.append(self._handle_paper_event)
+            logger.info("模拟盘模式，订单不会发送到交易所")
+        else:
+            self.trade_client = self.client
+
+        self.set_leverage(self.leverage)
+        try:
+            self._init_wsclient()
+        except Exception as e:
+            logger.error(f"WebSocket连接或订阅失败: {str(e)}", exc_info=e)
+            self.reconnector.request("subscribe")
+        subscribe_config(self._on_config_change)
+
+        # ping 和 listenKey 续期由共享的调度线程执行
+        self.scheduler = get_scheduler()
+        self.ping_task = self.scheduler.every(
+            app_config.getfloat("websocket", "ping_interval", fallback=10), self._send_ping, name="ws_ping"
+        )
+        # 钱包余额启动时通过REST同步，之后由 ACCOUNT_UPDATE 推送更新，定期重新同步校正
+        self.balance_task = self.scheduler.every(
+            app_config.getfloat("rest", "balance_sync_interval", fallback=900), self.sync_balance,
+            name="balance_sync", delay=0,
+        )
+        self.listen_key_task = None
+        if not self.paper:
+            # listenKey 60分钟不续期会失效
+            self.listen_key_task = self.scheduler.every(
+                app_config.getfloat("websocket", "listen_key_keepalive", fallback=1800),
+                self._keepalive_listen_key,
+                name="listen_key_keepalive",
+            )
 
     def refresh_exchange_info(self):
-        """获取交易所信息"""
+        """
+        加载交易所交易规则，优先读取本地缓存，缓存过期后由后台线程刷新
+        """
+        self.symbol_info = self.exchange_info.load()
+        self.exchange_info.start()
 
-        logger.info("current position mode is: %s", self.client.get_position_mode())
+        if self.paper:
+            return
+        # 持仓模式只用于日志，不阻塞启动
+        threading.Thread(target=self._log_position_mode, daemon=True).start()
 
-        exchange_info = self.client.exchange_info()
-        symbol_info = {}
-        for sym in exchange_info.get("symbols", []):
-            if sym.get('status') != 'TRADING':
-                continue
-            
-            min_qty = None
-            step_size= None
-            tick_size = None
-            for flt in sym.get("filters", []):
-                if flt.get("filterType") == "MARKET_LOT_SIZE":
-                    min_qty, step_size = float(flt.get("minQty")), flt.get("stepSize")
-                if flt.get("filterType") == "PRICE_FILTER":
-                    tick_size = flt.get("tickSize")
-            symbol_info[sym.get("symbol")] = (min_qty, step_size, tick_size)
-
-        self.symbol_info = symbol_info
+    def _log_position_mode(self):
+        try:
+            logger.info("current position mode is: %s", self.client.get_position_mode())
+        except Exception as e:
+            logger.error(f"获取持仓模式失败: {str(e)}", exc_info=e)
 
     def _handle_message(self, ws_client, msg_str):
         """处理WebSocket消息"""
         try:
-            msg = json.loads(msg_str)
+            # 先按事件类型选择处理函数，不处理的消息不做完整解析
+            event = event_type(msg_str)
+            if event is None:
+                msg = loads(msg_str)
+                if "e" not in msg:
+                    # 订阅/取消订阅的响应
+                    if "id" in msg:
+                        logger.debug("WebSocket响应: %s", msg_str)
+                    else:
+                        logger.error("未定义消息类型: %s", msg_str)
+                    return
+                event = msg["e"]
+            else:
+                msg = None
 
-            if "e" not in msg:
-                logger.error("未定义消息类型: %s", msg_str)
+            handler = self.event_handlers.get(event)
+            if handler is None:
+                logger.error("未知的消息类型: %s", event)
                 return
 
-            if msg["e"] == "kline":
-                self._handle_kline_message(msg)
-            elif msg["e"] == "outboundAccountPosition":
-                self._handle_order_message(msg)
-            elif msg["e"] == "executionReport":
-                self._handle_order_message(msg)
-            else:
-                logger.error(f"未知的消息类型: {msg['e']}")
+            handler(loads(msg_str) if msg is None else msg)
 
-        except json.JSONDecodeError as e:
+        except DecodeError as e:
             logger.error("解析WebSocket消息失败: %s", msg_str, exc_info=e)
         except Exception as e:
             logger.error("处理WebSocket消息时发生未知错误: %s", msg_str, exc_info=e)
 
+    def _handle_paper_event(self, msg):
+        """模拟盘撮合产生的用户数据事件，与交易所推送的事件走同一套处理函数"""
+        handler = self.event_handlers.get(msg["e"])
+        if handler is None:
+            logger.debug("模拟盘事件: %s", msg)
+            return
+        handler(msg)
+
     def _handle_error(self, ws_client, error):
         """处理WebSocket错误"""
         logger.error(f"WebSocket error: {error}")
-        self._reconnect()
+        self.reconnector.request("error")
 
     def _handle_kline_message(self, msg: dict):
-        """处理K线消息"""
-
-        if msg.get("s") != self.symbol:
-            logger.warning(f"K线数据不是 {self.symbol} 数据: {msg}")
+        """处理K线消息，重连后补齐K线期间的实时K线先缓存，保证K线按时间顺序处理"""
+        if self._backfill_buffer is not None and not msg.get("backfill"):
+            with self._backfill_lock:
+                if self._backfill_buffer is not None:
+                    self._backfill_buffer.append(msg)
+                    return
+        self._process_kline(msg)
+
+    def _process_kline(self, msg):
+        if msg.get("s") not in self.symbols:
+            logger.warning(f"K线数据不是交易中的交易对数据: {msg}")
             return
 
-        self.current_price_map[msg.get("s")] = (msg.get("k", {}).get("c"), msg.get("E"))
-        msg_logger.info(f"Kline data: {msg}")
+        if not msg.get("backfill"):
+            # 重连后补齐的历史K线不是当前价格
+            self.prices.on_last_price(msg["s"], msg["k"]["c"])
+            if self.paper:
+                # 每次价格推送都检查模拟盘的止盈止损单
+                self.trade_client.on_price(msg["s"], msg["k"]["c"], msg.get("E") or int(time.time() * 1000))
+        self.kline_msg_logger.info("Kline data: %s", msg)
+
+        # 已收盘的K线写入本地存储，实时推送只接在存储的最后一根之后，缺口由REST补齐
+        kline = msg.get("k", {})
+        if kline.get("x"):
+            self.last_closed_kline[msg["s"]] = kline["t"]
+            try:
+                get_store(msg.get("s"), kline.get("i")).append_kline(kline, contiguous=not msg.get("backfill"))
+            except Exception as e:
+                logger.error(f"写入K线存储失败: {str(e)}", exc_info=e)
 
         # 如果有注册的K线回调函数，调用它
         if hasattr(self, "kline_callback") and self.kline_callback:
@@ -115,79 +230,102 @@ class BinanceClient:
             except Exception as e:
                 logger.error(f"执行K线回调函数时出错: {str(e)}")
 
-    def _handle_order_message(self, msg):
-        """处理订单消息"""
-
-        # 如果是订单执行报告
-        if msg.get("e") == "executionReport":
-            order_id = msg.get("i")  # 订单ID
-            order_status = msg.get("X")  # 订单状态
-            symbol = msg.get("s")  # 交易对
-
-            # 如果订单已成交，获取盈亏和手续费信息
-            if order_status == "FILLED":
-                # 获取订单详情，包括盈亏和手续费
-                try:
-                    order_info = self.get_order_info(order_id, symbol)
-                    pnl = order_info.get("realizedPnl", 0)
-                    fee = order_info.get("commission", 0)
-
-                    # 这里可以添加回调函数，通知订单管理器更新交易记录
-                    logger.info(f"订单 {order_id} 已成交，盈亏: {pnl}, 手续费: {fee}")
-                except Exception as e:
-                    logger.error(f"获取订单信息失败: {str(e)}")
-
-        # 如果是账户持仓更新
-        elif msg.get("e") == "outboundAccountPosition":
-            # 处理账户持仓信息
-            pass
-
-    def market_order(self, side, position_side, quantity=None, close_position=False):
+    def market_order(self, side, position_side, quantity=None, close_position=False, symbol=None):
         """
         市价下单
         :param position_side: LONG/SHORT
         :param quantity: 下单数量
         :param close_position: 是否平仓, 如果为True则忽略quantity参数
+        :param symbol: 交易对，默认为主交易对
         """
+        symbol = symbol or self.symbol
         if close_position:
-            return self.client.new_order(
-                symbol=self.symbol, side='SELL', type="MARKET", closePosition=True
+            return self.trade_client.new_order(
+                symbol=symbol, side=side, positionSide=position_side, type="MARKET", closePosition=True
             )
         else:
-            if self.symbol not in self.symbol_info:
-                raise ValueError(f"未获取到 {self.symbol} 信息, 无法执行交易")
+            if symbol not in self.symbol_info:
+                raise ValueError(f"未获取到 {symbol} 信息, 无法执行交易")
 
-            min_qty, step_size, tick_size = self.symbol_info[self.symbol]
+            min_qty, step_size, tick_size = self.symbol_info[symbol]
             quantity = self.quantize_quantity(str(quantity), step_size)
             if quantity < min_qty:
-                raise ValueError(f"{self.symbol}下单数量小于最小下单量 {min_qty}")
+                raise ValueError(f"{symbol}下单数量小于最小下单量 {min_qty}")
 
-            resp = self.client.new_order(
-                symbol=self.symbol, side=side, type="MARKET", quantity=quantity, positionSide=position_side
+            resp = self.trade_client.new_order(
+                symbol=symbol, side=side, type="MARKET", quantity=quantity, positionSide=position_side
             )
 
-            logger.info(f"创建开仓订单: [{self.symbol}] {position_side}, {quantity}")
+            logger.info(f"创建开仓订单: [{symbol}] {position_side}, {quantity}")
 
             return resp
 
-    def stop_order(self, side, position_side, stop_price, close_position=True):
+    def stop_order(self, side, position_side, stop_price, close_position=True, order_type="STOP_MARKET", symbol=None):
         """
         止损/止盈下单
         :param position_side: LONG/SHORT
         :param stop_price: 触发价格
         :param close_position: 是否平仓
+        :param order_type: STOP_MARKET/TAKE_PROFIT_MARKET
+        :param symbol: 交易对，默认为主交易对
         """
-        min_qty, step_size, tick_size = self.symbol_info[self.symbol]
+        symbol = symbol or self.symbol
+        min_qty, step_size, tick_size = self.symbol_info[symbol]
         stop_price = self.quantize_quantity(str(stop_price), tick_size)
-        return self.client.new_order(
-            symbol=self.symbol,
+        return self.trade_client.new_order(
+            symbol=symbol,
             side=side,
             positionSide=position_side,
-            type="STOP_MARKET",
+            type=order_type,
             stopPrice=stop_price,
             closePosition=close_position,
         )
 
+    def bracket_order(self, side, position_side, stop_profit_price, stop_loss_price, symbol=None):
+        """
+        通过批量下单接口一次提交止盈和止损两条腿
+        :param side: 止盈止损单方向，与开仓方向相反
+        :param position_side: LONG/SHORT
+        :param symbol: 交易对，默认为主交易对
+        :return: 每条腿的结果列表，顺序与提交顺序一致:
+                 [{"leg": "STOP_PROFIT", "type": ..., "stop_price": ..., "ok": True, "order": {...}, "error": None},
+                  {"leg": "STOP_LOSS", ..., "ok": False, "order": None, "error": {"code": -2021, "msg": "..."}}]
+        """
+        symbol = symbol or self.symbol
+        min_qty, step_size, tick_size = self.symbol_info[symbol]
+        legs = [
+            ("STOP_PROFIT", "TAKE_PROFIT_MARKET", self.quantize_quantity(str(stop_profit_price), tick_size)),
+            ("STOP_LOSS", "STOP_MARKET", self.quantize_quantity(str(stop_loss_price), tick_size)),
+        ]
+        # 批量接口的参数整体按JSON提交，取值统一用字符串
+        batch_orders = [
+            {
+                "symbol": symbol,
+                "side": side,
+                "positionSide": position_side,
+                "type": order_type,
+                "stopPrice": str(stop_price),
+                "closePosition": "true",
+            }
+            for _, order_type, stop_price in legs
+        ]
+        resp = self.trade_client.new_batch_order(batchOrders=batch_orders)
+
+        results = []
+        for (leg, order_type, stop_price), item in zip(legs, resp):
+            ok = "orderId" in item
+            results.append({
+                "leg": leg,
+                "type": order_type,
+                "stop_price": stop_price,
+                "ok": ok,
+                "order": item if ok else None,
+                "error": None if ok else {"code": item.get("code"), "msg": item.get("msg")},
+            })
+            if not ok:
+                logger.error(f"[{symbol}] {leg} 下单失败: {item}")
+        return results
+
     def list_subscription(self) -> list[str]:
         """
         查询已订阅的流
@@ -203,52 +341,101 @@ class BinanceClient:
         except Exception as e:
             logger.error(f"unsubscribe error: {e}", exc_info=e)
 
-    def subscribe_kline(self, append:bool = True):
-        """订阅K线数据"""
+    def subscribe_market(self, symbols=None):
+        """
+        订阅K线、盘口和标记价格，多个交易对在同一个连接上一次订阅
+        :param symbols: 交易对列表，默认为全部交易对
+        :return: 是否订阅成功
+        """
         interval = app_config["websocket"]["kline_interval"]
+        streams = []
+        for symbol in (symbols or self.symbols):
+            symbol = symbol.lower()
+            streams += [f"{symbol}@kline_{interval}", f"{symbol}@bookTicker", f"{symbol}@markPrice@1s"]
 
-        logger.info(
-            f"Subscribing to {self.symbol} Kline data with interval {interval}..."
-        )
+        logger.info(f"Subscribing to market data: {streams}")
         try:
-            if not append:
-                kline_subs = list(sub for sub in self.list_subscription() if '@kline' in sub)
-                self.unsubscribe(kline_subs)
-
-            self.ws_client.kline(symbol=self.symbol, interval=interval)
+            self.ws_client.subscribe(streams)
+            self.market_streams.update(streams)
+            return True
         except Exception as e:
             logger.error(f"WebSocket error: {e}", exc_info=e)
+            return False
+
+    def set_symbols(self, symbols):
+        """更新交易对列表，只订阅新增的交易对并取消已移除的交易对"""
+        added = [symbol for symbol in symbols if symbol not in self.symbols]
+        removed = [symbol for symbol in self.symbols if symbol not in symbols]
+        self.symbols = list(symbols)
+        self.symbol = self.symbols[0]
+
+        if removed:
+            removed_streams = [
+                stream for stream in self.market_streams
+                if stream.split("@", 1)[0] in {symbol.lower() for symbol in removed}
+            ]
+            self.unsubscribe(removed_streams)
+            self.market_streams.difference_update(removed_streams)
+
+        for symbol in added:
+            # 设置合约倍率
+            self.trade_client.change_leverage(symbol=symbol, leverage=self.leverage)
+        if added:
+            self.subscribe_market(added)
+
+    def set_leverage(self, leverage):
+        """更新所有交易对的合约倍率"""
+        self.leverage = leverage
+        for symbol in self.symbols:
+            self.trade_client.change_leverage(symbol=symbol, leverage=leverage)
+        logger.info(f"合约倍率已更新为: {leverage}")
+
+    def _on_config_change(self, old, new):
+        """合约倍率变更时立即更新交易所设置"""
+        if old.trading.leverage != new.trading.leverage:
+            self.set_leverage(new.trading.leverage)
 
     def subscribe_order(self):
         """订阅订单更新"""
+        if self.paper:
+            # 模拟盘的订单事件由进程内撮合直接回调
+            return
         if self.listen_key is None or time.time() >= self.listen_key_expiry_time:
             self.listen_key = self.client.new_listen_key()["listenKey"]
             self.listen_key_expiry_time = time.time() + 55 * 60  # 55分钟后过期
 
         self.ws_client.user_data(listen_key=self.listen_key, id=2)
 
-    def get_current_price(self, symbol=None):
+    def sync_balance(self):
+        """通过REST同步钱包余额，在调度线程中调用，失败时保留台账当前的余额"""
+        try:
+            self.ledger.set_balance(self.trade_client.balance())
+        except Exception as e:
+            logger.error(f"同步钱包余额失败，保留当前余额 {self.ledger.wallet_balance}: {str(e)}", exc_info=e)
+
+    def register_fill_callback(self, callback):
+        """注册成交回调函数
+        :param callback: 回调函数，接收台账中的订单（含本次成交价格和数量）作为参数
+        """
+        self.ledger.fill_callback = callback
+
+    def get_current_price(self, symbol=None, side=None):
         """
-        获取指定交易对的ticker信息
+        获取指定交易对的下单参考价格，优先使用推送的盘口价格，不阻塞在REST请求上
         :param symbol: 交易对符号，如BTCUSDT，默认使用配置中的symbol
-        :return: 包含最新价格等信息的字典
+        :param side: BUY 使用卖一价，SELL 使用买一价，不指定时使用中间价
+        :return: 价格
         """
-        if symbol is None:
-            symbol = self.symbol
+        return self.prices.price(symbol or self.symbol, side)
 
-        current_price_tp = self.current_price_map.get(symbol)
+    def price_stats(self):
+        """价格缓存的更新次数、数据年龄和REST回退统计"""
+        return self.prices.stats()
 
-        if (not current_price_tp) or time.time() * 1000 > current_price_tp[1] + 5000:
-            try:
-                ticker = self.client.ticker_price(symbol=symbol)
-                self.current_price_map[symbol] = (ticker["price"], time.time() * 1000)
-                return float(ticker["price"])
-            except Exception as e:
-                logger.error(f"获取{symbol}价格失败: {str(e)}", exc_info=e)
-                raise ValueError(f"获取{symbol}价格失败: {str(e)}")
+    def paper_stats(self):
+        """模拟盘账户余额和持仓，实盘时返回None"""
+        return self.trade_client.stats() if self.paper else None
 
-        return float(current_price_tp[0])
-    
     def _get_proxies(self):
         if app_config.getboolean("proxies", "enabled"):
             proxies = {"http": app_config.get("proxies", "http_proxy"), "https": app_config.get("proxies", "https_proxy")}
@@ -257,56 +444,183 @@ class BinanceClient:
         return proxies
 
     def _init_rest_client(self):
+        # 未配置时使用币安正式地址，指向本地模拟器时客户端代码不需要修改
+        base_url = app_config.get("exchange", "rest_base_url", fallback="")
         self.client = UMFutures(
-            key=self.api_key, secret=self.secret_key, proxies=self._get_proxies()
+            key=self.api_key, secret=self.secret_key, proxies=self._get_proxies(), **({"base_url": base_url} if base_url else {})
+        )
+        # 使用连接池会话替换默认会话，保持长连接并统计各接口延迟
+        session = PooledSession(
+            pool_size=app_config.getint("rest", "pool_size", fallback=10),
+            order_timeout=(
+                app_config.getfloat("rest", "connect_timeout", fallback=3),
+                app_config.getfloat("rest", "order_timeout", fallback=5),
+            ),
+            query_timeout=(
+                app_config.getfloat("rest", "connect_timeout", fallback=3),
+                app_config.getfloat("rest", "query_timeout", fallback=10),
+            ),
         )
-        # 设置合约倍率
-        self.client.change_leverage(symbol=self.symbol, leverage=self.leverage)
+        session.headers.update(self.client.session.headers)
+        self.client.session = session
 
-    def _init_wsclient(self):
-        self.ws_client = UMFuturesWebsocketClient(
+    def _create_wsclient(self):
+        stream_url = app_config.get("exchange", "ws_base_url", fallback="")
+        return UMFuturesWebsocketClient(
+            **({"stream_url": stream_url} if stream_url else {}),
             proxies=self._get_proxies(),
             on_error=self._handle_error,
             on_message=self._handle_message,
         )
 
-        # 重新订阅
-        self.subscribe_kline()
+    def _init_wsclient(self):
+        self.ws_client = self._create_wsclient()
+
+        # 重新订阅，行情订阅失败时抛出异常，由重连线程退避重试
+        self.market_streams.clear()
+        if not self.subscribe_market():
+            raise ConnectionError("订阅行情失败")
         self.subscribe_order()
 
     def _reconnect(self):
-        """WebSocket重连机制"""
-        if self.reconnect_count < self.MAX_RECONNECT_ATTEMPTS:
-            self.reconnect_count += 1
+        """关闭旧连接并重新订阅行情和订单更新，在重连线程中调用"""
+        try:
+            self.ws_client.stop()
+        except Exception as e:
+            logger.warning(f"关闭WebSocket连接失败: {str(e)}")
+
+        # 新连接的实时K线在补齐断线期间的K线之后处理，避免补齐的K线早于已处理的K线被丢弃
+        with self._backfill_lock:
+            if self._backfill_buffer is None:
+                self._backfill_buffer = []
+
+        # 断线期间 listenKey 可能已失效，重新获取
+        self.listen_key = None
+        self._init_wsclient()
+
+    def _backfill_klines(self, downtime=None):
+        """
+        通过REST补齐断线期间已收盘的K线，按时间顺序交给K线处理流程（写入存储、更新策略指标）
+        补齐的K线带有 backfill 标记，策略只更新指标，不据此下单
+        补齐完成（或失败）后处理期间缓存的实时K线
+        """
+        try:
+            self._replay_missed_klines()
+        finally:
+            self._flush_backfill_buffer()
+
+    def _replay_missed_klines(self):
+        interval = app_config["websocket"]["kline_interval"]
+        for symbol in list(self.symbols):
+            last_open_time = self.last_closed_kline.get(symbol)
+            if last_open_time is None:
+                continue
+
+            count = 0
+            for row in self.fetch_klines(symbol, interval, last_open_time + 1):
+                self._process_kline({
+                    "e": "kline",
+                    "E": int(row[6]),
+                    "s": symbol,
+                    "backfill": True,
+                    "k": {
+                        "t": int(row[0]),
+                        "T": int(row[6]),
+                        "s": symbol,
+                        "i": interval,
+                        "o": row[1],
+                        "h": row[2],
+                        "l": row[3],
+                        "c": row[4],
+                        "v": row[5],
+                        "x": True,
+                    },
+                })
+                count += 1
+
+            if count:
+                logger.info(f"[{symbol}] 已补齐断线期间的{count}根K线")
+
+    def _flush_backfill_buffer(self):
+        """按收到的顺序处理缓存的实时K线，缓存为空后恢复直接处理"""
+        while True:
+            with self._backfill_lock:
+                pending = self._backfill_buffer
+                self._backfill_buffer = [] if pending else None
+            if not pending:
+                return
+            for msg in pending:
+                self._process_kline(msg)
+
+    def fetch_klines(self, symbol, interval, start_time, limit=1500, end_time=None):
+        """
+        分页获取从 start_time 开始的已收盘K线，每页最多 limit 根
+        :param end_time: 最后一根K线开盘时间的上限（毫秒，包含），默认到当前时间
+        :return: REST klines 接口格式的K线列表，不含未收盘的K线
+        """
+        now = int(time.time() * 1000)
+        params = {} if end_time is None else {"endTime": end_time}
+        result = []
+        while True:
+            rows = self.client.klines(symbol=symbol, interval=interval, startTime=start_time, limit=limit, **params)
+            closed = [row for row in rows if int(row[6]) < now]
+            result += closed
+            if len(rows) < limit or len(closed) < len(rows):
+                return result
+            start_time = int(rows[-1][0]) + 1
+
+    def load_history(self, symbol, bars, interval=None):
+        """
+        读取最近 bars 根已收盘K线，本地K线存储中缺少的部分通过REST分页补齐并写入存储，
+        重启或切换策略时只下载存储之后的新K线
+        存储不为空时从最后一根K线之后开始下载，即使停机时间超过 bars 根K线，存储也保持连续；
+        停机很久时下载的页数相应增加
+        存储中最早的K线之前还需要更多K线时（如预热更大周期的策略），更早的部分通过REST下载后直接返回，不写入存储
+        :return: {列名: 数组}，见 KlineStore.read
+        """
+        interval = interval or app_config["websocket"]["kline_interval"]
+        store = get_store(symbol, interval)
+        if bars <= 0:
+            return store.tail(0)
+
+        step = interval_ms(interval)
+        # 最近一根已收盘K线的开盘时间
+        latest = int(time.time() * 1000) // step * step - step
+        if store.last_open_time is None or store.last_open_time < latest:
+            if store.last_open_time is None:
+                start_time = latest - (bars - 1) * step
+            else:
+                start_time = store.last_open_time + 1
+            started = time.perf_counter()
+            count = store.extend(self.fetch_klines(symbol, interval, start_time))
             logger.info(
-                f"WebSocket断开，尝试第{self.reconnect_count}次重连，等待{self.RECONNECT_DELAY}秒..."
+                f"[{symbol}] 已下载{count}根{interval}历史K线，耗时{(time.perf_counter() - started) * 1000:.0f}ms"
             )
-            time.sleep(self.RECONNECT_DELAY)
 
-            try:
-                # 关闭现有连接
-                self.ws_client.stop()
+        klines = store.tail(bars)
+        missing = bars - len(klines["open_time"])
+        if missing <= 0:
+            return klines
 
-                # 重新初始化WebSocket客户端
-                self._init_wsclient()
+        # 存储只能追加，早于第一根K线的部分不写入存储
+        first = int(klines["open_time"][0]) if missing < bars else latest + step
+        rows = self.fetch_klines(symbol, interval, first - missing * step, end_time=first - 1)
+        logger.info(f"[{symbol}] 已下载存储之前的{len(rows)}根{interval}历史K线")
+        older = rows_to_columns(rows)
+        return {name: np.concatenate((older[name], klines[name])) for name in klines}
 
-                # 重置重连计数器
-                if self.ws_client.is_alive():
-                    logger.info("WebSocket重连成功")
-                    self.reconnect_count = 0
-            except Exception as e:
-                logger.error(f"WebSocket重连失败: {str(e)}", exc_info=e)
-                # 递归调用自身，继续尝试重连
-                self._reconnect()
-        else:
-            logger.error(
-                f"达到最大重连次数({self.MAX_RECONNECT_ATTEMPTS})，WebSocket连接失败"
-            )
-            # 可以在这里添加通知机制，如发送邮件或短信
+    def reconnect_stats(self):
+        """重连次数、最近一次断线原因和时长"""
+        return self.reconnector.stats()
+
+    def rest_latency_stats(self):
+        """各REST接口最近请求的延迟分位数（毫秒），分为总耗时、响应头耗时和新建连接耗时"""
+        return self.client.session.latency_stats()
 
     def get_order_info(self, order_id, symbol=None):
         """
         获取订单详情，包括盈亏和手续费信息
+        成交的盈亏和手续费已由台账从推送中维护，这里只用于手动查询
         :param order_id: 订单ID
         :param symbol: 交易对符号，默认使用配置中的symbol
         :return: 订单详情字典
@@ -316,12 +630,12 @@ class BinanceClient:
 
         try:
             # 获取订单信息
-            order = self.client.get_order(symbol=symbol, orderId=order_id)
+            order = self.trade_client.query_order(symbol=symbol, orderId=order_id)
 
             # 如果订单已成交，获取盈亏和手续费信息
             if order["status"] == "FILLED":
                 # 获取交易详情
-                trades = self.client.get_account_trades(symbol=symbol, orderId=order_id)
+                trades = self.trade_client.get_account_trades(symbol=symbol, orderId=order_id)
 
                 # 计算总盈亏和手续费
                 total_pnl = 0
@@ -338,17 +652,28 @@ class BinanceClient:
             logger.error(f"获取订单信息失败: {str(e)}", exc_info=e)
             return {}
 
-    def _send_ping_periodically(self):
-        """每10秒发送一次ping消息"""
-        while True:
-            try:
-                self.ws_client.ping()
-                msg_logger.info("Sent ping")
-            except Exception as e:
-                logger.error(f"Ping error: {e}", exc_info=e)
-                # 如果ping失败，尝试重连
-                self._reconnect()
-            time.sleep(10)
+    def _send_ping(self):
+        """发送ping消息，在调度线程中调用"""
+        try:
+            self.ws_client.ping()
+            msg_logger.info("Sent ping")
+        except Exception as e:
+            logger.error(f"Ping error: {e}", exc_info=e)
+            # 如果ping失败，交给重连线程处理，不阻塞调度线程
+            self.reconnector.request("ping")
+
+    def _keepalive_listen_key(self):
+        """延长 listenKey 有效期，续期失败时重新创建并订阅，在调度线程中调用"""
+        if self.listen_key is None:
+            return
+        try:
+            self.client.renew_listen_key(self.listen_key)
+            self.listen_key_expiry_time = time.time() + 55 * 60
+            logger.debug("listenKey 已续期")
+        except Exception as e:
+            logger.error(f"listenKey 续期失败，重新订阅订单更新: {str(e)}", exc_info=e)
+            self.listen_key = None
+            self.subscribe_order()
 
     def register_kline_callback(self, callback):
         """注册K线数据回调函数
@@ -364,7 +689,7 @@ class BinanceClient:
             logger.info(f"订阅{self.symbol} Ticker数据成功")
         except Exception as e:
             logger.error(f"订阅Ticker数据失败: {str(e)}", exc_info=e)
-            self._reconnect()
+            self.reconnector.request("subscribe")
 
     def quantize_quantity(self, quantity: float, step_size: float) -> float:
         qty = Decimal(str(quantity))
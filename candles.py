@@ -0,0 +1,160 @@
+"""
+K线聚合
+
+kline 推送每秒多次推送同一根未收盘K线的最新状态。聚合器跟踪当前K线，
+把推送整理成策略需要的事件：
+- 收盘模式（close）：每根K线只在收盘时交给策略一次
+- 盘中模式（intrabar）：每次推送都交给策略，同一根K线的更新由策略原地修改最后一根K线，不追加新数据
+
+没有收到收盘推送（如断线、丢消息）但已出现下一根K线时，用最后一次推送补发上一根K线的收盘事件；
+重复的收盘推送和早于当前K线的推送被丢弃。
+
+Resampler 在同一个基础周期订阅上合成更大的周期，策略可以同时使用多个周期。
+"""
+import logging
+
+from kline_store import interval_ms
+
+logger = logging.getLogger(__name__)
+
+# 策略的K线评估模式
+BAR_MODES = ("close", "intrabar")
+
+
+class CandleAggregator:
+    """单个交易对/周期的当前K线状态"""
+
+    def __init__(self):
+        self.open_time = None  # 当前K线的开盘时间
+        self.closed_open_time = None  # 最近一根已收盘K线的开盘时间
+        self.last_kline = None  # 当前K线的最后一次推送
+        self.updates = 0  # 收到的推送数
+        self.closes = 0  # 产生的收盘事件数
+        self.synthetic_closes = 0  # 补发的收盘事件数
+
+    def update(self, kline_data):
+        """
+        :param kline_data: kline 推送消息
+        :return: [(kline消息, 是否收盘)]，按时间顺序
+        """
+        k = kline_data["k"]
+        open_time = k["t"]
+        self.updates += 1
+
+        if self.open_time is not None and open_time < self.open_time:
+            return []
+        if open_time == self.closed_open_time:
+            # 已收盘K线的重复推送
+            return []
+
+        events = []
+        if self.open_time is not None and open_time > self.open_time and self.closed_open_time != self.open_time:
+            # 上一根K线没有收到收盘推送
+            previous = dict(self.last_kline, k={**self.last_kline["k"], "x": True})
+            events.append((previous, True))
+            self.closes += 1
+            self.synthetic_closes += 1
+
+        closed = bool(k.get("x"))
+        events.append((kline_data, closed))
+        self.open_time = open_time
+        self.last_kline = kline_data
+        if closed:
+            self.closed_open_time = open_time
+            self.closes += 1
+        return events
+
+    def stats(self):
+        return {
+            "updates": self.updates,
+            "closes": self.closes,
+            "synthetic_closes": self.synthetic_closes,
+        }
+
+
+class Resampler:
+    """
+    由基础周期（如1m）的K线增量合成更大周期（如5m/15m/1h/4h）的K线，每次推送每个周期O(1)更新
+    所有周期都由同一个订阅合成，彼此一致
+    :param base_interval: 基础K线周期
+    :param intervals: 需要合成的周期，必须是基础周期的整数倍
+    """
+
+    def __init__(self, base_interval, intervals):
+        base_ms = interval_ms(base_interval)
+        self.base_interval = base_interval
+        self.intervals = {}
+        for interval in intervals:
+            ms = interval_ms(interval)
+            if ms <= base_ms or ms % base_ms:
+                raise ValueError(f"{interval} 不是 {base_interval} 的整数倍")
+            self.intervals[interval] = ms
+        self.bars = {}  # 周期 -> 当前K线
+
+    def update(self, kline, closed):
+        """
+        :param kline: 基础周期的 kline 消息（盘中或收盘）
+        :param closed: 基础周期K线是否已收盘
+        :return: [(周期, kline消息, 是否收盘)]
+        """
+        k = kline["k"]
+        open_time = k["t"]
+        high = float(k["h"])
+        low = float(k["l"])
+        close = float(k["c"])
+        volume = float(k["v"])
+
+        events = []
+        for interval, ms in self.intervals.items():
+            bar = self.bars.get(interval)
+            bucket = open_time - open_time % ms
+            if bar is None or bar["t"] != bucket:
+                if bar is not None and not bar["x"]:
+                    # 上一个周期没有收到最后一根基础K线的收盘，直接结束
+                    bar["x"] = True
+                    events.append((interval, self._message(kline, interval, bar), True))
+                bar = self.bars[interval] = {
+                    "t": bucket, "T": bucket + ms - 1, "o": float(k["o"]), "h": high, "l": low, "c": close,
+                    "base_t": open_time, "base_v": 0.0, "closed_v": 0.0, "x": False,
+                }
+            elif bar["x"]:
+                # 已收盘周期的重复推送
+                continue
+            elif open_time != bar["base_t"]:
+                # 新的基础K线，上一根基础K线的成交量计入已收盘部分
+                bar["closed_v"] += bar["base_v"]
+                bar["base_t"] = open_time
+
+            # 同一根基础K线的最高/最低价只会扩大，直接取极值
+            if high > bar["h"]:
+                bar["h"] = high
+            if low < bar["l"]:
+                bar["l"] = low
+            bar["c"] = close
+            bar["base_v"] = volume
+            bar["x"] = closed and k["T"] >= bar["T"]
+            events.append((interval, self._message(kline, interval, bar), bar["x"]))
+        return events
+
+    @staticmethod
+    def _message(kline, interval, bar):
+        message = {
+            "e": "kline",
+            "E": kline.get("E"),
+            "s": kline.get("s"),
+            "k": {
+                "t": bar["t"],
+                "T": bar["T"],
+                "s": kline.get("s"),
+                "i": interval,
+                "o": bar["o"],
+                "h": bar["h"],
+                "l": bar["l"],
+                "c": bar["c"],
+                "v": bar["closed_v"] + bar["base_v"],
+                "x": bar["x"],
+            },
+        }
+        if kline.get("backfill"):
+            message["backfill"] = True
+        return message
@@ -1,11 +1,125 @@
 import configparser
+import logging
+import os
+import threading
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# 同时运行多个实例（如多个模拟盘策略）时，通过环境变量为每个实例指定配置文件
+CONFIG_FILE = os.environ.get('LOTTERY_CONFIG', 'config/config.ini')
 
 app_config = configparser.ConfigParser()
-app_config.read('config/config.ini')
+app_config.read(CONFIG_FILE)
+
+
+class TradingConfig(NamedTuple):
+    """[trading] 配置，已转换为对应类型"""
+    symbol: str
+    symbols: tuple  # 主交易对在第一位
+    leverage: int
+    position_percent: float
+    initial_balance: float
+    max_hold_time: int
+    stop_profit: float
+    stop_loss: float
+    consecutive_losses: int
+    disable_time: int
+
+    @classmethod
+    def from_section(cls, section):
+        primary = section["symbol"].strip().upper()
+        symbols = [primary]
+        for symbol in section.get("symbols", "").split(","):
+            symbol = symbol.strip().upper()
+            if symbol and symbol not in symbols:
+                symbols.append(symbol)
+
+        try:
+            return cls(
+                symbol=primary,
+                symbols=tuple(symbols),
+                leverage=int(section["leverage"]),
+                position_percent=float(section["position_percent"]),
+                initial_balance=float(section["initial_balance"]),
+                max_hold_time=int(section["max_hold_time"]),
+                stop_profit=float(section["stop_profit"]),
+                stop_loss=float(section["stop_loss"]),
+                consecutive_losses=int(section["consecutive_losses"]),
+                disable_time=int(section["disable_time"]),
+            )
+        except KeyError as e:
+            raise ValueError(f"缺少交易配置: {e.args[0]}")
+
+
+class ConfigSnapshot(NamedTuple):
+    """
+    某一版本的完整配置，创建后不再修改
+    保存配置时整体替换，读取方拿到的始终是一致的一份配置，不需要加锁
+    """
+    version: int
+    trading: TradingConfig
+    sections: dict  # 原始配置 {section: {option: value}}
+
+
+def _build_snapshot(parser, version):
+    sections = {section: dict(parser.items(section)) for section in parser.sections()}
+    return ConfigSnapshot(version, TradingConfig.from_section(sections["trading"]), sections)
+
+
+_lock = threading.Lock()
+_subscribers = []
+_snapshot = _build_snapshot(app_config, 1)
+
+
+def config_snapshot():
+    """当前配置快照"""
+    return _snapshot
+
+
+def subscribe_config(callback):
+    """
+    订阅配置变更，保存配置后以 callback(old, new) 调用
+    :param callback: 参数为变更前后的 ConfigSnapshot
+    """
+    with _lock:
+        _subscribers.append(callback)
+
 
 def override_config(new_config:dict):
-    for option, value in new_config.items():
-        app_config.set("trading", option, str(value))
+    """
+    更新 [trading] 配置并写回配置文件
+    新配置先完整校验，校验通过后才写入文件、替换快照并通知订阅者
+    :raises ValueError: 配置值无效
+    """
+    global _snapshot
+    with _lock:
+        parser = configparser.ConfigParser()
+        parser.read_dict(_snapshot.sections)
+        for option, value in new_config.items():
+            parser.set("trading", option, str(value))
+
+        old = _snapshot
+        new = _build_snapshot(parser, old.version + 1)
+
+        # 先写临时文件再替换，写入过程中中断不会留下损坏的配置文件
+        tmp_file = CONFIG_FILE + ".tmp"
+        with open(tmp_file, "w") as configfile:
+            parser.write(configfile)
+        os.replace(tmp_file, CONFIG_FILE)
+
+        for option, value in new_config.items():
+            app_config.set("trading", option, str(value))
+        _snapshot = new
+        subscribers = list(_subscribers)
+
+    for callback in subscribers:
+        try:
+            callback(old, new)
+        except Exception as e:
+            logger.error(f"执行配置变更回调函数时出错: {str(e)}", exc_info=e)
+    return new
 
-    with open("config/config.ini", "w") as configfile:
-        app_config.write(configfile)
\ No newline at end of file
+def trading_symbols():
+    """交易的交易对列表，主交易对 symbol 在第一位，其余来自 symbols（逗号分隔）"""
+    return list(_snapshot.trading.symbols)
@@ -0,0 +1,127 @@
+"""
+服务端推送（Server-Sent Events）
+
+行情、持仓和交易事件发布到 EventBroadcaster，由后台线程按最大推送频率合并后
+一次性推送给所有已连接的页面。同一 key 的事件在一个推送周期内只保留最新的一条，
+发布事件只是一次字典赋值，可以在websocket线程中调用。
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event, data):
+    """编码为SSE消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class EventBroadcaster:
+    """
+    :param max_rate: 每秒最多推送次数
+    :param subscriber_queue: 每个连接的待推送队列长度，队列满说明页面读取过慢，断开该连接
+    :param keepalive: 没有事件时发送心跳的间隔秒数
+    """
+
+    def __init__(self, max_rate=4, subscriber_queue=100, keepalive=15):
+        self.interval = 1 / max_rate
+        self.subscriber_queue = subscriber_queue
+        self.keepalive = keepalive
+
+        self._pending = {}  # key -> (event, data)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._subscribers = set()
+
+        self.published = 0  # 发布的事件数
+        self.pushed = 0  # 合并后推送的事件数
+        self.evicted = 0  # 因读取过慢被断开的连接数
+
+        self._thread = threading.Thread(target=self._run, name="event-broadcaster", daemon=True)
+        self._thread.start()
+
+    def publish(self, event, data, key=None):
+        """
+        发布事件，同一 key 在一个推送周期内只推送最新的一条
+        :param key: 合并事件的键，默认按事件类型合并
+        """
+        with self._lock:
+            self._pending[key or event] = (event, data)
+            self.published += 1
+        self._wakeup.set()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.subscriber_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, initial=()):
+        """
+        单个连接的SSE消息生成器，在Flask的请求线程中迭代
+        :param initial: 连接建立时先推送的 (event, data) 列表
+        """
+        subscriber = self.subscribe()
+        try:
+            for event, data in initial:
+                yield format_event(event, data)
+            while True:
+                try:
+                    chunk = subscriber.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if chunk is None:
+                    # 读取过慢被断开
+                    return
+                yield chunk
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                subscribers = list(self._subscribers)
+            if pending and subscribers:
+                # 每条事件只编码一次，所有连接共用
+                chunk = "".join(format_event(event, data) for event, data in pending.values())
+                self.pushed += len(pending)
+                for subscriber in subscribers:
+                    try:
+                        subscriber.put_nowait(chunk)
+                    except queue.Full:
+                        self._evict(subscriber)
+
+            # 限制推送频率，期间到达的事件合并到下一次推送
+            time.sleep(self.interval)
+
+    def _evict(self, subscriber):
+        self.unsubscribe(subscriber)
+        self.evicted += 1
+        logger.warning("推送连接读取过慢，已断开")
+        # 清空队列后放入结束标记
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait(None)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "pushed": self.pushed,
+            "evicted": self.evicted,
+        }
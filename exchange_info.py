@@ -0,0 +1,127 @@
+"""
+交易所交易规则缓存
+
+解析后的交易对过滤条件 (min_qty, step_size, tick_size) 保存在本地文件中，
+启动和重连时直接读取，不再等待完整的 exchange_info 下载。
+缓存过期后由后台线程刷新，刷新结果原地更新到同一个字典，已持有该字典的代码无需重新获取。
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def parse_symbol_filters(exchange_info):
+    """
+    解析 exchange_info，只保留交易中的交易对
+    :return: {symbol: (min_qty, step_size, tick_size)}
+    """
+    symbol_info = {}
+    for sym in exchange_info.get("symbols", []):
+        if sym.get('status') != 'TRADING':
+            continue
+
+        min_qty = None
+        step_size = None
+        tick_size = None
+        for flt in sym.get("filters", []):
+            if flt.get("filterType") == "MARKET_LOT_SIZE":
+                min_qty, step_size = float(flt.get("minQty")), flt.get("stepSize")
+            if flt.get("filterType") == "PRICE_FILTER":
+                tick_size = flt.get("tickSize")
+        symbol_info[sym.get("symbol")] = (min_qty, step_size, tick_size)
+    return symbol_info
+
+
+class ExchangeInfoCache:
+    """
+    :param path: 缓存文件路径
+    :param fetch: 下载 exchange_info 的函数
+    :param ttl: 缓存有效秒数
+    """
+
+    def __init__(self, path, fetch, ttl=3600):
+        self.path = path
+        self.fetch = fetch
+        self.ttl = ttl
+        self.symbols = {}  # {symbol: (min_qty, step_size, tick_size)}，刷新时原地更新
+        self.fetched_at = 0
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def expired(self):
+        return time.time() - self.fetched_at >= self.ttl
+
+    def load(self):
+        """
+        读取缓存文件，缓存不存在或无法读取时同步下载
+        缓存已过期时仍先使用，由后台刷新
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                cached = json.load(f)
+            self._apply({symbol: tuple(filters) for symbol, filters in cached["symbols"].items()})
+            self.fetched_at = cached["fetched_at"]
+            logger.info(f"已从缓存加载{len(self.symbols)}个交易对的交易规则")
+        except FileNotFoundError:
+            self.refresh()
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"交易规则缓存无效，重新下载: {str(e)}")
+            self.refresh()
+        return self.symbols
+
+    def refresh(self):
+        """下载并解析 exchange_info，原地更新交易规则并写入缓存文件"""
+        with self._refresh_lock:
+            symbols = parse_symbol_filters(self.fetch())
+            changed = self._apply(symbols)
+            self.fetched_at = time.time()
+            self._save()
+        if changed:
+            logger.info(f"交易规则已更新: {changed}")
+        return changed
+
+    def _apply(self, symbols):
+        """原地更新交易规则，返回过滤条件变化的交易对"""
+        changed = [
+            symbol for symbol, filters in symbols.items()
+            if symbol in self.symbols and self.symbols[symbol] != filters
+        ]
+        self.symbols.update(symbols)
+        for symbol in [symbol for symbol in self.symbols if symbol not in symbols]:
+            # 已下架或暂停交易的交易对
+            del self.symbols[symbol]
+        return changed
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": self.fetched_at, "symbols": self.symbols}, f)
+        os.replace(tmp_path, self.path)
+
+    def start(self):
+        """启动后台刷新线程，缓存过期时刷新"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="exchange-info-refresh", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            wait = self.fetched_at + self.ttl - time.time()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"刷新交易规则失败: {str(e)}", exc_info=e)
+                # 稍后重试，期间继续使用旧的交易规则
+                time.sleep(min(60, self.ttl))
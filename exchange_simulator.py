@@ -0,0 +1,841 @@
+"""
+本地币安U本位合约交易所模拟器，用于离线测试
+
+实现客户端用到的REST和websocket接口子集：
+- REST: exchangeInfo, ticker/price, klines, leverage, positionSide/dual, balance, order（下单/查询）,
+  batchOrders, userTrades, listenKey
+- websocket: <symbol>@kline_<interval>, <symbol>@bookTicker, <symbol>@markPrice@1s, 用户数据流（listenKey）
+
+撮合是确定性的：MARKET 单按当前价格立即成交，STOP_MARKET/TAKE_PROFIT_MARKET 单在每个价格tick检查触发，
+触发后按触发时的价格成交。价格来自历史K线CSV（每根K线按 开-低-高-收 或 开-高-低-收 拆成tick）或固定种子的随机游走。
+不校验签名，任何 API key 都可以使用。
+
+启动后把 config.ini 的 [exchange] rest_base_url / ws_base_url 指向模拟器即可，客户端代码不需要修改：
+
+    uv run exchange_simulator.py --symbols LAYERUSDT --feed LAYERUSDT="data/LAYERUSDT-1m-*.csv"
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import random
+import socketserver
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from kline_store import interval_ms
+
+logger = logging.getLogger(__name__)
+
+# 默认交易规则 (min_qty, step_size, tick_size)
+DEFAULT_FILTERS = ("1", "1", "0.0001")
+
+
+def dumps(obj):
+    """与币安推送一致的紧凑JSON，ws_decode.event_type 依赖 "e":" 前缀不含空格"""
+    return json.dumps(obj, separators=(",", ":"))
+
+
+class SimulatorError(Exception):
+    """返回给客户端的币安格式错误"""
+
+    def __init__(self, code, msg, status=400):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.status = status
+
+
+def _is_true(value):
+    return str(value).lower() == "true"
+
+
+def _fmt(value):
+    """数值按币安接口的字符串格式返回"""
+    return f"{value:.8f}".rstrip("0").rstrip(".") if value else "0"
+
+
+class MatchingEngine:
+    """
+    持仓、订单和成交记录，所有修改都在同一把锁下完成
+    :param filters: {symbol: (min_qty, step_size, tick_size)}
+    :param fee_rate: 手续费率
+    :param balance: 初始USDT余额
+    :param slippage: 滑点比例，买入按成交价上浮、卖出按成交价下调
+    """
+
+    def __init__(self, filters, fee_rate=0.0004, balance=10000.0, slippage=0.0):
+        self.filters = filters
+        self.fee_rate = fee_rate
+        self.balance = balance
+        self.slippage = slippage
+
+        self.prices = {}  # symbol -> 最新价格
+        self.leverage = dict.fromkeys(filters, 20)
+        self.positions = {}  # (symbol, positionSide) -> [数量, 开仓均价]
+        self.orders = {}  # orderId -> 订单
+        self.open_orders = {}  # 未成交的订单，撮合时只检查这些订单
+        self.trades = []  # 成交记录
+        self.time_ms = int(time.time() * 1000)  # 模拟时间
+
+        self.listeners = []  # 用户数据事件回调 fn(event)
+        self._lock = threading.RLock()
+        self._next_order_id = 1
+        self._next_trade_id = 1
+
+    # ------------------ 下单 ------------------
+
+    def new_order(self, params):
+        with self._lock:
+            symbol = params.get("symbol")
+            if symbol not in self.filters:
+                raise SimulatorError(-1121, "Invalid symbol.")
+            side = params.get("side")
+            if side not in ("BUY", "SELL"):
+                raise SimulatorError(-1117, "Invalid side.")
+            position_side = params.get("positionSide", "BOTH")
+            order_type = params.get("type")
+            close_position = _is_true(params.get("closePosition"))
+            quantity = float(params["quantity"]) if params.get("quantity") else 0.0
+            price = self.prices.get(symbol)
+            if price is None:
+                raise SimulatorError(-1, f"No price for {symbol}.")
+
+            order = {
+                "orderId": self._next_order_id,
+                "symbol": symbol,
+                "status": "NEW",
+                "clientOrderId": params.get("newClientOrderId") or f"sim{self._next_order_id}",
+                "price": "0",
+                "avgPrice": "0",
+                "origQty": _fmt(quantity),
+                "executedQty": "0",
+                "cumQuote": "0",
+                "timeInForce": "GTC",
+                "type": order_type,
+                "origType": order_type,
+                "reduceOnly": close_position,
+                "closePosition": close_position,
+                "side": side,
+                "positionSide": position_side,
+                "stopPrice": _fmt(float(params.get("stopPrice") or 0)),
+                "workingType": "CONTRACT_PRICE",
+                "priceProtect": False,
+                "updateTime": self.time_ms,
+            }
+
+            if order_type == "MARKET":
+                if close_position:
+                    quantity = self._position(symbol, position_side)[0]
+                    if not quantity:
+                        raise SimulatorError(-2022, "ReduceOnly Order is rejected.")
+                elif quantity <= 0:
+                    raise SimulatorError(-4003, "Quantity less than or equal to zero.")
+                self._accept(order)
+                self._fill(order, price, quantity)
+            elif order_type in ("STOP_MARKET", "TAKE_PROFIT_MARKET"):
+                if not close_position and quantity <= 0:
+                    raise SimulatorError(-4003, "Quantity less than or equal to zero.")
+                if self._triggered(order, price):
+                    raise SimulatorError(-2021, "Order would immediately trigger.")
+                self._accept(order)
+            else:
+                raise SimulatorError(-1116, "Invalid orderType.")
+            return dict(order)
+
+    def new_batch_order(self, batch_orders):
+        """批量下单，每条订单单独返回结果或错误"""
+        results = []
+        for params in batch_orders:
+            try:
+                results.append(self.new_order(params))
+            except SimulatorError as e:
+                results.append({"code": e.code, "msg": e.msg})
+        return results
+
+    def get_order(self, symbol, order_id):
+        order = self.orders.get(int(order_id))
+        if order is None or order["symbol"] != symbol:
+            raise SimulatorError(-2013, "Order does not exist.")
+        return dict(order)
+
+    def account_trades(self, symbol, order_id=None, limit=500):
+        trades = [
+            trade for trade in self.trades
+            if trade["symbol"] == symbol and (order_id is None or trade["orderId"] == int(order_id))
+        ]
+        return trades[-limit:]
+
+    def account_balance(self):
+        return [{
+            "accountAlias": "SIM",
+            "asset": "USDT",
+            "balance": _fmt(self.balance),
+            "crossWalletBalance": _fmt(self.balance),
+            "availableBalance": _fmt(self.balance),
+            "updateTime": self.time_ms,
+        }]
+
+    def change_leverage(self, symbol, leverage):
+        if symbol not in self.filters:
+            raise SimulatorError(-1121, "Invalid symbol.")
+        self.leverage[symbol] = int(leverage)
+        return {"leverage": int(leverage), "maxNotionalValue": "1000000", "symbol": symbol}
+
+    # ------------------ 撮合 ------------------
+
+    def on_price(self, symbol, price, time_ms):
+        """价格更新，按订单号顺序检查止盈止损单是否触发"""
+        with self._lock:
+            self.prices[symbol] = price
+            self.time_ms = time_ms
+            for order in list(self.open_orders.values()):
+                if order["symbol"] != symbol or order["status"] != "NEW":
+                    continue
+                if not self._triggered(order, price):
+                    continue
+                if order["closePosition"]:
+                    quantity = self._position(symbol, order["positionSide"])[0]
+                else:
+                    quantity = float(order["origQty"])
+                if quantity:
+                    self._fill(order, price, quantity)
+                else:
+                    self._finish(order, "EXPIRED")
+
+    @staticmethod
+    def _triggered(order, price):
+        stop_price = float(order["stopPrice"])
+        # 止损：卖出在价格跌破时触发，买入在价格涨破时触发；止盈相反
+        if order["type"] == "STOP_MARKET":
+            return price <= stop_price if order["side"] == "SELL" else price >= stop_price
+        if order["type"] == "TAKE_PROFIT_MARKET":
+            return price >= stop_price if order["side"] == "SELL" else price <= stop_price
+        return False
+
+    def _position(self, symbol, position_side):
+        return self.positions.setdefault((symbol, position_side), [0.0, 0.0])
+
+    def _accept(self, order):
+        self._next_order_id += 1
+        self.orders[order["orderId"]] = order
+        self.open_orders[order["orderId"]] = order
+        self._emit_order(order, "NEW")
+
+    def _fill(self, order, price, quantity):
+        symbol = order["symbol"]
+        position_side = order["positionSide"]
+        position = self._position(symbol, position_side)
+        opening = (order["side"] == "BUY") == (position_side != "SHORT")
+        if self.slippage:
+            price *= 1 + self.slippage if order["side"] == "BUY" else 1 - self.slippage
+
+        realized_pnl = 0.0
+        if opening:
+            total = position[0] + quantity
+            position[1] = (position[0] * position[1] + quantity * price) / total
+            position[0] = total
+        else:
+            quantity = min(quantity, position[0])
+            direction = 1 if position_side != "SHORT" else -1
+            realized_pnl = (price - position[1]) * quantity * direction
+            position[0] -= quantity
+            if position[0] <= 0:
+                position[0], position[1] = 0.0, 0.0
+
+        commission = price * quantity * self.fee_rate
+        self.balance += realized_pnl - commission
+
+        trade = {
+            "symbol": symbol,
+            "id": self._next_trade_id,
+            "orderId": order["orderId"],
+            "side": order["side"],
+            "price": _fmt(price),
+            "qty": _fmt(quantity),
+            "realizedPnl": _fmt(realized_pnl) if realized_pnl >= 0 else "-" + _fmt(-realized_pnl),
+            "marginAsset": "USDT",
+            "quoteQty": _fmt(price * quantity),
+            "commission": _fmt(commission),
+            "commissionAsset": "USDT",
+            "time": self.time_ms,
+            "positionSide": position_side,
+            "buyer": order["side"] == "BUY",
+            "maker": False,
+        }
+        self._next_trade_id += 1
+        self.trades.append(trade)
+
+        order.update({
+            "executedQty": _fmt(quantity),
+            "origQty": _fmt(quantity) if order["closePosition"] else order["origQty"],
+            "avgPrice": _fmt(price),
+            "cumQuote": _fmt(price * quantity),
+        })
+        self._finish(order, "FILLED", trade)
+        self._emit_account(symbol, position_side)
+
+        # 仓位平完后，同一方向上剩余的平仓单失效
+        if not position[0]:
+            for other in list(self.open_orders.values()):
+                if (other["status"] == "NEW" and other["closePosition"]
+                        and other["symbol"] == symbol and other["positionSide"] == position_side):
+                    self._finish(other, "EXPIRED")
+
+    def _finish(self, order, status, trade=None):
+        order["status"] = status
+        order["updateTime"] = self.time_ms
+        self.open_orders.pop(order["orderId"], None)
+        self._emit_order(order, "TRADE" if trade else status, trade)
+
+    # ------------------ 用户数据事件 ------------------
+
+    def _emit(self, event):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"推送用户数据事件失败: {str(e)}", exc_info=e)
+
+    def _emit_order(self, order, execution_type, trade=None):
+        self._emit({
+            "e": "ORDER_TRADE_UPDATE",
+            "E": self.time_ms,
+            "T": self.time_ms,
+            "o": {
+                "s": order["symbol"],
+                "c": order["clientOrderId"],
+                "S": order["side"],
+                "o": order["type"],
+                "f": order["timeInForce"],
+                "q": order["origQty"],
+                "p": order["price"],
+                "ap": order["avgPrice"],
+                "sp": order["stopPrice"],
+                "x": execution_type,
+                "X": order["status"],
+                "i": order["orderId"],
+                "l": trade["qty"] if trade else "0",
+                "z": order["executedQty"],
+                "L": trade["price"] if trade else "0",
+                "n": trade["commission"] if trade else "0",
+                "N": "USDT",
+                "T": self.time_ms,
+                "t": trade["id"] if trade else 0,
+                "m": False,
+                "R": order["reduceOnly"],
+                "wt": order["workingType"],
+                "ot": order["origType"],
+                "ps": order["positionSide"],
+                "cp": order["closePosition"],
+                "rp": trade["realizedPnl"] if trade else "0",
+            },
+        })
+
+    def _emit_account(self, symbol, position_side):
+        quantity, entry_price = self._position(symbol, position_side)
+        signed = -quantity if position_side == "SHORT" else quantity
+        self._emit({
+            "e": "ACCOUNT_UPDATE",
+            "E": self.time_ms,
+            "T": self.time_ms,
+            "a": {
+                "m": "ORDER",
+                "B": [{"a": "USDT", "wb": _fmt(self.balance), "cw": _fmt(self.balance), "bc": "0"}],
+                "P": [{
+                    "s": symbol,
+                    "pa": _fmt(signed) if signed >= 0 else "-" + _fmt(-signed),
+                    "ep": _fmt(entry_price),
+                    "cr": "0",
+                    "up": "0",
+                    "mt": "cross",
+                    "iw": "0",
+                    "ps": position_side,
+                }],
+            },
+        })
+
+
+# ------------------ 价格来源 ------------------
+
+def synthetic_ticks(start_price=1.0, volatility=0.001, seed=0):
+    """固定种子的随机游走价格，相同参数生成相同的序列"""
+    rng = random.Random(seed)
+    price = start_price
+    while True:
+        yield price
+        price = max(price * (1 + rng.gauss(0, volatility)), 1e-8)
+
+
+def recorded_ticks(paths):
+    """
+    历史K线拆成tick：阳线按 开-低-高-收，阴线按 开-高-低-收
+    :param paths: K线CSV文件，支持通配符
+    """
+    from backtest import load_klines_csv
+
+    klines = load_klines_csv(paths)
+    for o, h, l, c in zip(klines["open"], klines["high"], klines["low"], klines["close"]):
+        if c >= o:
+            yield from (float(o), float(l), float(h), float(c))
+        else:
+            yield from (float(o), float(h), float(l), float(c))
+
+
+class MarketFeed:
+    """
+    按固定节奏推进模拟时间，每个tick更新撮合价格并推送行情
+    :param feeds: {symbol: 价格迭代器}
+    :param interval: K线周期
+    :param ticks_per_bar: 每根K线的tick数
+    :param tick_seconds: 两个tick之间的真实等待秒数，0 表示尽快推进
+    """
+
+    def __init__(self, engine, broadcast, feeds, interval="1m", ticks_per_bar=4, tick_seconds=0.25):
+        self.engine = engine
+        self.broadcast = broadcast
+        self.feeds = feeds
+        self.interval = interval
+        self.bar_ms = interval_ms(interval)
+        self.ticks_per_bar = ticks_per_bar
+        self.tick_seconds = tick_seconds
+
+        # 模拟时间从当前K线周期开始
+        self.bar_open = int(time.time() * 1000) // self.bar_ms * self.bar_ms
+        self.tick = 0
+        self.bars = {symbol: None for symbol in feeds}  # 当前K线
+        self.closed = {symbol: [] for symbol in feeds}  # 已收盘K线，REST klines 接口使用
+        self._thread = None
+
+    def step(self):
+        """推进一个tick，所有价格源结束时返回False"""
+        now = self.bar_open + self.bar_ms * (self.tick % self.ticks_per_bar) // self.ticks_per_bar
+        closing = self.tick % self.ticks_per_bar == self.ticks_per_bar - 1
+        alive = False
+        for symbol, feed in self.feeds.items():
+            price = next(feed, None)
+            if price is None:
+                continue
+            alive = True
+            bar = self.bars[symbol]
+            if bar is None:
+                bar = self.bars[symbol] = [self.bar_open, price, price, price, price, 0.0]
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += 1.0
+
+            self.engine.on_price(symbol, price, now)
+            self._publish(symbol, bar, price, now, closing)
+
+            if closing:
+                self.closed[symbol].append(list(bar))
+                self.bars[symbol] = None
+
+        self.tick += 1
+        if closing:
+            self.bar_open += self.bar_ms
+        return alive
+
+    def seed_history(self, bars):
+        """
+        用价格源在当前K线之前生成 bars 根已收盘K线，只供 REST klines 接口返回，不推送行情
+        客户端启动时的历史K线下载和策略预热与实时行情衔接
+        """
+        for symbol, feed in self.feeds.items():
+            history = []
+            for i in range(bars, 0, -1):
+                prices = [price for price in (next(feed, None) for _ in range(self.ticks_per_bar)) if price is not None]
+                if not prices:
+                    break
+                history.append([self.bar_open - i * self.bar_ms, prices[0], max(prices), min(prices), prices[-1],
+                                float(len(prices))])
+            self.closed[symbol] = history + self.closed[symbol]
+            if history:
+                self.engine.prices[symbol] = history[-1][4]
+
+    def _publish(self, symbol, bar, price, now, closing):
+        stream = symbol.lower()
+        tick_size = float(self.engine.filters[symbol][2])
+        self.broadcast(f"{stream}@kline_{self.interval}", {
+            "e": "kline",
+            "E": now,
+            "s": symbol,
+            "k": {
+                "t": bar[0],
+                "T": bar[0] + self.bar_ms - 1,
+                "s": symbol,
+                "i": self.interval,
+                "o": _fmt(bar[1]),
+                "h": _fmt(bar[2]),
+                "l": _fmt(bar[3]),
+                "c": _fmt(bar[4]),
+                "v": _fmt(bar[5]),
+                "x": closing,
+            },
+        })
+        self.broadcast(f"{stream}@bookTicker", {
+            "e": "bookTicker",
+            "E": now,
+            "T": now,
+            "s": symbol,
+            "b": _fmt(price - tick_size),
+            "B": "100",
+            "a": _fmt(price + tick_size),
+            "A": "100",
+        })
+        self.broadcast(f"{stream}@markPrice@1s", {
+            "e": "markPriceUpdate",
+            "E": now,
+            "s": symbol,
+            "p": _fmt(price),
+            "i": _fmt(price),
+            "r": "0",
+            "T": now,
+        })
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="market-feed", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self.step():
+            if self.tick_seconds:
+                time.sleep(self.tick_seconds)
+        logger.info("价格数据已全部推送")
+
+
+# ------------------ websocket ------------------
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WebSocketConnection:
+    """单个websocket连接，只实现文本帧、ping/pong 和 close"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.streams = set()
+        self._send_lock = threading.Lock()
+        self.closed = False
+
+    def send_text(self, text):
+        self._send_frame(0x1, text.encode())
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([length])
+        elif length < 1 << 16:
+            header += bytes([126]) + struct.pack(">H", length)
+        else:
+            header += bytes([127]) + struct.pack(">Q", length)
+        with self._send_lock:
+            if self.closed:
+                return
+            try:
+                self.sock.sendall(header + payload)
+            except OSError:
+                self.closed = True
+
+    def _recv_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            data += chunk
+        return data
+
+    def recv_frame(self):
+        """读取一帧，返回 (opcode, payload)"""
+        first, second = self._recv_exact(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self._recv_exact(8))[0]
+        mask = self._recv_exact(4) if second & 0x80 else None
+        payload = self._recv_exact(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+
+class WebSocketHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        simulator = self.server.simulator
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+        headers = {}
+        for line in request.split(b"\r\n")[1:]:
+            if b":" in line:
+                name, value = line.split(b":", 1)
+                headers[name.strip().lower()] = value.strip()
+        key = headers.get(b"sec-websocket-key", b"")
+        accept = base64.b64encode(hashlib.sha1(key + _WS_GUID.encode()).digest())
+        self.request.sendall(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+
+        conn = WebSocketConnection(self.request)
+        simulator.connections.add(conn)
+        try:
+            while True:
+                opcode, payload = conn.recv_frame()
+                if opcode == 0x8:  # close
+                    conn._send_frame(0x8, payload[:2])
+                    break
+                if opcode == 0x9:  # ping
+                    conn._send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    simulator.on_ws_message(conn, json.loads(payload))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            conn.closed = True
+            simulator.connections.discard(conn)
+
+
+# ------------------ REST ------------------
+
+class RestHandler(BaseHTTPRequestHandler):
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode()))
+
+        status, body = self.server.simulator.handle_request(method, url.path, params)
+
+        data = dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class ExchangeSimulator:
+    """
+    :param filters: {symbol: (min_qty, step_size, tick_size)}
+    :param feeds: {symbol: 价格迭代器}
+    """
+
+    def __init__(self, filters, feeds, host="127.0.0.1", rest_port=8080, ws_port=8081,
+                 interval="1m", ticks_per_bar=4, tick_seconds=0.25, fee_rate=0.0004, balance=10000.0):
+        self.engine = MatchingEngine(filters, fee_rate, balance)
+        self.engine.listeners.append(self._on_user_event)
+        self.feed = MarketFeed(self.engine, self.broadcast, feeds, interval, ticks_per_bar, tick_seconds)
+        self.connections = set()
+        self.listen_keys = set()
+        self._next_listen_key = 1
+
+        self.routes = {
+            ("GET", "/fapi/v1/exchangeInfo"): self._exchange_info,
+            ("GET", "/fapi/v1/ticker/price"): self._ticker_price,
+            ("GET", "/fapi/v1/klines"): self._klines,
+            ("POST", "/fapi/v1/leverage"): lambda p: self.engine.change_leverage(p.get("symbol"), p.get("leverage")),
+            ("GET", "/fapi/v1/positionSide/dual"): lambda p: {"dualSidePosition": True},
+            ("GET", "/fapi/v3/balance"): lambda p: self.engine.account_balance(),
+            ("POST", "/fapi/v1/order"): self.engine.new_order,
+            ("GET", "/fapi/v1/order"): lambda p: self.engine.get_order(p.get("symbol"), p.get("orderId")),
+            ("POST", "/fapi/v1/batchOrders"): lambda p: self.engine.new_batch_order(json.loads(p["batchOrders"])),
+            ("GET", "/fapi/v1/userTrades"): lambda p: self.engine.account_trades(
+                p.get("symbol"), p.get("orderId"), int(p.get("limit", 500))
+            ),
+            ("POST", "/fapi/v1/listenKey"): self._new_listen_key,
+            ("PUT", "/fapi/v1/listenKey"): lambda p: {},
+            ("DELETE", "/fapi/v1/listenKey"): lambda p: {},
+        }
+
+        self.host = host
+        self.rest_port = rest_port
+        self.ws_port = ws_port
+        self.rest_server = None
+        self.ws_server = None
+
+    @property
+    def rest_url(self):
+        host, port = self.rest_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ws_url(self):
+        host, port = self.ws_server.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self, feed=True):
+        self.rest_server = ThreadingHTTPServer((self.host, self.rest_port), RestHandler)
+        self.rest_server.simulator = self
+        self.ws_server = socketserver.ThreadingTCPServer((self.host, self.ws_port), WebSocketHandler)
+        self.ws_server.daemon_threads = True
+        self.ws_server.simulator = self
+        for server in (self.rest_server, self.ws_server):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        if feed:
+            self.feed.start()
+        logger.info(f"模拟交易所已启动: rest={self.rest_url}, ws={self.ws_url}")
+
+    def stop(self):
+        self.rest_server.shutdown()
+        self.ws_server.shutdown()
+
+    def handle_request(self, method, path, params):
+        """
+        处理REST请求，HTTP服务和进程内的假传输层共用
+        :return: (HTTP状态码, 响应内容)
+        """
+        route = self.routes.get((method, path))
+        try:
+            if route is None:
+                raise SimulatorError(-5000, f"Path {path} not supported by simulator.", status=404)
+            return 200, route(params)
+        except SimulatorError as e:
+            return e.status, {"code": e.code, "msg": e.msg}
+        except Exception as e:
+            logger.error(f"处理请求失败: {method} {path}", exc_info=e)
+            return 400, {"code": -1000, "msg": str(e)}
+
+    def broadcast(self, stream, event):
+        """推送事件到订阅了该流的所有连接"""
+        text = None
+        for conn in list(self.connections):
+            if stream in conn.streams:
+                text = text or dumps(event)
+                conn.send_text(text)
+
+    def on_ws_message(self, conn, msg):
+        method = msg.get("method")
+        if method == "SUBSCRIBE":
+            conn.streams.update(msg.get("params", []))
+            conn.send_text(dumps({"result": None, "id": msg.get("id")}))
+        elif method == "UNSUBSCRIBE":
+            conn.streams.difference_update(msg.get("params", []))
+            conn.send_text(dumps({"result": None, "id": msg.get("id")}))
+        elif method == "LIST_SUBSCRIPTIONS":
+            conn.send_text(dumps({"result": sorted(conn.streams), "id": msg.get("id")}))
+
+    def _on_user_event(self, event):
+        for listen_key in self.listen_keys:
+            self.broadcast(listen_key, event)
+
+    def _new_listen_key(self, params):
+        listen_key = f"simListenKey{self._next_listen_key}"
+        self._next_listen_key += 1
+        self.listen_keys.add(listen_key)
+        return {"listenKey": listen_key}
+
+    def _exchange_info(self, params):
+        symbols = []
+        for symbol, (min_qty, step_size, tick_size) in self.engine.filters.items():
+            symbols.append({
+                "symbol": symbol,
+                "status": "TRADING",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": tick_size},
+                    {"filterType": "MARKET_LOT_SIZE", "minQty": min_qty, "stepSize": step_size},
+                ],
+            })
+        return {"timezone": "UTC", "serverTime": self.engine.time_ms, "symbols": symbols}
+
+    def _ticker_price(self, params):
+        symbol = params.get("symbol")
+        if symbol not in self.engine.prices:
+            raise SimulatorError(-1121, "Invalid symbol.")
+        return {"symbol": symbol, "price": _fmt(self.engine.prices[symbol]), "time": self.engine.time_ms}
+
+    def _klines(self, params):
+        bars = self.feed.closed.get(params.get("symbol"))
+        if bars is None:
+            raise SimulatorError(-1121, "Invalid symbol.")
+        start = int(params.get("startTime", 0))
+        end = int(params.get("endTime", 1 << 62))
+        limit = int(params.get("limit", 500))
+        bars = [bar for bar in bars if start <= bar[0] <= end][:limit]
+        return [
+            [bar[0], _fmt(bar[1]), _fmt(bar[2]), _fmt(bar[3]), _fmt(bar[4]), _fmt(bar[5]),
+             bar[0] + self.feed.bar_ms - 1, "0", 0, "0", "0", "0"]
+            for bar in bars
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地币安U本位合约交易所模拟器")
+    parser.add_argument("--symbols", nargs="+", required=True, help="模拟的交易对")
+    parser.add_argument("--feed", nargs="*", default=[], metavar="SYMBOL=CSV",
+                        help="交易对的历史K线CSV，支持通配符；未指定的交易对使用随机游走价格")
+    parser.add_argument("--start-price", type=float, default=1.0, help="随机游走的起始价格")
+    parser.add_argument("--volatility", type=float, default=0.001, help="随机游走每个tick的波动率")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval", default="1m", help="K线周期")
+    parser.add_argument("--ticks-per-bar", type=int, default=4)
+    parser.add_argument("--tick-seconds", type=float, default=0.25, help="两个tick之间的真实等待秒数")
+    parser.add_argument("--history", type=int, default=500, help="启动前生成的已收盘K线数，供客户端下载历史K线")
+    parser.add_argument("--fee-rate", type=float, default=0.0004)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--rest-port", type=int, default=8080)
+    parser.add_argument("--ws-port", type=int, default=8081)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s: %(levelname)s/%(name)s] %(message)s")
+
+    recorded = dict(item.split("=", 1) for item in args.feed)
+    feeds = {}
+    for i, symbol in enumerate(args.symbols):
+        if symbol in recorded:
+            feeds[symbol] = recorded_ticks(recorded[symbol])
+        else:
+            feeds[symbol] = synthetic_ticks(args.start_price, args.volatility, args.seed + i)
+
+    simulator = ExchangeSimulator(
+        dict.fromkeys(args.symbols, DEFAULT_FILTERS),
+        feeds,
+        host=args.host,
+        rest_port=args.rest_port,
+        ws_port=args.ws_port,
+        interval=args.interval,
+        ticks_per_bar=args.ticks_per_bar,
+        tick_seconds=args.tick_seconds,
+        fee_rate=args.fee_rate,
+    )
+    simulator.feed.seed_history(args.history)
+    simulator.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
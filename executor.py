@@ -0,0 +1,91 @@
+"""
+下单执行器：有界任务队列 + 工作线程池
+
+websocket线程只负责把交易信号放入队列，所有下单相关的REST请求都在工作线程中完成，
+行情处理不会因为等待交易所响应而阻塞。排队延迟和执行耗时分别统计。
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import LatencyRegistry, LatencyStats
+
+logger = logging.getLogger(__name__)
+
+
+class OrderExecutor:
+
+    def __init__(self, workers=2, queue_size=100):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._running = True
+
+        # 排队延迟（入队到开始执行）和各类任务的执行耗时
+        self.queue_delay = LatencyStats()
+        self.execution_time = LatencyRegistry()
+        self.rejected = 0  # 队列已满被拒绝的任务数
+        self.failed = 0  # 执行失败的任务数
+
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"order-executor-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, name, fn, *args, **kwargs):
+        """
+        提交任务，不等待执行
+        :param name: 任务名称，用于分类统计执行耗时
+        :return: Future，队列已满时立即以异常结束
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((future, name, fn, args, kwargs, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            logger.warning("下单队列已满，丢弃任务: %s", name)
+            future.set_exception(RuntimeError("下单队列已满，请稍后重试"))
+        return future
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            future, name, fn, args, kwargs, enqueued_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started = time.perf_counter()
+            self.queue_delay.record(started - enqueued_at)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                self.failed += 1
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self.execution_time.record(name, time.perf_counter() - started)
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "queue_delay": self.queue_delay.percentiles(),
+            "execution_time": self.execution_time.snapshot(),
+        }
+
+    def shutdown(self, wait=True):
+        """停止工作线程，已入队的任务会先执行完"""
+        if not self._running:
+            return
+        self._running = False
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,127 @@
+"""
+策略特征计算
+
+每条K线消息只解析一次（价格、时间、是否为同一根K线的盘中更新），
+指标按 (类型, 参数, K线周期) 注册为共享节点，每条消息只计算一次，同一个特征图上的所有策略共用结果。
+每个节点只用自己周期的K线更新，同一个特征图可以同时处理多个周期（如订阅的1m和合成的5m/1h）；
+未指定周期的节点绑定到收到的第一条消息的周期，只适用于单一周期的策略。
+组合策略的子策略绑定到同一个特征图，增加子策略只增加判断逻辑的开销。
+"""
+from collections import deque
+from datetime import datetime
+
+from indicators import SMA, WilderRSI
+
+
+class Tick:
+    """解析后的K线消息"""
+    __slots__ = ("kline", "price", "time", "event_time", "open_time", "interval", "closed", "amend")
+
+    def __init__(self, kline_data, amend):
+        k = kline_data.get('k', {})
+        self.kline = kline_data
+        self.price = float(k.get('c'))
+        self.event_time = kline_data.get('E', 0)
+        self.time = datetime.fromtimestamp(self.event_time / 1000)
+        self.open_time = k.get('t')
+        self.interval = k.get('i')
+        self.closed = bool(k.get('x'))
+        self.amend = amend  # 是否为同一根K线的盘中更新
+
+
+class FeatureNode:
+    """
+    共享的指标节点
+    value 为最新值，prev 为上一根K线结束时的值（盘中更新不改变 prev）
+    interval 为节点使用的K线周期
+    """
+    __slots__ = ("indicator", "interval", "value", "prev")
+
+    def __init__(self, indicator, interval=None):
+        self.indicator = indicator
+        self.interval = interval
+        self.value = None
+        self.prev = None
+
+    @property
+    def ready(self):
+        return self.indicator.ready
+
+    def update(self, tick):
+        if tick.amend:
+            self.value = self.indicator.amend(tick.price)
+        else:
+            self.prev = self.value
+            self.value = self.indicator.update(tick.price)
+
+
+class FeatureGraph:
+    """
+    :param history: 保存的最近K线消息数量
+    """
+
+    def __init__(self, history=100):
+        self.history = deque(maxlen=history)  # 最近的K线消息，所有策略共用
+        self.tick = None  # 最近一次解析的消息
+        self._nodes = {}
+        self._by_interval = {}  # 周期 -> 该周期的节点，按注册顺序更新
+        self._unbound = []  # 未指定周期、还没有收到消息的节点
+        self._open_times = {}  # 各周期最后一根K线的开盘时间
+
+    def _node(self, key, factory, interval):
+        node = self._nodes.get(key)
+        if node is None:
+            node = self._nodes[key] = FeatureNode(factory(), interval)
+            if interval is None:
+                self._unbound.append(node)
+            else:
+                self._by_interval.setdefault(interval, []).append(node)
+        return node
+
+    def sma(self, period, interval=None):
+        """
+        收盘价的简单移动平均
+        :param interval: K线周期，未指定时使用收到的第一条消息的周期
+        """
+        return self._node(("sma", period, interval), lambda: SMA(period), interval)
+
+    def rsi(self, period, interval=None):
+        """
+        收盘价的Wilder RSI
+        :param interval: K线周期，未指定时使用收到的第一条消息的周期
+        """
+        return self._node(("rsi", period, interval), lambda: WilderRSI(period), interval)
+
+    def update(self, kline_data):
+        """
+        解析K线消息并更新所有节点，与最后一根K线开盘时间相同的消息原地替换
+        :return: Tick
+        """
+        k = kline_data.get('k', {})
+        open_time = k.get('t')
+        interval = k.get('i')
+        amend = open_time is not None and open_time == self._open_times.get(interval)
+        tick = Tick(kline_data, amend)
+
+        if amend:
+            last = self.history[-1] if self.history else None
+            if last is not None and last.get('k', {}).get('t') == open_time and last['k'].get('i') == interval:
+                self.history[-1] = kline_data
+        else:
+            self._open_times[interval] = open_time
+            self.history.append(kline_data)
+
+        if self._unbound:
+            # 未指定周期的节点绑定到第一条消息的周期，之后不会混入其他周期的K线
+            for node in self._unbound:
+                node.interval = interval
+            self._by_interval.setdefault(interval, []).extend(self._unbound)
+            self._unbound = []
+
+        for node in self._by_interval.get(interval, ()):
+            node.update(tick)
+        self.tick = tick
+        return tick
+
+    def __len__(self):
+        return len(self._nodes)
@@ -0,0 +1,211 @@
+"""
+流式指标计算，每次更新为 O(1) 且不分配新对象
+update 追加一个新值，amend 用新值替换最近一次追加的值（同一根未收盘K线的盘中更新）
+另提供基于NumPy的批量版本，供回测一次性计算整段历史
+"""
+import numpy as np
+
+
+class RingBuffer:
+    """
+    定长环形缓冲区，写满后覆盖最旧的数据
+    """
+    __slots__ = ("size", "_data", "_index", "_count")
+
+    def __init__(self, size):
+        if size <= 0:
+            raise ValueError(f"缓冲区长度必须大于0: {size}")
+        self.size = size
+        self._data = [0.0] * size
+        self._index = 0  # 下一个写入位置
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def full(self):
+        return self._count == self.size
+
+    def append(self, value):
+        """
+        写入新值
+        :return: 被覆盖的旧值，缓冲区未满时返回None
+        """
+        evicted = self._data[self._index] if self._count == self.size else None
+        self._data[self._index] = value
+        self._index += 1
+        if self._index == self.size:
+            self._index = 0
+        if self._count < self.size:
+            self._count += 1
+        return evicted
+
+    def replace_last(self, value):
+        """
+        替换最新写入的值
+        :return: 被替换的旧值
+        """
+        if not self._count:
+            raise IndexError("缓冲区为空")
+        index = self._index - 1 if self._index else self.size - 1
+        old = self._data[index]
+        self._data[index] = value
+        return old
+
+    def last(self, n=0):
+        """返回倒数第n+1个值，n=0为最新值"""
+        if n >= self._count:
+            raise IndexError(f"缓冲区只有{self._count}个数据")
+        return self._data[(self._index - 1 - n) % self.size]
+
+    def values(self):
+        """按时间顺序返回所有数据（会分配新列表，仅用于调试和非热路径）"""
+        if self._count < self.size:
+            return self._data[:self._count]
+        return self._data[self._index:] + self._data[:self._index]
+
+
+class SMA:
+    """
+    简单移动平均，使用环形缓冲区和滚动求和
+    """
+    __slots__ = ("period", "_buffer", "_sum")
+
+    def __init__(self, period):
+        self.period = period
+        self._buffer = RingBuffer(period)
+        self._sum = 0.0
+
+    @property
+    def ready(self):
+        return self._buffer.full
+
+    @property
+    def value(self):
+        if not self._buffer.full:
+            return None
+        return self._sum / self.period
+
+    def update(self, price):
+        evicted = self._buffer.append(price)
+        if evicted is None:
+            self._sum += price
+        elif self._buffer._index == 0:
+            # 每转一圈重新求和一次，消除浮点累积误差（均摊仍为O(1)）
+            self._sum = sum(self._buffer._data)
+        else:
+            self._sum += price - evicted
+        return self.value
+
+    def amend(self, price):
+        """用新价格替换最近一次更新的价格"""
+        if not len(self._buffer):
+            return self.update(price)
+        self._sum += price - self._buffer.replace_last(price)
+        return self.value
+
+
+class WilderRSI:
+    """
+    Wilder平滑的相对强弱指标
+    前period个涨跌幅取简单平均作为种子，之后按 avg = (avg * (period - 1) + x) / period 平滑
+    """
+    __slots__ = ("period", "_prev_price", "_count", "_avg_gain", "_avg_loss", "value", "_saved")
+
+    def __init__(self, period=14):
+        self.period = period
+        self._prev_price = None
+        self._count = 0  # 已累计的涨跌幅数量
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+        self.value = None
+        self._saved = None  # 最近一次 update 之前的状态，amend 时从这里重新计算
+
+    @property
+    def ready(self):
+        return self.value is not None
+
+    def update(self, price):
+        self._saved = (self._prev_price, self._count, self._avg_gain, self._avg_loss, self.value)
+        return self._update(price)
+
+    def amend(self, price):
+        """用新价格替换最近一次更新的价格"""
+        if self._saved is None:
+            return self.update(price)
+        self._prev_price, self._count, self._avg_gain, self._avg_loss, self.value = self._saved
+        return self._update(price)
+
+    def _update(self, price):
+        prev_price = self._prev_price
+        self._prev_price = price
+        if prev_price is None:
+            return None
+
+        delta = price - prev_price
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+
+        if self._count < self.period:
+            # 种子阶段：累加后取简单平均
+            self._count += 1
+            self._avg_gain += gain
+            self._avg_loss += loss
+            if self._count < self.period:
+                return None
+            self._avg_gain /= self.period
+            self._avg_loss /= self.period
+        else:
+            self._avg_gain = (self._avg_gain * (self.period - 1) + gain) / self.period
+            self._avg_loss = (self._avg_loss * (self.period - 1) + loss) / self.period
+
+        if self._avg_loss == 0:
+            self.value = 100.0 if self._avg_gain > 0 else 50.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + self._avg_gain / self._avg_loss)
+        return self.value
+
+
+def sma_array(values, period):
+    """
+    批量计算简单移动平均，与 SMA.update 逐条结果一致
+    :return: 与values等长的数组，数据不足的位置为nan
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(values, period)
+        result[period - 1:] = windows.mean(axis=1)
+    return result
+
+
+def wilder_rsi_array(values, period=14):
+    """
+    批量计算Wilder RSI，与 WilderRSI.update 逐条结果一致
+    平滑过程是递推的，这里只对涨跌幅做向量化，递推部分在纯浮点循环中完成
+    :return: 与values等长的数组，数据不足的位置为nan
+    """
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) <= period:
+        return result
+
+    deltas = np.diff(values)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    out = result.tolist()
+    gains = gains.tolist()
+    losses = losses.tolist()
+    avg_gain = sum(gains[:period]) / period
+    avg_loss = sum(losses[:period]) / period
+    for i in range(period, len(values)):
+        if i > period:
+            avg_gain = (avg_gain * (period - 1) + gains[i - 1]) / period
+            avg_loss = (avg_loss * (period - 1) + losses[i - 1]) / period
+        if avg_loss == 0:
+            out[i] = 100.0 if avg_gain > 0 else 50.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return np.array(out)
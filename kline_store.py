@@ -0,0 +1,211 @@
+"""
+K线列式存储：每个交易对/周期一个目录，每列一个定长二进制文件，只追加写入
+
+读取时通过 np.memmap 直接映射文件，不需要解析，也不复制数据。
+"""
+import os
+import struct
+import threading
+import logging
+
+import numpy as np
+
+from config.config_manager import app_config
+
+logger = logging.getLogger(__name__)
+
+# (列名, numpy类型, struct格式)
+COLUMNS = (
+    ("open_time", np.dtype("<i8"), "<q"),
+    ("open", np.dtype("<f8"), "<d"),
+    ("high", np.dtype("<f8"), "<d"),
+    ("low", np.dtype("<f8"), "<d"),
+    ("close", np.dtype("<f8"), "<d"),
+    ("volume", np.dtype("<f8"), "<d"),
+    ("close_time", np.dtype("<i8"), "<q"),
+)
+ROW_WIDTH = 8  # 所有列都是8字节
+
+INTERVAL_UNITS = {"s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+
+def interval_ms(interval):
+    """K线周期转为毫秒，如 1m -> 60000"""
+    return int(interval[:-1]) * INTERVAL_UNITS[interval[-1]]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(symbol, interval=None):
+    """获取交易对/周期对应的存储，同一进程内共享同一个实例"""
+    if interval is None:
+        interval = app_config["websocket"]["kline_interval"]
+    key = (symbol.upper(), interval)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            root = app_config.get("storage", "kline_dir", fallback="data/klines")
+            store = _stores[key] = KlineStore(os.path.join(root, key[0], interval))
+        return store
+
+
+def rows_to_columns(rows):
+    """把REST klines接口返回的K线转换为 {列名: 数组}，与 KlineStore.read 的格式相同"""
+    return {
+        name: np.array([row[i] for row in rows], dtype=dtype) if rows else np.empty(0, dtype=dtype)
+        for i, (name, dtype, _) in enumerate(COLUMNS)
+    }
+
+
+def bar_to_kline(klines, i, symbol=None):
+    """把第i根K线转换为websocket推送的kline消息格式，用于向策略回放历史数据"""
+    return {
+        "e": "kline",
+        "E": int(klines["close_time"][i]),
+        "s": symbol,
+        "k": {
+            "t": int(klines["open_time"][i]),
+            "T": int(klines["close_time"][i]),
+            "o": float(klines["open"][i]),
+            "h": float(klines["high"][i]),
+            "l": float(klines["low"][i]),
+            "c": float(klines["close"][i]),
+            "v": float(klines["volume"][i]),
+            "x": True,
+        },
+    }
+
+
+class KlineStore:
+    """
+    单个交易对/周期的K线存储
+    有两类写入：websocket推送的已收盘K线，以及REST下载的历史K线（启动预热、重连补齐），
+    可能在不同线程中同时进行，append 在锁内检查并写入，早于最后一根的K线被忽略
+    websocket写入时传入 step，存储为空或与最后一根之间有缺口时不写入，由REST从最后一根开始补齐，
+    避免推送的新K线先写入后，REST下载的缺口K线因早于最后一根被忽略
+    读取可以在任意线程
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = {}
+        self._maps = None  # 当前映射的列数组
+        self._mapped_length = -1
+
+        os.makedirs(path, exist_ok=True)
+        for name, _, _ in COLUMNS:
+            file_path = self._column_path(name)
+            if not os.path.exists(file_path):
+                open(file_path, "wb").close()
+
+        # 进程崩溃可能导致各列长度不一致，截断到最短的列
+        self._length = min(os.path.getsize(self._column_path(name)) // ROW_WIDTH for name, _, _ in COLUMNS)
+        for name, _, _ in COLUMNS:
+            f = open(self._column_path(name), "r+b")
+            f.truncate(self._length * ROW_WIDTH)
+            f.seek(0, os.SEEK_END)
+            self._files[name] = f
+
+        self._last_open_time = self._read_last_open_time()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _read_last_open_time(self):
+        if self._length == 0:
+            return None
+        f = self._files["open_time"]
+        f.seek((self._length - 1) * ROW_WIDTH)
+        value = struct.unpack("<q", f.read(ROW_WIDTH))[0]
+        f.seek(0, os.SEEK_END)
+        return value
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def last_open_time(self):
+        return self._last_open_time
+
+    def append(self, open_time, open_, high, low, close, volume, close_time, step=None):
+        """
+        追加一根K线；开盘时间与最后一根相同时原地覆盖最后一根，早于最后一根时忽略
+        :param step: K线周期（毫秒），指定时只追加与最后一根相邻的K线，存储为空或有缺口时忽略
+        :return: 是否写入
+        """
+        row = (int(open_time), float(open_), float(high), float(low), float(close), float(volume), int(close_time))
+        with self._lock:
+            if self._last_open_time is not None and row[0] < self._last_open_time:
+                return False
+            if step is not None and (self._last_open_time is None or row[0] > self._last_open_time + step):
+                return False
+
+            amend = row[0] == self._last_open_time
+            for (name, _, fmt), value in zip(COLUMNS, row):
+                f = self._files[name]
+                if amend:
+                    f.seek((self._length - 1) * ROW_WIDTH)
+                f.write(struct.pack(fmt, value))
+                f.flush()
+            if not amend:
+                self._length += 1
+                self._last_open_time = row[0]
+            return True
+
+    def append_kline(self, k, contiguous=False):
+        """
+        追加websocket推送的K线（kline消息中的k字段）
+        :param contiguous: 只追加与最后一根相邻的K线，见 append 的 step 参数
+        """
+        step = interval_ms(k["i"]) if contiguous else None
+        return self.append(k["t"], k["o"], k["h"], k["l"], k["c"], k["v"], k["T"], step)
+
+    def extend(self, rows):
+        """批量追加REST klines接口返回的K线"""
+        count = 0
+        for row in rows:
+            if self.append(row[0], row[1], row[2], row[3], row[4], row[5], row[6]):
+                count += 1
+        return count
+
+    def _columns(self):
+        """返回覆盖全部数据的列映射，文件增长后重新映射"""
+        with self._lock:
+            length = self._length
+            if length != self._mapped_length:
+                if length == 0:
+                    self._maps = {name: np.empty(0, dtype=dtype) for name, dtype, _ in COLUMNS}
+                else:
+                    self._maps = {
+                        name: np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(length,))
+                        for name, dtype, _ in COLUMNS
+                    }
+                self._mapped_length = length
+            return self._maps
+
+    def read(self, start_time=None, end_time=None):
+        """
+        按开盘时间范围读取K线，返回的数组是文件映射的切片，不复制数据
+        :param start_time: 起始开盘时间（毫秒，包含）
+        :param end_time: 结束开盘时间（毫秒，不包含）
+        :return: {列名: numpy数组}
+        """
+        columns = self._columns()
+        open_time = columns["open_time"]
+        lo = 0 if start_time is None else int(np.searchsorted(open_time, start_time, side="left"))
+        hi = len(open_time) if end_time is None else int(np.searchsorted(open_time, end_time, side="left"))
+        return {name: array[lo:hi] for name, array in columns.items()}
+
+    def tail(self, n):
+        """读取最近n根K线"""
+        columns = self._columns()
+        return {name: array[-n:] if n else array[:0] for name, array in columns.items()}
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files = {}
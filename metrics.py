@@ -0,0 +1,63 @@
+"""
+运行时延迟统计
+"""
+import threading
+from collections import deque
+
+
+class LatencyStats:
+    """
+    滚动窗口延迟统计，记录最近window个样本，查询时计算分位数
+    记录样本只是一次加锁的deque追加，可以在热路径上调用；查询时在锁内复制样本，
+    不会与其他线程的记录冲突
+    """
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0  # 累计样本数
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentiles(self, points=(50, 90, 99)):
+        """
+        计算窗口内的分位数（毫秒）
+        :return: {"count": 累计样本数, "p50": ..., "p90": ..., "p99": ..., "max": ...}
+        """
+        with self._lock:
+            samples = list(self._samples)
+            count = self.count
+        samples.sort()
+        result = {"count": count}
+        if not samples:
+            return result
+        for point in points:
+            index = min(len(samples) - 1, int(len(samples) * point / 100))
+            result[f"p{point}"] = round(samples[index] * 1000, 3)
+        result["max"] = round(samples[-1] * 1000, 3)
+        return result
+
+
+class LatencyRegistry:
+    """按名称分组的延迟统计，如按REST接口或任务类型"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(name, LatencyStats(self.window))
+        return stats
+
+    def record(self, name, seconds):
+        self.get(name).record(seconds)
+
+    def snapshot(self):
+        return {name: stats.percentiles() for name, stats in list(self._stats.items())}
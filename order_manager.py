@@ -1,21 +1,24 @@
-import csv
 import time
-import threading
 import logging
 from datetime import datetime
 from binance_client import BinanceClient
+from scheduler import get_scheduler
+from trade_journal import TradeJournal
 
-from config.config_manager import app_config
+from config.config_manager import app_config, config_snapshot
 
 logger = logging.getLogger(__name__)
+trade_logger = logging.getLogger("trades")
 
 class OrderManager:
-    def __init__(self, client: BinanceClient):
+    def __init__(self, client: BinanceClient, symbol=None):
         self.client = client
+        self.symbol = symbol or config_snapshot().trading.symbol
         
-        # 初始化交易记录文件
+        # 初始化交易日志，首次启动时导入旧的CSV交易记录
         self.trade_file = 'trades.csv'
-        self._init_trade_file()
+        self.journal = TradeJournal(app_config.get('storage', 'trade_journal', fallback='data/trades.db'))
+        self.journal.migrate_csv(self.trade_file)
         
         # 持仓状态
         self.position = None
@@ -25,32 +28,24 @@ class OrderManager:
         self.consecutive_losses = 0
         self.disabled = False
         self.disabled_until = 0
+        self.disable_timer = None
+        # 禁用到期回调函数
+        self.enable_callback = None
+
+        # 交易记录回调函数
+        self.trade_callback = None
         
-    def _init_trade_file(self):
-        """初始化交易记录文件"""
-        try:
-            with open(self.trade_file, 'x', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    'timestamp', 'symbol', 'side', 'order_id', 
-                    'order_price', 'order_qty', 'exec_price', 
-                    'exec_qty', 'status', 'pnl', 'fee', 'stop_profit', 
-                    'stop_loss'
-                ])
-        except FileExistsError:
-            pass
-    
     def record_trade(self, order, exec_price=None, exec_qty=None, status='NEW', pnl=0, fee=0):
-        """记录交易到CSV文件"""
+        """记录交易到交易日志"""
         try:
             # 验证交易状态
-            if status not in ['NEW', 'PARTIALLY_FILLED', 'FILLED', 'CANCELED', 'EXPIRED']:
+            if status not in ['NEW', 'PARTIALLY_FILLED', 'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED']:
                 raise ValueError(f"无效的交易状态: {status}")
             
             # 记录交易详情到日志
             trade_info = {
                 'timestamp': datetime.now().isoformat(),
-                'symbol': order.get('symbol', app_config['trading']['symbol']),
+                'symbol': order.get('symbol', self.symbol),
                 'side': order.get('side'),
                 'orderId': order.get('orderId'),
                 'price': order.get('price'),
@@ -61,40 +56,50 @@ class OrderManager:
                 'pnl': pnl,
                 'fee': fee
             }
-            logger.info(f"记录交易: {trade_info}")
+            logger.info("记录交易: %s", trade_info)
             
-            # 写入CSV文件
-            with open(self.trade_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    datetime.now().isoformat(),
-                    order.get('symbol', app_config['trading']['symbol']),
-                    order.get('side'),
-                    order.get('orderId'),
-                    order.get('price'),
-                    order.get('origQty'),
-                    exec_price,
-                    exec_qty,
-                    status,
-                    pnl,
-                    fee,
-                    app_config['trading']['stop_profit'],
-                    app_config['trading']['stop_loss']
-                ])
+            # 写入交易日志
+            trading = config_snapshot().trading
+            trade = {
+                'timestamp': trade_info['timestamp'],
+                'symbol': trade_info['symbol'],
+                'side': trade_info['side'],
+                'order_id': trade_info['orderId'],
+                'order_price': trade_info['price'],
+                'order_qty': trade_info['origQty'],
+                'exec_price': exec_price,
+                'exec_qty': exec_qty,
+                'status': status,
+                'pnl': pnl,
+                'fee': fee,
+                'stop_profit': trading.stop_profit,
+                'stop_loss': trading.stop_loss
+            }
+            self.journal.append(trade)
             
             # 如果是平仓订单且有盈亏数据，检查连续亏损
             if status == 'FILLED' and order.get('side') in ['BUY', 'SELL'] and pnl is not None:
                 self.check_consecutive_losses(pnl)
                 
             # 记录交易日志
-            with open('trades.log', 'a') as f:
-                f.write(f"{datetime.now().isoformat()} - 交易记录: {trade_info}\n")
+            trade_logger.info("%s", trade_info)
+
+            # 如果有注册的交易记录回调函数，调用它
+            if self.trade_callback:
+                try:
+                    self.trade_callback(trade)
+                except Exception as e:
+                    logger.error(f"执行交易记录回调函数时出错: {str(e)}")
                 
         except Exception as e:
             error_msg = f"记录交易失败: {str(e)}"
             logger.error(error_msg, exc_info=e)
             raise
     
+    def register_trade_callback(self, callback):
+        """注册交易记录回调函数"""
+        self.trade_callback = callback
+
     def get_position_status(self):
         """获取当前持仓状态"""
         return self.position
@@ -104,10 +109,12 @@ class OrderManager:
         self.position = status
     
     def start_position_timer(self, callback):
-        """启动持仓定时器"""
-        max_hold_time = int(app_config['trading']['max_hold_time'])
-        self.position_timer = threading.Timer(max_hold_time, self._check_position, [callback])
-        self.position_timer.start()
+        """启动持仓定时器，由共享的调度线程在最长持有时间到期后调用callback"""
+        max_hold_time = config_snapshot().trading.max_hold_time
+        self.cancel_position_timer()
+        self.position_timer = get_scheduler().call_later(
+            max_hold_time, self._check_position, callback, name="position_expiry"
+        )
     
     def cancel_position_timer(self):
         """取消持仓定时器"""
@@ -126,39 +133,26 @@ class OrderManager:
     
     def load_previous_trades(self):
         """服务启动时加载之前的交易记录"""
-        try:
-            with open(self.trade_file, 'r') as f:
-                reader = csv.DictReader(f)
-                trades = list(reader)
-                
-                # 检查是否有未平仓的持仓
-                for trade in reversed(trades):
-                    if trade['status'] == 'FILLED' and not trade.get('pnl'):
-                        self.position = trade['side']
-                        break
-                
-                # 检查连续亏损状态
-                recent_trades = []
-                for trade in reversed(trades):
-                    if trade['status'] == 'FILLED' and trade.get('pnl'):
-                        recent_trades.append(trade)
-                        if len(recent_trades) >= app_config.getint('trading', 'consecutive_losses'):
-                            break
-                
-                # 计算连续亏损次数
-                self.consecutive_losses = 0
-                for trade in recent_trades:
-                    if float(trade.get('pnl', 0)) < 0:
-                        self.consecutive_losses += 1
-                    else:
-                        break
-                
-                # 如果达到连续亏损阈值，设置禁用状态
-                if self.consecutive_losses >= app_config.getint('trading', 'consecutive_losses'):
-                    self.disabled = True
-                    self.disabled_until = time.time() + app_config.getint('trading', 'disable_time')
-        except FileNotFoundError:
-            pass
+        # 检查是否有未平仓的持仓
+        open_fill = self.journal.last_open_fill(self.symbol)
+        if open_fill:
+            self.position = open_fill['side']
+        
+        # 检查连续亏损状态
+        trading = config_snapshot().trading
+        recent_trades = self.journal.recent_closed(trading.consecutive_losses, self.symbol)
+        
+        # 计算连续亏损次数
+        self.consecutive_losses = 0
+        for trade in recent_trades:
+            if trade['pnl'] < 0:
+                self.consecutive_losses += 1
+            else:
+                break
+        
+        # 如果达到连续亏损阈值，设置禁用状态
+        if self.consecutive_losses >= trading.consecutive_losses:
+            self._disable(time.time() + trading.disable_time)
     
     def check_consecutive_losses(self, pnl):
         """检查连续亏损并更新禁用状态"""
@@ -168,12 +162,36 @@ class OrderManager:
             self.consecutive_losses = 0
         
         # 检查是否达到连续亏损阈值
-        if self.consecutive_losses >= app_config.getint('trading', 'consecutive_losses'):
-            self.disabled = True
-            
-            self.disabled_until = time.time() + app_config.getint('trading', 'disable_time')
-            logging.warning(f"达到连续亏损阈值({self.consecutive_losses}笔)，交易功能已禁用{app_config['trading']['disable_time']}秒")
+        trading = config_snapshot().trading
+        if self.consecutive_losses >= trading.consecutive_losses:
+            self._disable(time.time() + trading.disable_time)
+            logging.warning(f"达到连续亏损阈值({self.consecutive_losses}笔)，交易功能已禁用{trading.disable_time}秒")
     
+    def _disable(self, until):
+        """禁用交易，到期后由调度线程自动解除"""
+        self.disabled = True
+        self.disabled_until = until
+        if self.disable_timer:
+            self.disable_timer.cancel()
+        self.disable_timer = get_scheduler().call_at(until, self._enable, name="cooldown_expiry")
+
+    def _enable(self):
+        """禁用到期，恢复交易"""
+        self.disable_timer = None
+        if not self.disabled:
+            return
+        self.disabled = False
+        logger.warning(f"[{self.symbol}] 禁用状态已到期，交易功能已恢复")
+        if self.enable_callback:
+            try:
+                self.enable_callback()
+            except Exception as e:
+                logger.error(f"执行禁用到期回调函数时出错: {str(e)}")
+
+    def register_enable_callback(self, callback):
+        """注册禁用到期回调函数"""
+        self.enable_callback = callback
+
     def restore_status(self):
         """恢复交易状态"""
         self.load_previous_trades()
@@ -192,10 +210,8 @@ class OrderManager:
             
     def get_recent_trades(self, limit=10):
         """获取最近的交易记录"""
-        try:
-            with open(self.trade_file, 'r') as f:
-                reader = csv.DictReader(f)
-                trades = list(reader)
-                return trades[-limit:]
-        except FileNotFoundError:
-            return []
\ No newline at end of file
+        return self.journal.recent(limit)
+    
+    def get_trades_between(self, start=None, end=None, limit=1000):
+        """获取时间范围内的交易记录（unix秒）"""
+        return self.journal.between(start, end, limit)
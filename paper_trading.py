@@ -0,0 +1,81 @@
+"""
+模拟盘（paper trading）
+
+行情仍然来自实盘的K线推送，下单不发送到交易所，而是在进程内撮合：
+市价单按最新推送价格加滑点成交，止盈止损单在每次价格推送时检查是否触发，并按手续费率扣费。
+撮合复用本地模拟交易所的 MatchingEngine，接口与 UMFutures 的下单相关方法一致，
+BinanceClient 只需要替换下单客户端，交易日志的写入路径与实盘完全相同。
+
+在 config.ini 中开启：
+
+    [paper]
+    enabled = true
+    slippage = 0.0005
+    fee_rate = 0.0004
+"""
+import logging
+
+from binance.error import ClientError
+
+from exchange_simulator import MatchingEngine, SimulatorError
+
+logger = logging.getLogger(__name__)
+
+
+class PaperExchange:
+    """
+    进程内撮合的下单客户端，方法签名与 UMFutures 相同，错误以 ClientError 抛出
+    :param filters: {symbol: (min_qty, step_size, tick_size)}，与 BinanceClient.symbol_info 为同一个字典
+    :param balance: 初始USDT余额
+    :param fee_rate: 手续费率
+    :param slippage: 滑点比例
+    """
+
+    def __init__(self, filters, balance, fee_rate=0.0004, slippage=0.0):
+        self.engine = MatchingEngine(filters, fee_rate=fee_rate, balance=balance, slippage=slippage)
+        self.listeners = self.engine.listeners  # 用户数据事件回调 fn(event)，事件格式与交易所推送一致
+
+    def on_price(self, symbol, price, time_ms):
+        """最新成交价推送，检查止盈止损单是否触发"""
+        self.engine.on_price(symbol, float(price), time_ms)
+
+    def _call(self, func, *args):
+        try:
+            return func(*args)
+        except SimulatorError as e:
+            raise ClientError(e.status, e.code, e.msg, {})
+
+    def new_order(self, **params):
+        resp = self._call(self.engine.new_order, params)
+        logger.info(f"模拟盘订单: {resp['symbol']} {resp['type']} {resp['side']} {resp['positionSide']} {resp['status']}")
+        return resp
+
+    def new_batch_order(self, batchOrders):
+        return self.engine.new_batch_order(batchOrders)
+
+    def query_order(self, symbol, orderId=None, **kwargs):
+        return self._call(self.engine.get_order, symbol, orderId)
+
+    def get_account_trades(self, symbol, orderId=None, limit=500, **kwargs):
+        return self.engine.account_trades(symbol, orderId, limit)
+
+    def balance(self, **kwargs):
+        return self.engine.account_balance()
+
+    def change_leverage(self, symbol, leverage, **kwargs):
+        # 启动时交易规则可能尚未加载，不校验交易对
+        self.engine.leverage[symbol] = int(leverage)
+        return {"leverage": int(leverage), "symbol": symbol}
+
+    def stats(self):
+        """模拟账户余额和持仓"""
+        return {
+            "balance": self.engine.balance,
+            "positions": {
+                f"{symbol}:{position_side}": {"quantity": quantity, "entry_price": entry_price}
+                for (symbol, position_side), (quantity, entry_price) in self.engine.positions.items()
+                if quantity
+            },
+            "open_orders": len(self.engine.open_orders),
+            "trades": len(self.engine.trades),
+        }
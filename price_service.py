@@ -0,0 +1,161 @@
+"""
+行情价格缓存
+
+由 bookTicker、markPrice 和 K线推送更新每个交易对的买一/卖一/标记价格/最新成交价，
+按本地接收时间判断是否过期。下单前取价只读内存，所有推送价格都过期时才调用REST，
+REST调用次数和耗时单独统计。
+"""
+import logging
+import threading
+import time
+
+from metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# 各价格来源的字段
+SOURCES = ("book", "mark", "last")
+
+
+class Quote:
+    """单个交易对的最新价格"""
+    __slots__ = ("bid", "ask", "mark", "last", "updated", "updates")
+
+    def __init__(self):
+        self.bid = None
+        self.ask = None
+        self.mark = None
+        self.last = None
+        # 各来源的最近接收时间（time.monotonic）和累计更新次数
+        self.updated = dict.fromkeys(SOURCES, 0.0)
+        self.updates = dict.fromkeys(SOURCES, 0)
+
+    def age(self, source, now=None):
+        """距最近一次更新的秒数，从未更新时返回None"""
+        updated = self.updated[source]
+        if not updated:
+            return None
+        return (now or time.monotonic()) - updated
+
+
+class PriceService:
+    """
+    :param max_age: 推送价格的最长有效秒数
+    :param rest_fallback: 所有推送价格都过期时调用的函数 fn(symbol) -> float
+    """
+
+    def __init__(self, max_age=5.0, rest_fallback=None):
+        self.max_age = max_age
+        self.rest_fallback = rest_fallback
+        self._quotes = {}
+        self._lock = threading.Lock()
+
+        self.rest_calls = 0  # 回退到REST的次数
+        self.rest_errors = 0
+        self.rest_latency = LatencyStats()
+
+    def _quote(self, symbol):
+        quote = self._quotes.get(symbol)
+        if quote is None:
+            with self._lock:
+                quote = self._quotes.setdefault(symbol, Quote())
+        return quote
+
+    def on_book_ticker(self, msg):
+        """bookTicker 推送：b 买一价，a 卖一价"""
+        quote = self._quote(msg["s"])
+        quote.bid = float(msg["b"])
+        quote.ask = float(msg["a"])
+        quote.updated["book"] = time.monotonic()
+        quote.updates["book"] += 1
+
+    def on_mark_price(self, msg):
+        """markPriceUpdate 推送：p 标记价格"""
+        quote = self._quote(msg["s"])
+        quote.mark = float(msg["p"])
+        quote.updated["mark"] = time.monotonic()
+        quote.updates["mark"] += 1
+
+    def on_last_price(self, symbol, price):
+        """K线推送的最新成交价"""
+        quote = self._quote(symbol)
+        quote.last = float(price)
+        quote.updated["last"] = time.monotonic()
+        quote.updates["last"] += 1
+
+    def price(self, symbol, side=None):
+        """
+        获取用于下单计算的价格
+        买入用卖一价、卖出用买一价，未指定方向时用买卖中间价；
+        盘口过期时依次使用标记价格、最新成交价，都过期时才调用REST
+        :param side: BUY/SELL
+        :raises ValueError: 没有可用价格
+        """
+        quote = self._quotes.get(symbol)
+        if quote is not None:
+            now = time.monotonic()
+            if quote.bid is not None and now - quote.updated["book"] <= self.max_age:
+                if side == "BUY":
+                    return quote.ask
+                if side == "SELL":
+                    return quote.bid
+                return (quote.bid + quote.ask) / 2
+            if quote.mark is not None and now - quote.updated["mark"] <= self.max_age:
+                return quote.mark
+            if quote.last is not None and now - quote.updated["last"] <= self.max_age:
+                return quote.last
+        return self._fetch_rest(symbol)
+
+    def _fetch_rest(self, symbol):
+        if self.rest_fallback is None:
+            raise ValueError(f"{symbol}没有可用的价格")
+
+        self.rest_calls += 1
+        logger.warning(f"{symbol}推送价格已过期，使用REST获取价格")
+        started = time.perf_counter()
+        try:
+            price = float(self.rest_fallback(symbol))
+        except Exception as e:
+            self.rest_errors += 1
+            logger.error(f"获取{symbol}价格失败: {str(e)}", exc_info=e)
+            raise ValueError(f"获取{symbol}价格失败: {str(e)}")
+        finally:
+            self.rest_latency.record(time.perf_counter() - started)
+
+        self.on_last_price(symbol, price)
+        return price
+
+    def quote(self, symbol):
+        """交易对的最新价格和各来源的数据年龄（秒）"""
+        quote = self._quotes.get(symbol)
+        if quote is None:
+            return None
+        now = time.monotonic()
+        return {
+            "symbol": symbol,
+            "bid": quote.bid,
+            "ask": quote.ask,
+            "mark": quote.mark,
+            "last": quote.last,
+            "age": {source: quote.age(source, now) for source in SOURCES},
+        }
+
+    def stats(self):
+        now = time.monotonic()
+        symbols = {}
+        for symbol, quote in list(self._quotes.items()):
+            symbols[symbol] = {
+                "updates": dict(quote.updates),
+                "age": {source: quote.age(source, now) for source in SOURCES},
+                "stale": all(
+                    age is None or age > self.max_age
+                    for age in (quote.age(source, now) for source in SOURCES)
+                ),
+            }
+        return {
+            "max_age": self.max_age,
+            "rest_calls": self.rest_calls,
+            "rest_errors": self.rest_errors,
+            "rest_latency": self.rest_latency.percentiles(),
+            "symbols": symbols,
+        }
@@ -0,0 +1,106 @@
+"""
+websocket 重连
+
+重连在独立的线程中进行，websocket回调线程和调度线程只提交重连请求，不会被阻塞。
+失败后按带随机抖动的指数退避重试，直到连接成功；重连期间收到的重复请求合并为一次。
+"""
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReconnectSupervisor:
+    """
+    :param connect: 建立连接并恢复订阅的函数，失败时抛出异常
+    :param on_reconnected: 连接恢复后调用的函数 fn(downtime_seconds)，用于补齐断线期间的数据
+    :param base_delay: 首次重试前的等待秒数
+    :param max_delay: 最长等待秒数
+    """
+
+    def __init__(self, connect, on_reconnected=None, base_delay=1.0, max_delay=60.0):
+        self.connect = connect
+        self.on_reconnected = on_reconnected
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.reconnecting = False
+        self.disconnected_at = None
+        self.attempts = 0  # 累计重连尝试次数
+        self.reconnects = 0  # 累计重连成功次数
+        self.last_error = None
+        self.last_reason = None
+        self.last_downtime = None
+
+        self._requested = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ws-reconnect", daemon=True)
+        self._thread.start()
+
+    def request(self, reason):
+        """提交重连请求，立即返回"""
+        if not self._requested.is_set() and not self.reconnecting:
+            logger.warning(f"WebSocket连接异常({reason})，准备重连")
+            self.last_reason = reason
+        self._requested.set()
+
+    def backoff(self, attempt):
+        """第attempt次失败后的等待秒数，在 [delay/2, delay] 之间随机"""
+        # 指数有上限，长时间连续失败时不会溢出
+        delay = min(self.max_delay, self.base_delay * 2 ** min(attempt, 30))
+        return random.uniform(delay / 2, delay)
+
+    def _run(self):
+        # 任何异常都不能结束重连线程，否则之后断线不会再重连
+        while True:
+            try:
+                self._reconnect_once()
+            except Exception as e:
+                self.reconnecting = False
+                logger.error(f"重连线程异常，稍后重试: {str(e)}", exc_info=e)
+                self._requested.set()
+                time.sleep(self.base_delay)
+
+    def _reconnect_once(self):
+        """等待重连请求，重试直到连接成功"""
+        self._requested.wait()
+        self._requested.clear()
+        self.reconnecting = True
+        self.disconnected_at = time.time()
+
+        attempt = 0
+        while True:
+            self.attempts += 1
+            try:
+                self.connect()
+                break
+            except Exception as e:
+                self.last_error = str(e)
+                delay = self.backoff(attempt)
+                logger.error(f"WebSocket第{attempt + 1}次重连失败，{delay:.1f}秒后重试: {str(e)}", exc_info=e)
+                attempt += 1
+                time.sleep(delay)
+
+        # 新连接已恢复全部订阅，旧连接在重连期间产生的请求不再处理
+        self._requested.clear()
+        self.reconnecting = False
+        self.reconnects += 1
+        self.last_downtime = time.time() - self.disconnected_at
+        logger.info(f"WebSocket重连成功，断线{self.last_downtime:.1f}秒，尝试{attempt + 1}次")
+
+        if self.on_reconnected:
+            try:
+                self.on_reconnected(self.last_downtime)
+            except Exception as e:
+                logger.error(f"重连后补齐数据失败: {str(e)}", exc_info=e)
+
+    def stats(self):
+        return {
+            "reconnecting": self.reconnecting,
+            "attempts": self.attempts,
+            "reconnects": self.reconnects,
+            "last_reason": self.last_reason,
+            "last_error": self.last_error,
+            "last_downtime": self.last_downtime,
+        }
@@ -0,0 +1,113 @@
+"""
+REST连接池会话：长连接复用、按接口类别设置超时、按接口统计延迟
+
+每个请求的延迟分成几部分记录，用于区分网络/代理和交易所处理的耗时：
+- total: 整个请求，含读取响应体
+- ttfb: 发出请求到收到响应头，含新建连接的耗时
+- connect: 新建连接（TCP、TLS握手，使用代理时含代理隧道）的耗时，按主机统计，复用连接时没有样本
+ttfb 减去 connect 约等于交易所的处理时间加一次网络往返
+"""
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyRegistry
+
+# 下单类接口，其余接口按查询类处理
+ORDER_PATHS = frozenset({
+    "/fapi/v1/order",
+    "/fapi/v1/batchOrders",
+    "/fapi/v1/allOpenOrders",
+    "/fapi/v1/leverage",
+})
+
+
+def _timed_pool_class(pool_cls, record):
+    """返回 pool_cls 的子类，新建连接时调用 record(host, seconds)"""
+
+    class TimedConnection(pool_cls.ConnectionCls):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                super().connect()
+            finally:
+                record(self.host, time.perf_counter() - started)
+
+    return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": TimedConnection})
+
+
+class TimedAdapter(HTTPAdapter):
+    """
+    记录新建连接耗时的 HTTPAdapter，直连和经代理的连接池都替换为计时的连接类
+    :param on_connect: 回调 fn(host, seconds)
+    """
+
+    def __init__(self, on_connect, **kwargs):
+        self.on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def _time_connections(self, manager):
+        # pool_classes_by_scheme 默认是 urllib3 的模块级字典，替换而不是修改
+        manager.pool_classes_by_scheme = {
+            scheme: _timed_pool_class(pool_cls, self.on_connect)
+            for scheme, pool_cls in manager.pool_classes_by_scheme.items()
+        }
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._time_connections(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        created = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if created:
+            self._time_connections(manager)
+        return manager
+
+
+class PooledSession(requests.Session):
+    """
+    替换 UMFutures 默认的 requests.Session
+    :param pool_size: 每个主机保持的连接数
+    :param order_timeout: 下单类接口的 (连接超时, 读取超时)
+    :param query_timeout: 查询类接口的 (连接超时, 读取超时)
+    """
+
+    def __init__(self, pool_size=10, order_timeout=(3, 5), query_timeout=(3, 10)):
+        super().__init__()
+        self.latency = LatencyRegistry()  # 按接口统计的总耗时
+        self.ttfb = LatencyRegistry()  # 按接口统计的收到响应头的耗时
+        self.connect = LatencyRegistry()  # 按主机统计的新建连接耗时
+        adapter = TimedAdapter(
+            self.connect.record, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.headers["Connection"] = "keep-alive"
+
+        self.order_timeout = order_timeout
+        self.query_timeout = query_timeout
+
+    def request(self, method, url, *args, **kwargs):
+        path = urlsplit(url).path
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.order_timeout if path in ORDER_PATHS else self.query_timeout
+
+        name = f"{method} {path}"
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        finally:
+            self.latency.record(name, time.perf_counter() - started)
+        self.ttfb.record(name, response.elapsed.total_seconds())
+        return response
+
+    def latency_stats(self):
+        """各接口的总耗时和响应头耗时、各主机的新建连接耗时（毫秒分位数）"""
+        return {
+            "total": self.latency.snapshot(),
+            "ttfb": self.ttfb.snapshot(),
+            "connect": self.connect.snapshot(),
+        }
@@ -0,0 +1,147 @@
+"""
+定时任务调度
+
+所有周期任务（websocket ping、listenKey 续期）和到期任务（持仓最长持有时间、风控禁用到期）
+都由同一个线程按最小堆调度，持仓和交易对增加时不再增加线程。
+任务在调度线程中执行，应当很快返回，耗时的操作（如下单、重连）交给其他线程处理。
+每个任务记录实际执行时间相对计划时间的延迟（lag）和执行耗时。
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from metrics import LatencyRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledTask:
+    """调度中的任务，通过 cancel() 取消"""
+    __slots__ = ("name", "due", "interval", "fn", "args", "cancelled", "runs")
+
+    def __init__(self, name, due, interval, fn, args):
+        self.name = name
+        self.due = due  # 计划执行时间（time.monotonic）
+        self.interval = interval  # 周期任务的间隔秒数，一次性任务为None
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+        self.runs = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def remaining(self):
+        """距计划执行时间的秒数"""
+        return max(0.0, self.due - time.monotonic())
+
+
+class Scheduler:
+    """
+    单线程最小堆调度器
+    取消的任务不从堆中删除，到期弹出时跳过
+    """
+
+    def __init__(self, name="scheduler"):
+        self.name = name
+        self._heap = []  # (due, seq, task)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.lag = LatencyRegistry()  # 按任务名称统计的调度延迟
+        self.run_time = LatencyRegistry()  # 按任务名称统计的执行耗时
+        self.errors = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def call_later(self, delay, fn, *args, name=None):
+        """delay 秒后执行一次"""
+        return self._push(ScheduledTask(name or fn.__name__, time.monotonic() + max(0.0, delay), None, fn, args))
+
+    def call_at(self, timestamp, fn, *args, name=None):
+        """在unix时间 timestamp 执行一次"""
+        return self.call_later(timestamp - time.time(), fn, *args, name=name)
+
+    def every(self, interval, fn, *args, name=None, delay=None):
+        """
+        每 interval 秒执行一次
+        :param delay: 首次执行前等待的秒数，默认为 interval
+        """
+        if interval <= 0:
+            raise ValueError("执行间隔必须大于0")
+        due = time.monotonic() + (interval if delay is None else delay)
+        return self._push(ScheduledTask(name or fn.__name__, due, interval, fn, args))
+
+    def _push(self, task):
+        with self._cond:
+            heapq.heappush(self._heap, (task.due, next(self._seq), task))
+            # 新任务比当前等待的任务更早到期时唤醒调度线程
+            if self._heap[0][2] is task:
+                self._cond.notify()
+        return task
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, task = self._heap[0]
+                    if task.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    self._cond.wait(wait)
+
+            started = time.monotonic()
+            self.lag.record(task.name, started - task.due)
+            try:
+                task.fn(*task.args)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"定时任务 {task.name} 执行失败: {str(e)}", exc_info=e)
+            finally:
+                task.runs += 1
+                self.run_time.record(task.name, time.monotonic() - started)
+
+            if task.interval is not None and not task.cancelled:
+                # 执行落后时不补跑错过的周期
+                task.due = max(task.due + task.interval, time.monotonic())
+                self._push(task)
+
+    def stats(self):
+        with self._cond:
+            pending = [task for _, _, task in self._heap if not task.cancelled]
+        lag = self.lag.snapshot()
+        run_time = self.run_time.snapshot()
+        return {
+            "pending": len(pending),
+            "next_due": min((task.remaining() for task in pending), default=None),
+            "errors": self.errors,
+            "tasks": {name: {"lag": lag[name], "run_time": run_time.get(name)} for name in lag},
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """进程内共享的调度器，首次获取时启动"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler().start()
+        return _scheduler
@@ -25,29 +25,7 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(response => response.json())
             .then(data => {
                 if (data.price) {
-                    // 保存上一次价格
-                    tradeStatus.lastPrice = tradeStatus.currentPrice;
-                    tradeStatus.currentPrice = parseFloat(data.price);
-                    
-                    // 更新价格显示
-                    document.getElementById('price').textContent = data.price;
-                    
-                    // 显示价格变动
-                    if (tradeStatus.lastPrice !== null) {
-                        const priceChange = tradeStatus.currentPrice - tradeStatus.lastPrice;
-                        const changePercent = (priceChange / tradeStatus.lastPrice * 100).toFixed(3);
-                        
-                        if (priceChange > 0) {
-                            priceChangeSpan.textContent = `+${changePercent}%`;
-                            priceChangeSpan.className = 'price-change up';
-                        } else if (priceChange < 0) {
-                            priceChangeSpan.textContent = `${changePercent}%`;
-                            priceChangeSpan.className = 'price-change down';
-                        } else {
-                            priceChangeSpan.textContent = '0.00%';
-                            priceChangeSpan.className = 'price-change';
-                        }
-                    }
+                    applyPrice(data.price);
                 }
             })
             .catch(error => {
@@ -56,28 +34,58 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    // 显示价格
+    function applyPrice(price) {
+        // 保存上一次价格
+        tradeStatus.lastPrice = tradeStatus.currentPrice;
+        tradeStatus.currentPrice = parseFloat(price);
+        
+        // 更新价格显示
+        document.getElementById('price').textContent = price;
+        
+        // 显示价格变动
+        if (tradeStatus.lastPrice !== null) {
+            const priceChange = tradeStatus.currentPrice - tradeStatus.lastPrice;
+            const changePercent = (priceChange / tradeStatus.lastPrice * 100).toFixed(3);
+            
+            if (priceChange > 0) {
+                priceChangeSpan.textContent = `+${changePercent}%`;
+                priceChangeSpan.className = 'price-change up';
+            } else if (priceChange < 0) {
+                priceChangeSpan.textContent = `${changePercent}%`;
+                priceChangeSpan.className = 'price-change down';
+            } else {
+                priceChangeSpan.textContent = '0.00%';
+                priceChangeSpan.className = 'price-change';
+            }
+        }
+    }
+    
     // 更新持仓状态
     function updatePosition() {
         fetch('/api/position')
             .then(response => response.json())
-            .then(data => {
-                document.getElementById('position').textContent = 
-                    data.position || '无';
-                document.getElementById('balance').textContent = data.balance;
-                
-                // 更新交易状态
-                tradeStatus.position = data.position;
-                tradeStatus.disabled = data.disabled;
-                tradeStatus.disabled_until = data.disabled_until;
-                
-                // 更新按钮状态
-                updateButtonStatus();
-            })
+            .then(applyPosition)
             .catch(error => {
                 console.error('获取持仓状态失败:', error);
             });
     }
     
+    // 显示持仓状态
+    function applyPosition(data) {
+        document.getElementById('position').textContent = 
+            data.position || '无';
+        document.getElementById('balance').textContent = data.balance;
+        
+        // 更新交易状态
+        tradeStatus.position = data.position;
+        tradeStatus.disabled = data.disabled;
+        tradeStatus.disabled_until = data.disabled_until;
+        
+        // 更新按钮状态
+        updateButtonStatus();
+    }
+    
     // 更新按钮状态
     function updateButtonStatus() {
         // 如果禁用状态，显示倒计时
@@ -292,9 +300,40 @@ document.addEventListener('DOMContentLoaded', function() {
             console.error('恢复状态失败:', error);
         });
     
-    // 定时刷新
-    setInterval(updatePrice, 3000);
-    setInterval(updatePosition, 10000);
+    // 服务端推送价格和持仓，推送不可用时退回定时刷新
+    let streamSymbol = null;
+    let pollTimers = [];
+    
+    function startPolling() {
+        if (pollTimers.length) return;
+        pollTimers = [
+            setInterval(updatePrice, 3000),
+            setInterval(updatePosition, 10000)
+        ];
+    }
+    
+    function stopPolling() {
+        pollTimers.forEach(timer => clearInterval(timer));
+        pollTimers = [];
+    }
+    
+    if (window.EventSource) {
+        const source = new EventSource('/api/stream');
+        source.addEventListener('open', stopPolling);
+        source.addEventListener('error', startPolling);
+        source.addEventListener('position', event => {
+            const data = JSON.parse(event.data);
+            // 连接建立时推送的第一条持仓事件是当前交易对
+            if (streamSymbol === null) streamSymbol = data.symbol;
+            if (data.symbol === streamSymbol) applyPosition(data);
+        });
+        source.addEventListener('price', event => {
+            const data = JSON.parse(event.data);
+            if (data.symbol === streamSymbol) applyPrice(data.price);
+        });
+    } else {
+        startPolling();
+    }
     
     // 定时更新禁用状态倒计时
     setInterval(() => {
@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', () => {
        .then(data => {
             const tradingConfig = data.trading;
             form.elements['symbol'].value = tradingConfig.symbol;
+            form.elements['symbols'].value = tradingConfig.symbols || '';
             form.elements['leverage'].value = tradingConfig.leverage;
             form.elements['position_percent'].value = tradingConfig.position_percent;
             form.elements['initial_balance'].value = tradingConfig.initial_balance;
@@ -24,6 +25,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const formData = new FormData(event.target);
         const configData = {
             symbol: formData.get('symbol'),
+            symbols: formData.get('symbols'),
             leverage: formData.get('leverage'),
             position_percent: formData.get('position_percent'),
             initial_balance: formData.get('initial_balance'),
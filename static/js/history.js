@@ -81,6 +81,27 @@ document.addEventListener('DOMContentLoaded', function() {
     // 初始化加载
     loadTradeHistory();
     
-    // 定时刷新
-    setInterval(loadTradeHistory, 30000);
+    // 有新交易时刷新，推送不可用时退回定时刷新
+    let pollTimer = null;
+    let refreshTimer = null;
+    
+    function startPolling() {
+        if (!pollTimer) pollTimer = setInterval(loadTradeHistory, 30000);
+    }
+    
+    if (window.EventSource) {
+        const source = new EventSource('/api/stream');
+        source.addEventListener('open', () => {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        });
+        source.addEventListener('error', startPolling);
+        source.addEventListener('trade', () => {
+            // 止盈止损订单和开仓订单几乎同时记录，合并为一次刷新
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(loadTradeHistory, 500);
+        });
+    } else {
+        startPolling();
+    }
 });
\ No newline at end of file
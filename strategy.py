@@ -1,22 +1,69 @@
 import configparser
 import numpy as np
-from datetime import datetime
-from collections import deque
+
+from candles import BAR_MODES
+from features import FeatureGraph
+from indicators import sma_array, wilder_rsi_array
 
 class Strategy:
     """
     策略基类，用于实现各种交易策略
+    bar_mode 为 close 时只在K线收盘时调用 analyze，为 intrabar 时每次推送都调用，
+    同一根K线的盘中更新原地修改最后一根K线和指标，不追加新数据
+    timeframes 为策略使用的K线周期，为空时使用订阅的周期；更大的周期由订阅的K线合成，
+    使用多个周期的策略需设置 multi_timeframe = True，按周期注册指标并在 evaluate 中按 tick.interval 区分，
+    其余策略只能使用一个周期
+    每条K线消息由特征图解析一次并更新指标，子类在 evaluate 中只根据解析结果和指标值做判断
     """
-    def __init__(self):
+    bar_mode = "close"
+    timeframes = ()
+    multi_timeframe = False  # 是否区分多个周期的K线
+
+    def __init__(self, bar_mode=None, timeframes=None):
+        if bar_mode is not None:
+            if bar_mode not in BAR_MODES:
+                raise ValueError(f"无效的K线评估模式: {bar_mode}")
+            self.bar_mode = bar_mode
+        if timeframes is not None:
+            if isinstance(timeframes, str):
+                timeframes = [timeframe.strip() for timeframe in timeframes.split(",") if timeframe.strip()]
+            self.timeframes = tuple(timeframes)
+        if len(self.timeframes) > 1 and not self.multi_timeframe:
+            raise ValueError(f"{type(self).__name__} 只支持一个K线周期: {','.join(self.timeframes)}")
         self.config = configparser.ConfigParser()
         self.config.read('config.ini')
-        self.kline_history = deque(maxlen=100)  # 存储最近100条K线数据
+        self.features = FeatureGraph(history=100)  # 解析后的K线和指标，保存最近100条K线数据
         self.last_signal_time = None  # 上次发出信号的时间
         self.signal_cooldown = 300  # 信号冷却时间（秒）
         
-    def add_kline(self, kline_data):
-        """添加K线数据到历史记录"""
-        self.kline_history.append(kline_data)
+    @property
+    def warmup_bars(self):
+        """产生第一个信号前需要的K线数量"""
+        return 0
+
+    @property
+    def kline_history(self):
+        return self.features.history
+
+    @property
+    def timeframe(self):
+        """单一周期策略的指标周期，未指定 timeframes 时为None，指标使用收到的K线周期"""
+        return self.timeframes[0] if self.timeframes else None
+
+    def bind(self, features):
+        """使用共享的特征图，指标节点在特征图中注册，参数相同的指标只计算一次"""
+        self.features = features
+        self.register_features(features)
+
+    def register_features(self, features):
+        """在特征图中注册策略使用的指标，由子类实现"""
+        pass
+        
+    def replay(self, kline_messages):
+        """按顺序回放已收盘的K线消息预热策略，期间产生的信号被丢弃"""
+        for kline_data in kline_messages:
+            self.analyze(kline_data)
+        self.last_signal_time = None
         
     def analyze(self, kline_data):
         """
@@ -24,12 +71,35 @@ class Strategy:
         :param kline_data: K线数据
         :return: 交易信号 ("BUY", "SELL", None)
         """
-        # 添加到历史记录
-        self.add_kline(kline_data)
-        
-        # 基类不实现具体策略，由子类实现
+        return self.evaluate(self.features.update(kline_data))
+
+    def evaluate(self, tick):
+        """
+        根据特征图的最新结果判断信号，基类不产生信号
+        :param tick: 解析后的K线消息，见 features.Tick
+        """
         return None
         
+    def batch_signals(self, close, event_time):
+        """
+        批量计算整段历史的信号，供回测使用，结果与逐条调用analyze一致
+        :param close: 收盘价数组
+        :param event_time: 事件时间数组（毫秒）
+        :return: 信号数组（1买入，-1卖出，0无信号），不支持批量计算时返回None
+        """
+        return np.zeros(len(close), dtype=np.int8)
+        
+    def _apply_cooldown(self, raw_signals, event_time):
+        """对批量产生的候选信号应用冷却时间，只遍历候选位置"""
+        signals = np.zeros(len(raw_signals), dtype=np.int8)
+        cooldown_ms = self.signal_cooldown * 1000
+        last_time = None
+        for i in np.flatnonzero(raw_signals).tolist():
+            if last_time is None or event_time[i] - last_time >= cooldown_ms:
+                signals[i] = raw_signals[i]
+                last_time = event_time[i]
+        return signals
+        
     def _check_cooldown(self, current_time):
         """检查信号冷却时间"""
         if self.last_signal_time is None:
@@ -47,18 +117,19 @@ class SimpleStrategy(Strategy):
     """
     简单策略示例：根据价格变动方向生成信号
     """
-    def __init__(self):
-        super().__init__()
+    def __init__(self, bar_mode=None, timeframes=None):
+        super().__init__(bar_mode, timeframes)
         self.last_price = None
         self.last_update_time = None
         
-    def analyze(self, kline_data):
-        # 调用父类方法添加K线数据
-        super().analyze(kline_data)
+    @property
+    def warmup_bars(self):
+        return 1
         
+    def evaluate(self, tick):
         # 获取当前价格
-        current_price = float(kline_data.get('k', {}).get('c'))
-        current_time = datetime.fromtimestamp(kline_data.get('E', 0) / 1000)
+        current_price = tick.price
+        current_time = tick.time
         
         # 首次运行，记录价格并返回
         if self.last_price is None:
@@ -94,58 +165,70 @@ class SimpleStrategy(Strategy):
             self._update_signal_time(current_time)
             
         return signal
+        
+    def batch_signals(self, close, event_time):
+        # 信号依赖上次出信号时的价格，只能逐条计算
+        return None
 
 
 class MAStrategy(Strategy):
     """
     移动平均线策略：使用短期和长期移动平均线的交叉产生信号
     """
-    def __init__(self, short_period=5, long_period=20):
-        super().__init__()
+    def __init__(self, short_period=5, long_period=20, bar_mode=None, timeframes=None):
+        super().__init__(bar_mode, timeframes)
         self.short_period = short_period  # 短期MA周期
         self.long_period = long_period    # 长期MA周期
-        self.prices = deque(maxlen=max(short_period, long_period) + 10)  # 存储价格数据
+        self.register_features(self.features)
         
-    def analyze(self, kline_data):
-        # 调用父类方法添加K线数据
-        super().analyze(kline_data)
+    @property
+    def warmup_bars(self):
+        return max(self.short_period, self.long_period) + 1
+        
+    def register_features(self, features):
+        # 短期和长期移动平均线，由特征图增量更新
+        self.short_ma = features.sma(self.short_period, self.timeframe)
+        self.long_ma = features.sma(self.long_period, self.timeframe)
         
-        # 获取当前价格和时间
-        current_price = float(kline_data.get('k', {}).get('c'))
-        current_time = datetime.fromtimestamp(kline_data.get('E', 0) / 1000)
+    def evaluate(self, tick):
+        current_time = tick.time
         
-        # 添加价格到历史记录
-        self.prices.append(current_price)
+        # 当前和上一根K线的MA值
+        short_ma, long_ma = self.short_ma.value, self.long_ma.value
+        prev_short_ma, prev_long_ma = self.short_ma.prev, self.long_ma.prev
         
         # 如果数据不足，返回None
-        if len(self.prices) < self.long_period:
+        if short_ma is None or long_ma is None or prev_short_ma is None or prev_long_ma is None:
             return None
             
         # 检查信号冷却时间
         if not self._check_cooldown(current_time):
             return None
             
-        # 计算短期和长期移动平均线
-        short_ma = np.mean(list(self.prices)[-self.short_period:])
-        long_ma = np.mean(list(self.prices)[-self.long_period:])
-        
-        # 获取前一个周期的MA值（如果有）
-        if len(self.prices) > self.long_period + 1:
-            prev_prices = list(self.prices)[-(self.long_period+1):-1]
-            prev_short_ma = np.mean(prev_prices[-self.short_period:])
-            prev_long_ma = np.mean(prev_prices)
-            
-            # 判断金叉和死叉
-            if prev_short_ma <= prev_long_ma and short_ma > long_ma:
-                # 金叉，买入信号
-                self._update_signal_time(current_time)
-                return "BUY"
-            elif prev_short_ma >= prev_long_ma and short_ma < long_ma:
-                # 死叉，卖出信号
-                self._update_signal_time(current_time)
-                return "SELL"
+        # 判断金叉和死叉
+        if prev_short_ma <= prev_long_ma and short_ma > long_ma:
+            # 金叉，买入信号
+            self._update_signal_time(current_time)
+            return "BUY"
+        elif prev_short_ma >= prev_long_ma and short_ma < long_ma:
+            # 死叉，卖出信号
+            self._update_signal_time(current_time)
+            return "SELL"
                 
         return None
+        
+    def batch_signals(self, close, event_time):
+        short_ma = sma_array(close, self.short_period)
+        long_ma = sma_array(close, self.long_period)
+        prev_short_ma = np.roll(short_ma, 1)
+        prev_long_ma = np.roll(long_ma, 1)
+        prev_short_ma[0] = prev_long_ma[0] = np.nan
+        
+        # nan参与比较恒为False，数据不足的位置自然不会产生信号
+        raw = np.zeros(len(close), dtype=np.int8)
+        raw[(prev_short_ma <= prev_long_ma) & (short_ma > long_ma)] = 1
+        raw[(prev_short_ma >= prev_long_ma) & (short_ma < long_ma)] = -1
+        return self._apply_cooldown(raw, event_time)
 
 
 class RSIStrategy(Strategy):
@@ -154,41 +237,33 @@ class RSIStrategy(Strategy):
     超买区域（RSI > 70）产生卖出信号
     超卖区域（RSI < 30）产生买入信号
     """
-    def __init__(self, period=14, overbought=70, oversold=30):
-        super().__init__()
+    def __init__(self, period=14, overbought=70, oversold=30, bar_mode=None, timeframes=None):
+        super().__init__(bar_mode, timeframes)
         self.period = period  # RSI计算周期
         self.overbought = overbought  # 超买阈值
         self.oversold = oversold  # 超卖阈值
-        self.prices = deque(maxlen=period + 10)  # 存储价格数据
+        self.register_features(self.features)
         
-    def analyze(self, kline_data):
-        # 调用父类方法添加K线数据
-        super().analyze(kline_data)
+    @property
+    def warmup_bars(self):
+        return self.period + 1
         
-        # 获取当前价格和时间
-        current_price = float(kline_data.get('k', {}).get('c'))
-        current_time = datetime.fromtimestamp(kline_data.get('E', 0) / 1000)
+    def register_features(self, features):
+        # RSI由特征图增量更新
+        self.rsi = features.rsi(self.period, self.timeframe)
         
-        # 添加价格到历史记录
-        self.prices.append(current_price)
+    def evaluate(self, tick):
+        current_time = tick.time
+        rsi = self.rsi.value
         
         # 如果数据不足，返回None
-        if len(self.prices) <= self.period:
+        if rsi is None:
             return None
             
         # 检查信号冷却时间
         if not self._check_cooldown(current_time):
             return None
             
-        # 计算RSI
-        prices = list(self.prices)
-        deltas = np.diff(prices)
-        seed = deltas[:self.period+1]
-        up = seed[seed >= 0].sum() / self.period
-        down = -seed[seed < 0].sum() / self.period
-        rs = up / down if down != 0 else 0
-        rsi = 100 - (100 / (1 + rs))
-        
         # 根据RSI值产生信号
         if rsi > self.overbought:
             # 超买区域，卖出信号
@@ -200,47 +275,84 @@ class RSIStrategy(Strategy):
             return "BUY"
             
         return None
+        
+    def batch_signals(self, close, event_time):
+        rsi = wilder_rsi_array(close, self.period)
+        raw = np.zeros(len(close), dtype=np.int8)
+        raw[rsi > self.overbought] = -1
+        raw[rsi < self.oversold] = 1
+        return self._apply_cooldown(raw, event_time)
 
 
 # 策略工厂，用于创建不同的策略实例
-def create_strategy(strategy_name=""):
-    if strategy_name.lower() == "simple":
-        return SimpleStrategy()
-    elif strategy_name.lower() == "ma":
-        return MAStrategy(short_period=5, long_period=20)
-    elif strategy_name.lower() == "rsi":
-        return RSIStrategy(period=14, overbought=70, oversold=30)
-    elif strategy_name.lower() == "combined":
+# 各策略的默认参数，可通过 create_strategy 的关键字参数覆盖
+DEFAULT_STRATEGY_PARAMS = {
+    "ma": {"short_period": 5, "long_period": 20},
+    "rsi": {"period": 14, "overbought": 70, "oversold": 30},
+}
+
+
+# 可以在页面上选择的策略
+STRATEGY_NAMES = ("simple", "ma", "rsi", "combined")
+
+
+def max_warmup_bars():
+    """所有策略（默认参数）预热需要的最多K线数量，启动时按此预先下载历史K线"""
+    return max(create_strategy(name).warmup_bars for name in STRATEGY_NAMES)
+
+
+def create_strategy(strategy_name="", **params):
+    strategy_name = strategy_name.lower()
+    params = {**DEFAULT_STRATEGY_PARAMS.get(strategy_name, {}), **params}
+    if strategy_name == "simple":
+        return SimpleStrategy(**params)
+    elif strategy_name == "ma":
+        return MAStrategy(**params)
+    elif strategy_name == "rsi":
+        return RSIStrategy(**params)
+    elif strategy_name == "combined":
         # 创建组合策略
-        return CombinedStrategy()
+        return CombinedStrategy(**params)
     else:
-        return Strategy()  # 默认返回基础策略（不产生信号）
+        return Strategy(**params)  # 默认返回基础策略（不产生信号）
 
 
 class CombinedStrategy(Strategy):
     """
     组合策略：结合多个策略的信号，只有当多数策略产生相同信号时才输出
+    子策略绑定到组合策略的特征图，每条K线消息只解析和保存一次，相同的指标只计算一次
     """
-    def __init__(self):
-        super().__init__()
+    def __init__(self, bar_mode=None, timeframes=None):
+        super().__init__(bar_mode, timeframes)
         self.strategies = [
-            MAStrategy(short_period=5, long_period=20),
-            RSIStrategy(period=14, overbought=70, oversold=30),
-            SimpleStrategy()
+            MAStrategy(short_period=5, long_period=20, timeframes=self.timeframes),
+            RSIStrategy(period=14, overbought=70, oversold=30, timeframes=self.timeframes),
+            SimpleStrategy(timeframes=self.timeframes)
         ]
+        for strategy in self.strategies:
+            strategy.bind(self.features)
         
-    def analyze(self, kline_data):
+    @property
+    def warmup_bars(self):
+        return max(strategy.warmup_bars for strategy in self.strategies)
+        
+    def replay(self, kline_messages):
+        super().replay(kline_messages)
+        for strategy in self.strategies:
+            strategy.last_signal_time = None
+        
+    def evaluate(self, tick):
         # 获取当前时间
-        current_time = datetime.fromtimestamp(kline_data.get('E', 0) / 1000)
+        current_time = tick.time
         
-        # 检查信号冷却时间
+        # 检查信号冷却时间，冷却期间特征图照常更新，子策略的指标不会中断
         if not self._check_cooldown(current_time):
             return None
             
         # 收集各策略的信号
         signals = []
         for strategy in self.strategies:
-            signal = strategy.analyze(kline_data)
+            signal = strategy.evaluate(tick)
             if signal:
                 signals.append(signal)
                 
@@ -260,4 +372,8 @@ class CombinedStrategy(Strategy):
             self._update_signal_time(current_time)
             return "SELL"
             
-        return None
\ No newline at end of file
+        return None
+        
+    def batch_signals(self, close, event_time):
+        # 子策略的状态受组合策略冷却时间影响，只能逐条计算
+        return None
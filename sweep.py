@@ -0,0 +1,230 @@
+"""
+参数扫描：在历史K线上批量回测策略参数和 [trading] 配置的组合
+
+K线数组只在主进程加载一次，放入共享内存，各工作进程直接映射读取，不需要逐个任务序列化。
+同一组策略参数只计算一次信号，再与所有交易参数组合做模拟。
+每组的交易参数组合按进程数分块提交，只扫描交易参数时也能用上所有核；
+工作进程缓存算过的信号，同一组参数的多个分块落在同一进程时不重复计算。
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import TRADING_PARAMS, add_klines_arguments, load_klines, load_trading_params, simulate, strategy_signals
+from strategy import create_strategy
+
+logger = logging.getLogger(__name__)
+
+# 属于交易参数而不是策略参数的名称
+TRADING_PARAM_NAMES = set(TRADING_PARAMS) | {"fee_rate"}
+
+# 工作进程中映射的K线数组
+_worker_klines = None
+_worker_shms = []
+# 工作进程中缓存的信号 (策略名称, 策略参数) -> 信号数组
+_worker_signals = {}
+_SIGNAL_CACHE_SIZE = 64
+
+
+def grid(space):
+    """
+    网格参数组合
+    :param space: {参数名: 候选值列表}
+    :return: 参数字典列表
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_sample(space, n, seed=None):
+    """
+    随机参数组合
+    :param space: {参数名: 候选值列表 或 (最小值, 最大值)}，区间两端都是整数时按整数采样
+    :param n: 采样数量
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        sample = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    sample[name] = rng.randint(low, high)
+                else:
+                    sample[name] = rng.uniform(low, high)
+            else:
+                sample[name] = rng.choice(values)
+        samples.append(sample)
+    return samples
+
+
+def split_params(params):
+    """拆分为 (策略参数, 交易参数)"""
+    strategy_params = {k: v for k, v in params.items() if k not in TRADING_PARAM_NAMES}
+    trading_params = {k: v for k, v in params.items() if k in TRADING_PARAM_NAMES}
+    return strategy_params, trading_params
+
+
+def _share_klines(klines):
+    """把K线数组复制到共享内存，返回 (共享内存列表, 描述信息)"""
+    shms = []
+    spec = {}
+    for name, array in klines.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        shared[:] = array
+        shms.append(shm)
+        spec[name] = (shm.name, array.shape, array.dtype.str)
+    return shms, spec
+
+
+def _init_worker(spec):
+    """工作进程初始化：映射共享内存中的K线数组"""
+    global _worker_klines
+    _worker_klines = {}
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shms.append(shm)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        array.flags.writeable = False
+        _worker_klines[name] = array
+
+
+def _signals(strategy_name, strategy_params):
+    """计算或从缓存读取一组策略参数的信号"""
+    key = (strategy_name, tuple(sorted(strategy_params.items())))
+    signals = _worker_signals.get(key)
+    if signals is None:
+        if len(_worker_signals) >= _SIGNAL_CACHE_SIZE:
+            _worker_signals.pop(next(iter(_worker_signals)))
+        strategy = create_strategy(strategy_name, **strategy_params)
+        signals = _worker_signals[key] = strategy_signals(strategy, _worker_klines)
+    return signals
+
+
+def _evaluate(strategy_name, strategy_params, trading_overrides):
+    """在工作进程中计算一组策略参数下一批交易参数组合的结果"""
+    signals = _signals(strategy_name, strategy_params)
+
+    rows = []
+    for overrides in trading_overrides:
+        result = simulate(_worker_klines, signals, load_trading_params(overrides))
+        rows.append({**strategy_params, **overrides, **result.summary()})
+    return rows
+
+
+def run_sweep(strategy_name, klines, param_sets, workers=None, sort_by="total_pnl"):
+    """
+    并行扫描参数
+    :param strategy_name: 策略名称
+    :param klines: K线数据，见 backtest.load_klines
+    :param param_sets: 参数字典列表，可同时包含策略参数和交易参数，见 grid / random_sample
+    :param workers: 进程数，默认为CPU核数
+    :param sort_by: 排序指标，降序
+    :return: 按指标排序的结果列表
+    """
+    # 按策略参数分组，每组只计算一次信号
+    groups = {}
+    for params in param_sets:
+        strategy_params, trading_params = split_params(params)
+        key = tuple(sorted(strategy_params.items()))
+        groups.setdefault(key, []).append(trading_params)
+
+    # 每组的交易参数组合分成约 进程数 块，只有一组策略参数时也能分到所有进程
+    workers = workers or os.cpu_count()
+    tasks = []
+    for key, trading_overrides in groups.items():
+        size = max(1, math.ceil(len(trading_overrides) / workers))
+        for start in range(0, len(trading_overrides), size):
+            tasks.append((dict(key), trading_overrides[start:start + size]))
+
+    shms, spec = _share_klines(klines)
+    rows = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,)) as pool:
+            futures = [
+                pool.submit(_evaluate, strategy_name, strategy_params, chunk)
+                for strategy_params, chunk in tasks
+            ]
+            for future in as_completed(futures):
+                rows.extend(future.result())
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    rows.sort(key=lambda row: row[sort_by] if row[sort_by] is not None else float("-inf"), reverse=True)
+    return rows
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _parse_space(items):
+    """解析命令行参数空间: name=v1,v2,v3 为候选值，name=low:high 为区间"""
+    space = {}
+    for item in items:
+        name, values = item.split("=", 1)
+        if ":" in values:
+            low, high = values.split(":", 1)
+            space[name] = (_parse_value(low), _parse_value(high))
+        else:
+            space[name] = [_parse_value(v) for v in values.split(",")]
+    return space
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略参数扫描")
+    parser.add_argument("--strategy", required=True, help="策略名称: simple/ma/rsi/combined")
+    add_klines_arguments(parser)
+    parser.add_argument("--param", nargs="+", required=True, metavar="NAME=VALUES",
+                        help="参数空间，如 short_period=3,5,8 stop_loss=0.5:3")
+    parser.add_argument("--random", type=int, help="随机采样数量，不指定时使用网格")
+    parser.add_argument("--seed", type=int, help="随机种子")
+    parser.add_argument("--workers", type=int, help="进程数，默认为CPU核数")
+    parser.add_argument("--sort-by", default="total_pnl", help="排序指标")
+    parser.add_argument("--top", type=int, default=20, help="输出前N条结果")
+    parser.add_argument("--out", help="完整结果CSV输出文件")
+    args = parser.parse_args()
+
+    space = _parse_space(args.param)
+    if args.random:
+        param_sets = random_sample(space, args.random, args.seed)
+    else:
+        if any(isinstance(values, tuple) for values in space.values()):
+            parser.error("网格模式不支持区间参数，请使用 --random")
+        param_sets = grid(space)
+
+    started = time.perf_counter()
+    klines = load_klines(args)
+    rows = run_sweep(args.strategy, klines, param_sets, args.workers, args.sort_by)
+    logger.info("扫描完成: %d 组参数, 耗时 %.2f 秒", len(rows), time.perf_counter() - started)
+
+    for row in rows[:args.top]:
+        print(json.dumps(row, ensure_ascii=False))
+
+    if args.out and rows:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,116 @@
+"""
+K线聚合：补发收盘、丢弃重复和过期推送；由基础周期合成大周期K线
+
+在仓库根目录运行：python -m unittest tests.test_candles
+"""
+import unittest
+
+from candles import CandleAggregator, Resampler
+
+MINUTE = 60_000
+
+
+def kline(open_time, close, closed=False, interval="1m", ms=MINUTE, volume=1.0):
+    return {
+        "e": "kline",
+        "s": "TESTUSDT",
+        "k": {
+            "t": open_time, "T": open_time + ms - 1, "s": "TESTUSDT", "i": interval,
+            "o": close, "h": close, "l": close, "c": close, "v": volume, "x": closed,
+        },
+    }
+
+
+def summary(events):
+    return [(event["k"]["t"], event["k"]["c"], closed) for event, closed in events]
+
+
+class CandleAggregatorTest(unittest.TestCase):
+
+    def test_close_pushed_once(self):
+        candles = CandleAggregator()
+        self.assertEqual(summary(candles.update(kline(0, 1.0))), [(0, 1.0, False)])
+        self.assertEqual(summary(candles.update(kline(0, 1.1, closed=True))), [(0, 1.1, True)])
+        self.assertEqual(summary(candles.update(kline(MINUTE, 1.2))), [(MINUTE, 1.2, False)])
+        self.assertEqual(candles.stats(), {"updates": 3, "closes": 1, "synthetic_closes": 0})
+
+    def test_synthetic_close_from_last_update(self):
+        # 没有收到第一根K线的收盘推送，下一根K线出现时用最后一次推送补发收盘
+        candles = CandleAggregator()
+        candles.update(kline(0, 1.0))
+        candles.update(kline(0, 1.1))
+        events = candles.update(kline(MINUTE, 1.2))
+        self.assertEqual(summary(events), [(0, 1.1, True), (MINUTE, 1.2, False)])
+        self.assertTrue(events[0][0]["k"]["x"])
+        self.assertEqual(candles.stats()["synthetic_closes"], 1)
+
+    def test_synthetic_close_across_gap(self):
+        # 中间的K线整根丢失时只补发最后一根收到的K线
+        candles = CandleAggregator()
+        candles.update(kline(0, 1.0))
+        events = candles.update(kline(3 * MINUTE, 1.3, closed=True))
+        self.assertEqual(summary(events), [(0, 1.0, True), (3 * MINUTE, 1.3, True)])
+
+    def test_duplicate_and_stale_updates_dropped(self):
+        candles = CandleAggregator()
+        candles.update(kline(0, 1.0, closed=True))
+        # 重复的收盘推送
+        self.assertEqual(candles.update(kline(0, 1.0, closed=True)), [])
+        candles.update(kline(MINUTE, 1.1))
+        # 早于当前K线的推送
+        self.assertEqual(candles.update(kline(0, 0.9)), [])
+        # 已收盘K线不会在下一根K线出现时再次补发
+        events = candles.update(kline(2 * MINUTE, 1.2))
+        self.assertEqual(summary(events), [(MINUTE, 1.1, True), (2 * MINUTE, 1.2, False)])
+        self.assertEqual(candles.stats(), {"updates": 5, "closes": 2, "synthetic_closes": 1})
+
+
+class ResamplerTest(unittest.TestCase):
+
+    def bars(self, resampler, *updates):
+        """依次推送基础K线，返回5m周期的 (开盘时间, 最高, 最低, 收盘, 成交量, 是否收盘)"""
+        result = []
+        for message in updates:
+            for interval, event, closed in resampler.update(message, message["k"]["x"]):
+                k = event["k"]
+                self.assertEqual(interval, k["i"])
+                if interval == "5m":
+                    result.append((k["t"], k["h"], k["l"], k["c"], k["v"], closed))
+        return result
+
+    def test_volume_and_close_within_bucket(self):
+        resampler = Resampler("1m", ["5m"])
+        # 同一根基础K线的盘中推送替换成交量，收盘后计入已收盘部分
+        bars = self.bars(
+            resampler,
+            kline(0, 1.0, volume=1.0),
+            kline(0, 1.2, volume=2.0, closed=True),
+            kline(MINUTE, 0.9, volume=3.0),
+        )
+        self.assertEqual(bars[-1], (0, 1.2, 0.9, 0.9, 5.0, False))
+        for i in range(1, 5):
+            bars = self.bars(resampler, kline(i * MINUTE, 1.0, volume=1.0, closed=True))
+        # 最后一根基础K线收盘时大周期收盘
+        self.assertEqual(bars, [(0, 1.2, 0.9, 1.0, 6.0, True)])
+        # 已收盘周期的重复推送被丢弃
+        self.assertEqual(self.bars(resampler, kline(4 * MINUTE, 1.0, volume=1.0, closed=True)), [])
+
+    def test_bucket_rollover_without_final_close(self):
+        resampler = Resampler("1m", ["5m", "15m"])
+        self.bars(resampler, kline(3 * MINUTE, 1.0, volume=2.0, closed=True), kline(4 * MINUTE, 1.1, volume=1.0))
+        # 没有收到4分钟K线的收盘，下一个周期的第一根K线到来时上一个周期直接收盘
+        bars = self.bars(resampler, kline(5 * MINUTE, 1.3, volume=4.0))
+        self.assertEqual(bars, [(0, 1.1, 1.0, 1.1, 3.0, True), (5 * MINUTE, 1.3, 1.3, 1.3, 4.0, False)])
+        # 15m周期仍在同一个周期内
+        k = resampler.bars["15m"]
+        self.assertEqual((k["t"], k["closed_v"] + k["base_v"], k["x"]), (0, 7.0, False))
+
+    def test_interval_must_be_multiple(self):
+        with self.assertRaises(ValueError):
+            Resampler("3m", ["5m"])
+        with self.assertRaises(ValueError):
+            Resampler("5m", ["1m"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+特征图：指标节点按K线周期绑定，只用自己周期的K线更新
+
+在仓库根目录运行：python -m unittest tests.test_features
+"""
+import unittest
+
+from features import FeatureGraph
+from indicators import SMA
+
+MINUTE = 60_000
+
+
+def kline(open_time, close, interval="1m", closed=False):
+    return {"e": "kline", "E": open_time, "s": "TESTUSDT", "k": {"t": open_time, "i": interval, "c": close, "x": closed}}
+
+
+class FeatureGraphTest(unittest.TestCase):
+
+    def test_shared_nodes(self):
+        graph = FeatureGraph()
+        self.assertIs(graph.sma(5, "1m"), graph.sma(5, "1m"))
+        self.assertIsNot(graph.sma(5, "1m"), graph.sma(5, "5m"))
+        self.assertIsNot(graph.sma(5, "1m"), graph.rsi(5, "1m"))
+        self.assertEqual(len(graph), 3)
+
+    def test_nodes_only_see_their_interval(self):
+        graph = FeatureGraph()
+        fast = graph.sma(2, "1m")
+        slow = graph.sma(2, "5m")
+        expected_fast, expected_slow = SMA(2), SMA(2)
+
+        for i in range(15):
+            price = 1.0 + i
+            graph.update(kline(i * MINUTE, price, closed=True))
+            expected_fast.update(price)
+            if i % 5 == 4:
+                # 5m K线在最后一根1m K线之后推送
+                slow_price = 10.0 + i
+                graph.update(kline((i - 4) * MINUTE, slow_price, "5m", closed=True))
+                expected_slow.update(slow_price)
+
+        self.assertEqual(fast.value, expected_fast.value)
+        self.assertEqual(slow.value, expected_slow.value)
+        self.assertEqual((slow.prev, slow.value), (16.5, 21.5))
+
+    def test_amend_per_interval(self):
+        graph = FeatureGraph()
+        fast = graph.sma(2, "1m")
+        slow = graph.sma(2, "5m")
+        graph.update(kline(0, 1.0, "5m"))
+        graph.update(kline(0, 2.0, "1m", closed=True))
+        graph.update(kline(MINUTE, 4.0, "1m"))
+        # 两个周期开盘时间相同的K线互不影响：5m的盘中更新替换的是5m的最后一个值
+        tick = graph.update(kline(0, 3.0, "5m"))
+        self.assertTrue(tick.amend)
+        graph.update(kline(5 * MINUTE, 5.0, "5m"))
+        self.assertEqual(slow.value, 4.0)
+        self.assertEqual(fast.value, 3.0)
+        tick = graph.update(kline(MINUTE, 6.0, "1m"))
+        self.assertTrue(tick.amend)
+        self.assertEqual(fast.value, 4.0)
+        self.assertIsNone(fast.prev)
+
+    def test_unbound_node_binds_to_first_interval(self):
+        graph = FeatureGraph()
+        node = graph.sma(1)
+        graph.update(kline(0, 2.0, "5m"))
+        graph.update(kline(0, 1.0, "1m"))
+        self.assertEqual(node.interval, "5m")
+        self.assertEqual(node.value, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+流式指标与回测使用的批量指标逐条结果一致
+
+在仓库根目录运行：python -m unittest tests.test_indicators
+"""
+import math
+import random
+import unittest
+
+from indicators import SMA, WilderRSI, sma_array, wilder_rsi_array
+
+
+def random_walk(n, seed=0):
+    rng = random.Random(seed)
+    price = 100.0
+    prices = []
+    for _ in range(n):
+        price *= 1 + rng.uniform(-0.01, 0.01)
+        prices.append(price)
+    return prices
+
+
+class StreamingIndicatorTest(unittest.TestCase):
+
+    def assertMatchesBatch(self, streaming, batch):
+        """流式结果为None的位置批量结果为nan，其余位置数值一致"""
+        self.assertEqual(len(streaming), len(batch))
+        for i, (value, expected) in enumerate(zip(streaming, batch)):
+            if value is None:
+                self.assertTrue(math.isnan(expected), f"第{i}个值: 流式未就绪，批量为{expected}")
+            else:
+                self.assertAlmostEqual(value, expected, places=9, msg=f"第{i}个值")
+
+    def test_sma_matches_sma_array(self):
+        # 数据量超过缓冲区多圈，覆盖每圈重新求和的路径
+        prices = random_walk(500)
+        for period in (1, 5, 20, 99):
+            sma = SMA(period)
+            self.assertMatchesBatch([sma.update(price) for price in prices], sma_array(prices, period))
+
+    def test_rsi_matches_wilder_rsi_array(self):
+        prices = random_walk(500, seed=1)
+        for period in (2, 14, 30):
+            rsi = WilderRSI(period)
+            self.assertMatchesBatch([rsi.update(price) for price in prices], wilder_rsi_array(prices, period))
+
+    def test_rsi_flat_prices(self):
+        # 没有涨跌时为50，只涨不跌时为100
+        prices = [1.0] * 20 + [1.0 + i for i in range(20)]
+        rsi = WilderRSI(14)
+        self.assertMatchesBatch([rsi.update(price) for price in prices], wilder_rsi_array(prices, 14))
+        self.assertEqual(rsi.value, 100.0)
+
+    def test_short_history(self):
+        self.assertTrue(all(math.isnan(v) for v in sma_array([1.0, 2.0], 5)))
+        self.assertTrue(all(math.isnan(v) for v in wilder_rsi_array([1.0] * 14, 14)))
+
+
+if __name__ == "__main__":
+    unittest.main()
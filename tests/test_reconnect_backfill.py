@@ -0,0 +1,113 @@
+"""
+重连后补齐K线：补齐期间收到的实时K线不能让补齐的K线被丢弃
+
+在仓库根目录运行：python -m unittest tests.test_reconnect_backfill
+"""
+import os
+import tempfile
+import unittest
+
+from config.config_manager import app_config, config_snapshot
+
+WORKDIR = tempfile.mkdtemp(prefix="test-backfill-")
+app_config.set("storage", "trade_journal", os.path.join(WORKDIR, "trades.db"))
+app_config.set("storage", "kline_dir", os.path.join(WORKDIR, "klines"))
+app_config.set("storage", "exchange_info_cache", os.path.join(WORKDIR, "exchange_info.json"))
+app_config.set("proxies", "enabled", "false")
+app_config.set("paper", "enabled", "false")
+os.environ.setdefault("BINANCE_API_KEY", "test")
+os.environ.setdefault("BINANCE_SECRET_KEY", "test")
+
+from benchmark import FakeWebsocketClient, create_client  # noqa: E402
+from exchange_simulator import DEFAULT_FILTERS, ExchangeSimulator, dumps, synthetic_ticks  # noqa: E402
+from kline_store import get_store  # noqa: E402
+
+
+class ReconnectBackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.symbol = config_snapshot().trading.symbol
+        self.simulator = ExchangeSimulator(
+            {self.symbol: DEFAULT_FILTERS},
+            {self.symbol: synthetic_ticks(seed=1)},
+            interval=app_config["websocket"]["kline_interval"],
+            ticks_per_bar=2,
+            tick_seconds=0,
+        )
+        feed = self.simulator.feed
+        # 模拟行情从过去开始，断线期间的K线都已收盘，REST可以返回
+        feed.bar_open -= 100 * feed.bar_ms
+        feed.seed_history(10)
+
+        self.frames = []
+        feed.broadcast = lambda stream, event: self.frames.append(dumps(event))
+        self.client = create_client(self.simulator)
+        # 与启动时预先下载历史K线一样，由REST写入存储，之后的推送接在后面
+        interval = app_config["websocket"]["kline_interval"]
+        get_store(self.symbol, interval).extend(self.client.fetch_klines(self.symbol, interval, 0))
+        self.closed = []  # 交给K线回调的已收盘K线开盘时间，按处理顺序
+
+        def on_kline(msg):
+            if msg["k"]["x"]:
+                self.closed.append(msg["k"]["t"])
+
+        self.client.register_kline_callback(on_kline)
+
+    def push(self, ticks):
+        """推进行情，把推送的消息交给客户端"""
+        for _ in range(ticks):
+            self.frames.clear()
+            self.simulator.feed.step()
+            for frame in self.frames:
+                self.client._handle_message(None, frame)
+
+    def skip(self, ticks):
+        """断线期间推进行情，消息丢失"""
+        for _ in range(ticks):
+            self.simulator.feed.step()
+        self.frames.clear()
+
+    def test_live_push_during_backfill(self):
+        feed = self.simulator.feed
+        self.push(6)  # 3根K线
+        before_gap = self.client.last_closed_kline[self.symbol]
+
+        self.skip(10)  # 断线期间收盘了5根K线
+        self.client._reconnect()
+
+        fetch_klines = self.client.fetch_klines
+
+        def fetch_with_live_push(*args, **kwargs):
+            # 新连接在补齐请求返回前已推送了当前K线
+            self.push(1)
+            return fetch_klines(*args, **kwargs)
+
+        self.client.fetch_klines = fetch_with_live_push
+        self.client._backfill_klines()
+        self.client.fetch_klines = fetch_klines
+        self.push(3)  # 再收盘2根K线
+
+        step = feed.bar_ms
+        expected = list(range(before_gap + step, feed.bar_open - step + 1, step))
+        self.assertEqual(len(expected), 7)
+        gap_and_after = [t for t in self.closed if t > before_gap]
+        self.assertEqual(gap_and_after, expected)
+
+        open_times = get_store(self.symbol).read()["open_time"]
+        self.assertTrue((open_times[1:] - open_times[:-1] == step).all())
+        self.assertEqual(int(open_times[-1]), expected[-1])
+        self.assertIsNone(self.client._backfill_buffer)
+
+    def test_failed_resubscribe_raises(self):
+        class ClosedWebsocketClient(FakeWebsocketClient):
+            def subscribe(self, stream, id=None):
+                raise ConnectionError("connection closed")
+
+        # 订阅失败时重连抛出异常，重连线程会退避重试，不会当作重连成功
+        self.client._create_wsclient = ClosedWebsocketClient
+        with self.assertRaises(ConnectionError):
+            self.client._reconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+交易日志：基于SQLite WAL模式的只追加交易记录
+
+按自增id和时间建立索引，最近N条、时间范围查询和启动时的状态恢复都不随历史记录总量变慢。
+"""
+import csv
+import os
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 与原 trades.csv 的列保持一致
+COLUMNS = (
+    "timestamp", "symbol", "side", "order_id",
+    "order_price", "order_qty", "exec_price",
+    "exec_qty", "status", "pnl", "fee", "stop_profit",
+    "stop_loss",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    symbol TEXT,
+    side TEXT,
+    order_id TEXT,
+    order_price REAL,
+    order_qty REAL,
+    exec_price REAL,
+    exec_qty REAL,
+    status TEXT NOT NULL,
+    pnl REAL,
+    fee REAL,
+    stop_profit REAL,
+    stop_loss REAL
+);
+CREATE INDEX IF NOT EXISTS idx_trades_created_at ON trades (created_at);
+CREATE INDEX IF NOT EXISTS idx_trades_filled ON trades (id) WHERE status = 'FILLED';
+CREATE INDEX IF NOT EXISTS idx_trades_open_fill ON trades (id) WHERE status = 'FILLED' AND pnl IS NULL;
+CREATE INDEX IF NOT EXISTS idx_trades_symbol_filled ON trades (symbol, id) WHERE status = 'FILLED';
+"""
+
+_SELECT = "SELECT " + ", ".join(COLUMNS) + " FROM trades"
+
+
+def _to_number(value):
+    """CSV中的空字符串和None视为空值"""
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+class TradeJournal:
+    """
+    交易日志，每个线程使用独立的数据库连接，WAL模式下读写互不阻塞
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, trade):
+        """
+        追加一条交易记录
+        :param trade: 包含 COLUMNS 中字段的字典，timestamp 为ISO格式时间
+        """
+        timestamp = trade.get("timestamp") or datetime.now().isoformat()
+        values = [datetime.fromisoformat(timestamp).timestamp(), timestamp]
+        for name in COLUMNS[1:]:
+            value = trade.get(name)
+            if name in ("symbol", "side", "order_id", "status"):
+                values.append(None if value is None else str(value))
+            else:
+                values.append(_to_number(value))
+        self._connection().execute(
+            "INSERT INTO trades (created_at, " + ", ".join(COLUMNS) + ") VALUES (" + ", ".join("?" * (len(COLUMNS) + 1)) + ")",
+            values,
+        )
+
+    def recent(self, limit=10):
+        """最近limit条记录，按时间正序返回"""
+        rows = self._connection().execute(_SELECT + " ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def between(self, start=None, end=None, limit=1000):
+        """
+        按时间范围查询
+        :param start: 起始时间（unix秒，包含）
+        :param end: 结束时间（unix秒，不包含）
+        """
+        rows = self._connection().execute(
+            _SELECT + " WHERE created_at >= ? AND created_at < ? ORDER BY created_at LIMIT ?",
+            (start if start is not None else float("-inf"), end if end is not None else float("inf"), limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_open_fill(self, symbol=None):
+        """最近一条没有盈亏数据的成交记录（即未平仓的开仓记录）"""
+        if symbol is None:
+            row = self._connection().execute(
+                _SELECT + " WHERE status = 'FILLED' AND pnl IS NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        else:
+            row = self._connection().execute(
+                _SELECT + " WHERE status = 'FILLED' AND pnl IS NULL AND symbol = ? ORDER BY id DESC LIMIT 1", (symbol,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def recent_closed(self, limit, symbol=None):
+        """最近limit条有盈亏数据的成交记录，按时间倒序返回"""
+        if symbol is None:
+            rows = self._connection().execute(
+                _SELECT + " WHERE status = 'FILLED' AND pnl IS NOT NULL ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                _SELECT + " WHERE status = 'FILLED' AND pnl IS NOT NULL AND symbol = ? ORDER BY id DESC LIMIT ?",
+                (symbol, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def is_empty(self):
+        return self._connection().execute("SELECT 1 FROM trades LIMIT 1").fetchone() is None
+
+    def migrate_csv(self, csv_path):
+        """
+        从旧的 trades.csv 导入交易记录，仅在日志为空时执行，导入后CSV文件重命名为 .migrated
+        :return: 导入的记录数
+        """
+        if not os.path.exists(csv_path) or not self.is_empty():
+            return 0
+
+        with open(csv_path, "r", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            for row in rows:
+                self.append(row)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        os.replace(csv_path, csv_path + ".migrated")
+        logger.info("已从 %s 导入 %d 条交易记录", csv_path, len(rows))
+        return len(rows)
@@ -0,0 +1,511 @@
+"""
+多交易对交易引擎
+
+每个交易对一个 SymbolTrader，持有自己的策略、持仓状态和风控状态。
+K线消息按交易对固定分配到分片线程处理（同一交易对总在同一线程，保证顺序），
+一个交易对的策略计算慢不会拖慢其他分片上的交易对，websocket线程只负责分发。
+"""
+import logging
+import queue
+import threading
+import time
+import zlib
+
+from candles import CandleAggregator, Resampler
+from config.config_manager import app_config, config_snapshot, subscribe_config
+from kline_store import bar_to_kline, get_store, interval_ms
+from order_manager import OrderManager
+from strategy import create_strategy, max_warmup_bars
+
+logger = logging.getLogger(__name__)
+
+
+class SymbolTrader:
+    """单个交易对的策略、持仓和下单逻辑"""
+
+    def __init__(self, engine, symbol):
+        self.engine = engine
+        self.symbol = symbol
+        self.client = engine.client
+        self.order_manager = OrderManager(engine.client, symbol)
+        self.order_manager.register_trade_callback(
+            lambda trade: engine.publish("trade", trade, f"trade:{symbol}:{trade['timestamp']}:{trade['order_id']}")
+        )
+        self.order_manager.register_enable_callback(self._on_enabled)
+
+        # 交易状态
+        self.status = {
+            "position": None,  # 当前持仓方向
+            "disabled": False,  # 接口是否禁用
+            "disabled_until": None,
+            "consecutive_losses": 0,  # 连续亏损次数
+        }
+        # 开平仓互斥，避免多个工作线程同时修改持仓
+        self.position_lock = threading.Lock()
+
+        self.strategy_name = ""
+        # (策略, 重采样器, 是否使用订阅的K线周期)，切换策略时整体替换，分片线程每次推送只读取一次
+        # 重采样器在策略使用更大周期时由订阅的K线合成K线
+        self._pipeline = (create_strategy(), None, True)
+        # 当前K线状态，按策略的评估模式决定哪些推送交给策略
+        self.candles = CandleAggregator()
+        self.evaluations = 0  # 策略调用次数
+
+    @property
+    def strategy(self):
+        return self._pipeline[0]
+
+    @property
+    def resampler(self):
+        return self._pipeline[1]
+
+    @property
+    def use_base(self):
+        return self._pipeline[2]
+
+    def restore(self):
+        """从交易日志恢复持仓和风控状态"""
+        status = self.order_manager.restore_status()
+        self.status["position"] = status["position"]
+        self.status["disabled"] = status["disabled"]
+        self.status["disabled_until"] = status["disabled_until"]
+        self.status["consecutive_losses"] = status["consecutive_losses"]
+        self.publish_position()
+        return status
+
+    def snapshot(self):
+        """当前持仓和禁用状态"""
+        return {
+            "symbol": self.symbol,
+            "position": self.status["position"],
+            "balance": self.engine.balance,
+            "disabled": self.status["disabled"],
+            "disabled_until": self.status["disabled_until"] if self.status["disabled"] else None,
+        }
+
+    def publish_position(self):
+        self.engine.publish("position", self.snapshot(), f"position:{self.symbol}")
+
+    def set_strategy(self, strategy_name="", bar_mode=None, timeframes=None):
+        """
+        创建策略，并用历史K线预热，本地存储中缺少的K线通过REST补齐
+        :param bar_mode: close/intrabar，默认使用策略自己的评估模式
+        :param timeframes: 策略使用的K线周期，如 ["5m"]，默认使用策略自己的周期；
+                           多个周期只用于 multi_timeframe 的策略，否则抛出 ValueError
+        """
+        params = {}
+        if bar_mode:
+            params["bar_mode"] = bar_mode
+        if timeframes:
+            params["timeframes"] = timeframes
+        new_strategy = create_strategy(strategy_name, **params)
+
+        base_interval = app_config["websocket"]["kline_interval"]
+        timeframes = new_strategy.timeframes or (base_interval,)
+        higher = [timeframe for timeframe in timeframes if timeframe != base_interval]
+        resampler = Resampler(base_interval, higher) if higher else None
+
+        if new_strategy.warmup_bars:
+            self._warm_up(new_strategy, base_interval, timeframes, resampler)
+        # 一次赋值切换，分片线程不会用新策略处理旧重采样器的K线
+        self._pipeline = (new_strategy, resampler, base_interval in timeframes)
+        self.strategy_name = strategy_name
+
+    def _warm_up(self, strategy, base_interval, timeframes, resampler):
+        """
+        用历史K线预热策略，更大的周期由同一个重采样器从基础周期合成，预热后重采样器继续用于实时数据
+        """
+        base_ms = interval_ms(base_interval)
+        largest = max(interval_ms(timeframe) for timeframe in timeframes)
+        ratio = largest // base_ms
+        # 多取一个最大周期，从完整的周期开始合成
+        bars = (strategy.warmup_bars + 1) * ratio
+        try:
+            klines = self.client.load_history(self.symbol, bars)
+        except Exception as e:
+            logger.error(f"[{self.symbol}] 下载历史K线失败，使用本地存储预热: {str(e)}", exc_info=e)
+            klines = get_store(self.symbol).tail(bars)
+
+        open_times = klines["open_time"]
+        start = 0
+        if resampler is not None:
+            while start < len(open_times) and open_times[start] % largest:
+                start += 1
+
+        def messages():
+            for i in range(start, len(open_times)):
+                kline = bar_to_kline(klines, i, self.symbol)
+                kline["k"]["i"] = base_interval
+                if base_interval in timeframes:
+                    yield kline
+                if resampler is not None:
+                    for _, bar, closed in resampler.update(kline, True):
+                        if closed:
+                            yield bar
+
+        strategy.replay(messages())
+
+    def check_disabled(self):
+        """
+        检查是否处于禁用状态，禁用时间已过则自动解除
+        :return: 剩余禁用秒数，未禁用时返回0
+        """
+        if not self.status["disabled"]:
+            return 0
+        remaining_time = self.order_manager.disabled_until - time.time()
+        if remaining_time > 0:
+            return int(remaining_time)
+        # 解除禁用
+        self.status["disabled"] = False
+        self.order_manager.disabled = False
+        self.publish_position()
+        return 0
+
+    def _on_enabled(self):
+        """禁用到期回调，在调度线程中调用"""
+        self.status["disabled"] = False
+        self.status["disabled_until"] = None
+        self.publish_position()
+
+    def on_kline(self, kline_data):
+        """处理K线数据，在分片线程中调用"""
+        strategy, resampler, use_base = self._pipeline
+        for kline, closed in self.candles.update(kline_data):
+            if use_base:
+                self._evaluate(strategy, kline, closed)
+            if resampler is not None:
+                # 更大周期的K线由订阅的K线合成
+                for _, bar, bar_closed in resampler.update(kline, closed):
+                    self._evaluate(strategy, bar, bar_closed)
+
+    def _evaluate(self, strategy, kline, closed):
+        # 收盘模式的策略只处理已收盘的K线
+        if strategy.bar_mode == "close" and not closed:
+            return
+        self.evaluations += 1
+        signal = strategy.analyze(kline)
+        if kline.get("backfill"):
+            # 重连后补齐的K线只用于更新指标，不按过期的信号下单
+            return
+        if signal in ["BUY", "SELL"]:
+            self.on_signal(signal)
+
+    def on_signal(self, signal):
+        """策略信号回调，只把开仓任务放入下单队列"""
+        if not self.engine.auto_trading or self.status["position"] or self.status["disabled"]:
+            return
+
+        logger.info(f"[{self.symbol}] 收到策略信号: {signal}")
+        position_side = "LONG" if signal == "BUY" else "SHORT"
+
+        def on_done(future):
+            try:
+                future.result()
+                logger.info(f"[{self.symbol}] 策略自动开仓成功: {signal}")
+            except Exception as e:
+                logger.error(f"[{self.symbol}] 策略自动开仓失败: {str(e)}", exc_info=e)
+
+        self.engine.executor.submit("open_position", self.open_position, position_side).add_done_callback(on_done)
+
+    def open_position(self, position_side):
+        """
+        市价开仓并创建止盈止损订单，在下单执行器的工作线程中调用
+        :param position_side: LONG/SHORT
+        :return: 开仓方向 BUY/SELL
+        """
+        with self.position_lock:
+            # 排队期间可能已经开仓
+            if self.status["position"]:
+                raise ValueError("已有持仓，请先平仓")
+
+            # 本次开仓使用同一份配置和钱包余额
+            trading = config_snapshot().trading
+            balance = self.engine.balance
+            if balance <= 0:
+                raise ValueError(f"钱包余额不足: {balance}")
+
+            side = "BUY" if position_side == "LONG" else "SELL"
+
+            # 获取当前价格，买入按卖一价、卖出按买一价计算
+            current_price = self.client.get_current_price(self.symbol, side)
+
+            # 计算开仓数量 (USDT金额 * 杠杆 * 百分比 / 当前价格)
+            amount = (
+                balance
+                * trading.leverage
+                * (trading.position_percent / 100)
+                / current_price
+            )
+            # 四舍五入到合适的精度
+            amount = round(amount, 3)
+
+            # 市价开仓
+            order = self.client.market_order(side, position_side, amount, symbol=self.symbol)
+
+            # 记录交易
+            self.order_manager.record_trade(order, current_price, amount, "FILLED")
+
+            # 更新持仓状态
+            self.status["position"] = position_side
+            self.order_manager.update_position(position_side)
+
+            try:
+                self._place_brackets(trading, position_side, current_price)
+            finally:
+                # 止盈止损下单失败也要启动持仓定时器，到期后交给下单执行器平仓
+                self.order_manager.start_position_timer(self.close_position_callback)
+                self.publish_position()
+            return side
+
+    def _place_brackets(self, trading, position_side, current_price):
+        """创建止盈止损订单，失败的腿单独重试一次"""
+        stop_profit_percent = trading.stop_profit
+        stop_loss_percent = trading.stop_loss
+
+        # 计算止盈止损价格
+        if position_side == "LONG":
+            stop_profit_price = current_price * (1 + stop_profit_percent / 100)
+            stop_loss_price = current_price * (1 - stop_loss_percent / 100)
+            stop_side = "SELL"
+        else:  # SHORT
+            stop_profit_price = current_price * (1 - stop_profit_percent / 100)
+            stop_loss_price = current_price * (1 + stop_loss_percent / 100)
+            stop_side = "BUY"
+
+        # 止盈止损订单一次批量提交
+        try:
+            legs = self.client.bracket_order(
+                stop_side, position_side, stop_profit_price, stop_loss_price, symbol=self.symbol
+            )
+        except Exception as e:
+            # 批量请求整体失败时两条腿都按失败处理，逐条单独下单
+            logger.error(f"[{self.symbol}] 止盈止损批量下单失败，逐条重试: {str(e)}", exc_info=e)
+            legs = [
+                {"leg": "STOP_PROFIT", "type": "TAKE_PROFIT_MARKET", "stop_price": stop_profit_price, "ok": False},
+                {"leg": "STOP_LOSS", "type": "STOP_MARKET", "stop_price": stop_loss_price, "ok": False},
+            ]
+        for leg in legs:
+            if leg["ok"]:
+                self.order_manager.record_trade(leg["order"], None, None, "NEW")
+                continue
+
+            # 单条腿失败时记录并单独重试一次，避免持仓没有保护
+            self.order_manager.record_trade(
+                {"symbol": self.symbol, "side": stop_side, "price": leg["stop_price"]}, status="REJECTED", pnl=None
+            )
+            try:
+                order = self.client.stop_order(
+                    stop_side, position_side, leg["stop_price"], True, leg["type"], symbol=self.symbol
+                )
+                self.order_manager.record_trade(order, None, None, "NEW")
+            except Exception as e:
+                logger.error(f"[{self.symbol}] {leg['leg']} 重试下单失败，当前持仓没有{leg['leg']}保护: {str(e)}", exc_info=e)
+
+    def close_position(self):
+        """市价平仓，在下单执行器的工作线程中调用"""
+        with self.position_lock:
+            position_side = self.status["position"]
+            if not position_side:
+                raise ValueError("当前没有持仓")
+
+            # 市价平仓
+            close_side = "SELL" if position_side == "LONG" else "BUY"
+            order = self.client.market_order(close_side, position_side, close_position=True, symbol=self.symbol)
+
+            # 取消定时器
+            self.order_manager.cancel_position_timer()
+
+            # 更新状态
+            self.status["position"] = None
+            self.order_manager.update_position(None)
+
+            # 记录交易
+            current_price = self.client.get_current_price(self.symbol, close_side)
+            self.order_manager.record_trade(
+                order, current_price, order.get("executedQty"), "FILLED"
+            )
+            self.publish_position()
+            return order
+
+    def on_stop_filled(self, fill):
+        """
+        止盈止损单成交，按推送中的盈亏和手续费记录平仓，在下单执行器的工作线程中调用
+        :param fill: 台账中的订单，含累计的 realizedPnl 和 commission
+        """
+        with self.position_lock:
+            if self.status["position"] != fill["positionSide"]:
+                # 已经手动或到期平仓
+                return
+
+            self.order_manager.cancel_position_timer()
+            self.status["position"] = None
+            self.order_manager.update_position(None)
+
+            self.order_manager.record_trade(
+                fill, float(fill["avgPrice"]), float(fill["executedQty"]), "FILLED",
+                pnl=fill["realizedPnl"], fee=fill["commission"],
+            )
+            self.status["disabled"] = self.order_manager.disabled
+            self.status["consecutive_losses"] = self.order_manager.consecutive_losses
+            if self.status["disabled"]:
+                self.status["disabled_until"] = self.order_manager.disabled_until
+            logger.info(f"[{self.symbol}] {fill['type']} 已成交，持仓已平，盈亏: {fill['realizedPnl']}")
+            self.publish_position()
+
+    def close_position_callback(self):
+        """持仓到期回调，交给下单执行器平仓"""
+        def on_done(future):
+            try:
+                order = future.result()
+                logger.info(f"[{self.symbol}] 自动平仓成功: {order.get('orderId')}")
+            except Exception as e:
+                logger.error(f"[{self.symbol}] 自动平仓失败: {str(e)}", exc_info=e)
+
+        self.engine.executor.submit("close_position", self.close_position).add_done_callback(on_done)
+
+
+class TradingEngine:
+    """
+    多交易对交易引擎
+    :param client: BinanceClient
+    :param executor: OrderExecutor
+    :param shards: 处理K线的分片线程数
+    :param shard_queue_size: 每个分片的消息队列长度，队列满时丢弃新消息
+    :param events: EventBroadcaster，用于向页面推送价格、持仓和交易事件
+    """
+
+    def __init__(self, client, executor, shards=2, shard_queue_size=1000, events=None):
+        self.client = client
+        self.executor = executor
+        self.events = events
+        self.traders = {}
+        self.auto_trading = False  # 自动交易状态
+        self.dropped = 0  # 分片队列已满丢弃的消息数
+
+        self._shards = []
+        for i in range(max(1, shards)):
+            shard_queue = queue.Queue(maxsize=shard_queue_size)
+            thread = threading.Thread(target=self._run_shard, args=(shard_queue,), name=f"kline-shard-{i}", daemon=True)
+            thread.start()
+            self._shards.append(shard_queue)
+
+        client.register_kline_callback(self.dispatch)
+        client.register_fill_callback(self.on_fill)
+        subscribe_config(self._on_config_change)
+
+    @property
+    def balance(self):
+        """钱包余额，由用户数据流推送实时更新"""
+        return self.client.ledger.wallet_balance
+
+    @property
+    def symbols(self):
+        return list(self.traders)
+
+    def trader(self, symbol=None):
+        """获取交易对对应的交易器，默认返回主交易对"""
+        if symbol is None:
+            symbol = self.client.symbol
+        trader = self.traders.get(symbol)
+        if trader is None:
+            raise ValueError(f"未交易的交易对: {symbol}")
+        return trader
+
+    def set_symbols(self, symbols):
+        """更新交易的交易对列表，只订阅新增的交易对、取消已移除的交易对，其余交易对不受影响"""
+        added = [symbol for symbol in symbols if symbol not in self.traders]
+        removed = [symbol for symbol in self.traders if symbol not in symbols]
+
+        for symbol in removed:
+            trader = self.traders.pop(symbol)
+            if trader.status["position"]:
+                logger.warning(f"[{symbol}] 已停止交易，但仍有持仓: {trader.status['position']}")
+            trader.order_manager.cancel_position_timer()
+
+        for symbol in added:
+            trader = SymbolTrader(self, symbol)
+            trader.restore()
+            self.traders[symbol] = trader
+            self.prefetch_history(symbol)
+
+        self.client.set_symbols(symbols)
+        if added or removed:
+            logger.info(f"交易对已更新: 新增={added}, 移除={removed}")
+
+    def prefetch_history(self, symbol):
+        """预先下载策略预热需要的历史K线到本地存储，之后切换策略不需要等待下载"""
+        try:
+            self.client.load_history(symbol, max_warmup_bars())
+        except Exception as e:
+            logger.error(f"[{symbol}] 预先下载历史K线失败: {str(e)}", exc_info=e)
+
+    def _on_config_change(self, old, new):
+        """交易对列表变更时只更新变更的交易对"""
+        if old.trading.symbols != new.trading.symbols:
+            logger.info(f"交易标的已变更: {list(old.trading.symbols)} -> {list(new.trading.symbols)}，更新订阅")
+            self.set_symbols(list(new.trading.symbols))
+
+    def dispatch(self, kline_data):
+        """分发K线消息到交易对所在的分片，在websocket线程中调用"""
+        symbol = kline_data.get("s")
+        if symbol not in self.traders:
+            return
+        if not kline_data.get("backfill"):
+            self.publish("price", {"symbol": symbol, "price": kline_data["k"]["c"], "time": kline_data.get("E")}, f"price:{symbol}")
+        shard_queue = self._shards[zlib.crc32(symbol.encode()) % len(self._shards)]
+        try:
+            shard_queue.put_nowait(kline_data)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"[{symbol}] K线处理队列已满，丢弃消息")
+
+    def on_fill(self, fill):
+        """
+        成交推送，在websocket线程中调用
+        止盈止损单全部成交时交给下单执行器记录平仓，市价单已由开平仓流程记录
+        """
+        if fill["status"] != "FILLED" or fill["type"] not in ("STOP_MARKET", "TAKE_PROFIT_MARKET"):
+            return
+        trader = self.traders.get(fill["symbol"])
+        if trader is None:
+            return
+
+        def on_done(future):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"[{trader.symbol}] 记录止盈止损成交失败: {str(e)}", exc_info=e)
+
+        self.executor.submit("stop_filled", trader.on_stop_filled, fill).add_done_callback(on_done)
+
+    def publish(self, event, data, key=None):
+        """推送事件到页面，未配置推送时忽略"""
+        if self.events is not None:
+            self.events.publish(event, data, key)
+
+    def _run_shard(self, shard_queue):
+        while True:
+            kline_data = shard_queue.get()
+            trader = self.traders.get(kline_data.get("s"))
+            if trader is None:
+                continue
+            try:
+                trader.on_kline(kline_data)
+            except Exception as e:
+                logger.error(f"[{trader.symbol}] 处理K线数据时出错: {str(e)}", exc_info=e)
+
+    def stats(self):
+        return {
+            "symbols": self.symbols,
+            "candles": {
+                symbol: {
+                    **trader.candles.stats(),
+                    "bar_mode": trader.strategy.bar_mode,
+                    "timeframes": list(trader.strategy.timeframes),
+                    "evaluations": trader.evaluations,
+                }
+                for symbol, trader in list(self.traders.items())
+            },
+            "dropped": self.dropped,
+            "shard_backlog": [shard_queue.qsize() for shard_queue in self._shards],
+        }
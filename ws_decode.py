@@ -0,0 +1,64 @@
+"""
+WebSocket消息解码
+
+- 解码前先从原始字符串中取出事件类型，不处理的事件类型不做完整解析
+- 安装了 orjson 时使用 orjson 解析，否则使用标准库 json
+- 消息日志按采样率记录，且只在日志确实会写出时才格式化
+"""
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+    DecodeError = orjson.JSONDecodeError
+else:
+    loads = json.loads
+    DecodeError = json.JSONDecodeError
+
+_EVENT_KEY = '"e":"'
+
+
+def event_type(raw):
+    """
+    从原始消息中取出事件类型，不做完整解析
+    币安推送的事件消息 "e" 字段总是第一个字段，只在消息开头查找，避免匹配到嵌套对象里的 "e"
+    :return: 事件类型，没有事件类型（如订阅响应）时返回None
+    """
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode()
+    start = raw.find(_EVENT_KEY, 0, 16)
+    if start < 0:
+        return None
+    start += len(_EVENT_KEY)
+    end = raw.find('"', start)
+    if end < 0:
+        return None
+    return raw[start:end]
+
+
+class SampledLogger:
+    """
+    按采样率记录日志，每 1/sample_rate 条记录一条
+    级别未开启或未被采样时直接返回，不构造日志记录
+    :param logger: logging.Logger
+    :param sample_rate: 采样率，0 表示不记录，1 表示全部记录
+    """
+
+    def __init__(self, logger, sample_rate=1.0):
+        self.logger = logger
+        self.every = round(1 / sample_rate) if sample_rate > 0 else 0
+        self._count = 0
+
+    def info(self, msg, *args):
+        if not self.every or not self.logger.isEnabledFor(logging.INFO):
+            return
+        self._count += 1
+        if self._count < self.every:
+            return
+        self._count = 0
+        self.logger.info(msg, *args)